@@ -186,6 +186,78 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
 }
 
+# Stock reservation strategy used when confirming sales orders:
+# "lock" locks product rows while stock is validated, "conditional" decrements
+# availables with guarded atomic updates and holds no lock up front.
+RESERVATION_STRATEGY = env("RESERVATION_STRATEGY", default="lock")
+
+# Seconds a confirmed order holds its stock before `manage.py
+# sweep_reservations` gives it back and marks the order EXPIRED; 0 keeps
+# reservations forever.
+RESERVATION_TTL = env.int("RESERVATION_TTL", default=0)
+
+# "sync" confirms sales orders inside the confirm request, "queued" stores the
+# request and answers 202; `manage.py process_confirmations` drains the queue.
+CONFIRMATION_MODE = env("CONFIRMATION_MODE", default="sync")
+
+# Responses to requests sent with an Idempotency-Key header are replayed to
+# retries for this many seconds; `manage.py purge_idempotency_keys` removes
+# expired keys. A retry arriving while the first request is still running
+# waits up to IDEMPOTENCY_KEY_WAIT seconds before getting a 409.
+IDEMPOTENCY_KEY_TTL = env.int("IDEMPOTENCY_KEY_TTL", default=24 * 60 * 60)
+IDEMPOTENCY_KEY_WAIT = env.float("IDEMPOTENCY_KEY_WAIT", default=0)
+
+# List actions of the product and sale order endpoints render values() rows
+# with compiled serializers (see core.fastpath) unless this is False.
+FAST_LIST_SERIALIZATION = env.bool("FAST_LIST_SERIALIZATION", default=True)
+
+# Most products a ?search= of the catalog ranks and returns on PostgreSQL (see
+# products.search).
+PRODUCT_SEARCH_MAX_RESULTS = env.int("PRODUCT_SEARCH_MAX_RESULTS", default=1000)
+
+# Country calling code given to national phone numbers when customer phones
+# are normalized (see telesales.phones), e.g. "237"; empty keeps them as is.
+PHONE_COUNTRY_CODE = env("PHONE_COUNTRY_CODE", default="")
+
+# Customer lookups (GET /api/sales/customers/lookup/) return at most
+# CUSTOMER_LOOKUP_MAX_RESULTS customers and are cached for
+# CUSTOMER_LOOKUP_CACHE_TTL seconds; 0 turns the cache off.
+CUSTOMER_LOOKUP_MAX_RESULTS = env.int("CUSTOMER_LOOKUP_MAX_RESULTS", default=20)
+CUSTOMER_LOOKUP_CACHE_TTL = env.int("CUSTOMER_LOOKUP_CACHE_TTL", default=30)
+
+# Cache framework backends, e.g. CACHE_URL=rediscache://host:6379/1; the
+# default is a per-process local memory cache.
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# Responses of the product catalog are cached (see core.cache) for
+# RESPONSE_CACHE_TIMEOUT seconds in the RESPONSE_CACHE_ALIAS cache, fronted by
+# an in-process LRU of RESPONSE_CACHE_MAX_ENTRIES entries; 0 turns it off.
+RESPONSE_CACHE_ALIAS = env("RESPONSE_CACHE_ALIAS", default="default")
+RESPONSE_CACHE_TIMEOUT = env.int("RESPONSE_CACHE_TIMEOUT", default=300)
+RESPONSE_CACHE_MAX_ENTRIES = env.int("RESPONSE_CACHE_MAX_ENTRIES", default=256)
+
+# Transaction policies of the transactional endpoints (see core.transactions).
+# "lock" is "wait", "nowait" or "skip_locked"; "lock_timeout" is in
+# milliseconds (PostgreSQL only); deadlocks, serialization failures and lock
+# conflicts are retried up to "max_attempts" times with a jittered exponential
+# backoff starting at "backoff" seconds and capped at "max_backoff" seconds.
+TRANSACTION_POLICIES = {
+    "default": {
+        "lock": "wait",
+        "lock_timeout": env.int("LOCK_TIMEOUT_MS", default=2000),
+        "max_attempts": 3,
+        "backoff": 0.05,
+        "max_backoff": 1.0,
+    },
+    "confirm": {"max_attempts": 5},
+    "confirm_batch": {"lock_timeout": 10000},
+    "cancel": {"lock_timeout": 10000},
+    "reservation_sweep": {},
+    "order_create": {},
+    "order_update": {},
+    "purchase_receive": {"lock_timeout": 10000},
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
@@ -334,3 +406,18 @@ JAZZMIN_UI_TWEAKS = {
 
 USE_X_FORWARDED_HOST = True
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+
+# Orders GET /api/sales/orders/export/ and `manage.py export_orders` read per
+# round trip; each chunk is written out before the next one is read.
+ORDER_EXPORT_CHUNK_SIZE = env.int("ORDER_EXPORT_CHUNK_SIZE", default=2000)
+
+# Most points (products x periods) GET /api/products/stock-history/ returns.
+STOCK_HISTORY_MAX_POINTS = env.int("STOCK_HISTORY_MAX_POINTS", default=10_000)
+
+# `manage.py forecast_products` projects the demand of the next
+# FORECAST_HORIZON_DAYS days at a daily rate halfway between the moving
+# averages of the last FORECAST_SHORT_WINDOW_DAYS and FORECAST_LONG_WINDOW_DAYS
+# days of confirmed sales (see products.forecast).
+FORECAST_HORIZON_DAYS = env.int("FORECAST_HORIZON_DAYS", default=14)
+FORECAST_SHORT_WINDOW_DAYS = env.int("FORECAST_SHORT_WINDOW_DAYS", default=7)
+FORECAST_LONG_WINDOW_DAYS = env.int("FORECAST_LONG_WINDOW_DAYS", default=28)
@@ -20,6 +20,8 @@ from django.urls import include, path
 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from core.views import MetricsView
+
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularRedocView,
@@ -33,6 +35,7 @@ urlpatterns = [
     path("api/sales/", include("telesales.urls")),
     path("api/", include("products.urls")),
     path("api/", include("suppliers.urls")),
+    path("api/metrics/", MetricsView.as_view(), name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/docs/swagger/",
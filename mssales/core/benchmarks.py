@@ -0,0 +1,14 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+@contextmanager
+def rolled_back():
+    """
+    Run the block in a transaction that is rolled back when it ends, so that
+    the rows a benchmark command generates leave nothing behind.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from core import metrics
+
+STORED_HEADERS = ("ETag", "Last-Modified")
+
+# Every ResponseCache by namespace, for the metrics endpoint.
+RESPONSE_CACHES = {}
+
+
+class CachedResponse(Exception):
+    """Carries the response served from a ResponseCache."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ResponseCache:
+    """
+    Two tier cache of rendered responses.
+
+    Entries live in a bounded in-process LRU in front of the Django cache
+    named by RESPONSE_CACHE_ALIAS, shared by every process. Keys embed
+    generation counters kept in the shared tier: bumping a generation (see
+    bump) makes every entry built under the previous one unreachable, in all
+    processes, without having to find and delete them.
+    """
+
+    def __init__(self, namespace, max_entries=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        RESPONSE_CACHES[namespace] = self
+
+    @property
+    def shared(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    def _generation_key(self, scope):
+        return f"{self.namespace}:generation:{scope}"
+
+    def generations(self, *scopes):
+        """The current generations of `scopes`, starting missing ones."""
+        keys = [self._generation_key(scope) for scope in scopes]
+        values = self.shared.get_many(keys)
+        for key in keys:
+            if key not in values:
+                # A clock based start never reuses a generation whose counter
+                # was evicted from the shared tier.
+                self.shared.add(key, time.time_ns(), timeout=None)
+                values[key] = self.shared.get(key)
+        return [values[key] for key in keys]
+
+    def bump(self, *scopes):
+        """Invalidate the entries built under the current generations of `scopes`."""
+        for scope in scopes:
+            key = self._generation_key(scope)
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.set(key, time.time_ns(), timeout=None)
+
+    def key(self, *parts):
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return f"{self.namespace}:response:{digest}"
+
+    def get(self, key):
+        max_entries = self._max_entries()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                self._local.move_to_end(key)
+        if entry is not None:
+            metrics.incr(f"response_cache.{self.namespace}.hits")
+            metrics.incr(f"response_cache.{self.namespace}.local_hits")
+            return entry
+
+        entry = self.shared.get(key)
+        if entry is None:
+            metrics.incr(f"response_cache.{self.namespace}.misses")
+            return None
+        metrics.incr(f"response_cache.{self.namespace}.hits")
+        self._remember(key, entry, max_entries)
+        return entry
+
+    def set(self, key, entry):
+        self.shared.set(key, entry, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        self._remember(key, entry, self._max_entries())
+
+    def _max_entries(self):
+        if self.max_entries is not None:
+            return self.max_entries
+        return settings.RESPONSE_CACHE_MAX_ENTRIES
+
+    def _remember(self, key, entry, max_entries):
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > max_entries:
+                self._local.popitem(last=False)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        """Hit and miss counters of this cache, with their ratios."""
+        prefix = f"response_cache.{self.namespace}."
+        counters = metrics.snapshot(prefix)
+        hits = counters.get(prefix + "hits", 0)
+        misses = counters.get(prefix + "misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "local_hits": counters.get(prefix + "local_hits", 0),
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else None,
+            "miss_ratio": misses / lookups if lookups else None,
+            "local_entries": len(self._local),
+        }
+
+
+def ratios():
+    """The hit and miss ratios of every ResponseCache, as flat metric names."""
+    values = {}
+    for namespace, cache in RESPONSE_CACHES.items():
+        stats = cache.stats()
+        for name in ("hit_ratio", "miss_ratio"):
+            values[f"response_cache.{namespace}.{name}"] = stats[name]
+    return values
+
+
+class ResponseCacheMixin:
+    """
+    Serve the list and retrieve actions of a viewset from a ResponseCache.
+
+    `response_cache` is the ResponseCache and `response_cache_scopes()`
+    returns the generations a response depends on. The key covers the path and
+    the sorted query parameters (filters, search, ordering, page), so
+    equivalent requests share an entry. Only successful JSON responses are
+    stored, with their ETag and Last-Modified headers: a conditional request
+    matching a cached entry gets its 304 without touching the database.
+    Place the mixin after ConditionalGetMixin so a hit skips its validator
+    query. RESPONSE_CACHE_TIMEOUT = 0 turns the cache off.
+    """
+
+    response_cache = None
+
+    def response_cache_scopes(self):
+        if self.action == "list":
+            return ("list",)
+        return (self.kwargs[self.lookup_url_kwarg or self.lookup_field],)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._response_cache_key = None
+        if (
+            self.response_cache is None
+            or not settings.RESPONSE_CACHE_TIMEOUT
+            or request.method != "GET"
+            or self.action not in ("list", "retrieve")
+            or request.accepted_renderer.format != "json"
+        ):
+            return
+
+        cache = self.response_cache
+        key = cache.key(
+            self.action,
+            cache.generations(*self.response_cache_scopes()),
+            request.path,
+            sorted(request.query_params.lists()),
+        )
+        entry = cache.get(key)
+        if entry is None:
+            self._response_cache_key = key
+            return
+
+        headers = dict(entry["headers"])
+        response = get_conditional_response(
+            request._request,
+            etag=headers.get("ETag"),
+            last_modified=parse_http_date_safe(headers.get("Last-Modified", "")),
+        )
+        if response is None:
+            response = HttpResponse(
+                entry["content"], status=entry["status"], headers=headers
+            )
+        raise CachedResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CachedResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, "_response_cache_key", None)
+        if key is not None and response.status_code == 200:
+            # Stored once rendered, with the headers set by outer mixins.
+            response.add_post_render_callback(
+                lambda rendered: self._store(key, rendered)
+            )
+        return response
+
+    def _store(self, key, response):
+        headers = {"Content-Type": response["Content-Type"]}
+        headers.update(
+            (name, response[name])
+            for name in STORED_HEADERS
+            if response.has_header(name)
+        )
+        self.response_cache.set(
+            key,
+            {
+                "content": response.content,
+                "status": response.status_code,
+                "headers": headers,
+            },
+        )
@@ -0,0 +1,83 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+CONDITIONAL_ACTIONS = ("list", "retrieve")
+
+
+class NotModified(Exception):
+    """Carries the 304 (or 412) answering a conditional request."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified validators for the list and retrieve actions.
+
+    The validators come from one aggregate query over the rows the action
+    would render: max(updated_at), the row count and any
+    `conditional_aggregates` (e.g. the updated_at of nested objects), hashed
+    with the request path and query string. A request whose If-None-Match or
+    If-Modified-Since still matches gets a 304 before anything is serialized.
+    """
+
+    # Extra aggregates whose change must change the validators.
+    conditional_aggregates = {}
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ("GET", "HEAD") or self.action not in (
+            CONDITIONAL_ACTIONS
+        ):
+            return
+
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            if self.action == "retrieve":
+                lookup = self.lookup_url_kwarg or self.lookup_field
+                queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup]})
+            values = queryset.order_by().aggregate(
+                _updated_at=Max("updated_at"),
+                _count=Count("pk", distinct=True),
+                **self.conditional_aggregates,
+            )
+        except (TypeError, ValueError, ValidationError):
+            # A malformed lookup value, left to the action to answer with 404.
+            return
+        if self.action == "retrieve" and not values["_count"]:
+            return
+
+        dates = [value for value in values.values() if hasattr(value, "timestamp")]
+        last_modified = int(max(dates).timestamp()) if dates else None
+        fingerprint = repr(
+            (request.get_full_path(), sorted(values.items(), key=lambda item: item[0]))
+        )
+        etag = f'"{hashlib.md5(fingerprint.encode()).hexdigest()}"'
+        self._validators = (etag, last_modified)
+
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, "_validators", None)
+        if validators and response.status_code == 200:
+            etag, last_modified = validators
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
@@ -0,0 +1,253 @@
+from collections import defaultdict
+from functools import lru_cache
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.fieldsets import sparse_params
+
+# Fields whose representation of a database value is the value itself.
+IDENTITY_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class Unsupported(Exception):
+    """The serializer uses a feature the fast path cannot reproduce."""
+
+
+class _Related(list):
+    """A prefetched relation, standing in for its manager in model properties."""
+
+    def all(self):
+        return self
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _formatter(field):
+    return None if isinstance(field, IDENTITY_FIELDS) else field.to_representation
+
+
+class CompiledSerializer:
+    """
+    A serializer compiled into per-field extractors over `values()` rows.
+
+    Fields map to database columns and are formatted with their DRF field's
+    own to_representation, so the output matches the serializer's. Nested
+    serializers of foreign keys are joined into the same query, those of
+    reverse relations are fetched with one values() query per relation for
+    the whole page. Fields reading a model property are computed by calling the
+    property on a namespace holding the columns and relations the serializer
+    declares in `sparse_requires`.
+    """
+
+    def __init__(self, serializer, model):
+        self.model = model
+        pk = model._meta.pk.attname
+        self.columns = [pk]
+        self.steps = []
+        self.relations = {}
+        self.joins = {}
+        requires = getattr(serializer, "sparse_requires", {})
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            model_field = _model_field(model, source)
+
+            if isinstance(field, serializers.BaseSerializer):
+                if model_field is None or not model_field.is_relation:
+                    raise Unsupported(f"{name} is not a relation")
+                child = CompiledSerializer(
+                    getattr(field, "child", field), model_field.related_model
+                )
+                if model_field.one_to_many:
+                    self.relations[source] = (model_field, child)
+                    self.steps.append((name, "many", source, None))
+                elif model_field.many_to_one or (
+                    model_field.one_to_one and model_field.concrete
+                ):
+                    self._column(model_field.attname)
+                    self.joins[source] = child
+                    self.steps.append((name, "one", source, model_field.attname))
+                else:
+                    raise Unsupported(f"{name} is a many to many relation")
+            elif isinstance(field, serializers.ManyRelatedField) or source == "*":
+                raise Unsupported(f"{name} is not a model column")
+            elif model_field is not None and model_field.concrete:
+                column = model_field.attname
+                if model_field.is_relation and not isinstance(
+                    field, serializers.PrimaryKeyRelatedField
+                ):
+                    raise Unsupported(f"{name} renders a related object")
+                self._column(column)
+                self.steps.append((name, "column", column, _formatter(field)))
+            elif (
+                isinstance(getattr(model, source, None), property) and name in requires
+            ):
+                for dependency in requires[name]:
+                    self._dependency(dependency)
+                fget = getattr(model, source).fget
+                self.steps.append((name, "property", fget, _formatter(field)))
+            else:
+                raise Unsupported(f"{name} is not a model column")
+
+    def _column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+    def _dependency(self, name):
+        model_field = _model_field(self.model, name)
+        if model_field is None:
+            raise Unsupported(f"{name} is not a model field")
+        if model_field.one_to_many:
+            if name not in self.relations:
+                self.relations[name] = (model_field, None)
+        elif model_field.concrete:
+            self._column(model_field.attname)
+        else:
+            raise Unsupported(f"{name} is not a column or a reverse relation")
+
+    def all_columns(self):
+        """The columns of the model and, prefixed, of the joined relations."""
+        columns = list(self.columns)
+        for source, child in self.joins.items():
+            columns.extend(f"{source}__{column}" for column in child.all_columns())
+        return columns
+
+    def values(self, queryset, keep=()):
+        """`queryset` as the values() rows this serializer renders from."""
+        columns = self.all_columns()
+        columns.extend(name for name in keep if name not in columns)
+        return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+    def _fetch_relations(self, rows):
+        pk = self.model._meta.pk.attname
+        fetched = {}
+        for source, (model_field, child) in self.relations.items():
+            related_model = model_field.related_model
+            key = model_field.field.attname
+            # In primary key order, as the serializer would list them whatever
+            # plan the database picks.
+            queryset = related_model._default_manager.filter(
+                **{f"{key}__in": {row[pk] for row in rows}}
+            ).order_by("pk")
+
+            if child is None:
+                # A relation read by a model property: plain namespaces.
+                columns = [f.attname for f in related_model._meta.concrete_fields]
+                related = [
+                    SimpleNamespace(**values) for values in queryset.values(*columns)
+                ]
+                keys = [getattr(item, key) for item in related]
+            else:
+                values = list(child.values(queryset, keep=[key]))
+                related = child.render(values)
+                keys = [row[key] for row in values]
+
+            grouped = defaultdict(_Related)
+            for value, item in zip(keys, related):
+                grouped[value].append(item)
+            fetched[source] = grouped
+        return fetched
+
+    def render(self, rows):
+        """Render values() rows as the serializer would render their objects."""
+        if not rows:
+            return []
+        pk = self.model._meta.pk.attname
+        fetched = self._fetch_relations(rows)
+        for source, child in self.joins.items():
+            prefix = f"{source}__"
+            joined = [
+                {column: row[prefix + column] for column in child.all_columns()}
+                for row in rows
+            ]
+            present = [
+                values for values in joined if values[child.columns[0]] is not None
+            ]
+            by_pk = dict(
+                zip(
+                    (values[child.columns[0]] for values in present),
+                    child.render(present),
+                )
+            )
+            fetched[source] = {
+                row[pk]: by_pk.get(values[child.columns[0]])
+                for row, values in zip(rows, joined)
+            }
+        properties = any(kind == "property" for _, kind, _, _ in self.steps)
+
+        rendered = []
+        for row in rows:
+            if properties:
+                instance = SimpleNamespace(**row)
+                for source, (model_field, child) in self.relations.items():
+                    if child is None:
+                        setattr(instance, source, fetched[source].get(row[pk], []))
+            data = {}
+            for name, kind, source, extra in self.steps:
+                if kind == "column":
+                    value = row[source]
+                    data[name] = (
+                        value if value is None or extra is None else extra(value)
+                    )
+                elif kind == "property":
+                    value = source(instance)
+                    data[name] = (
+                        value if value is None or extra is None else extra(value)
+                    )
+                elif kind == "many":
+                    data[name] = list(fetched[source].get(row[pk], ()))
+                else:
+                    data[name] = fetched[source][row[pk]]
+            rendered.append(data)
+        return rendered
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(serializer_class, model):
+    """The CompiledSerializer of `serializer_class`, or None if unsupported."""
+    try:
+        return CompiledSerializer(serializer_class(), model)
+    except Unsupported:
+        return None
+
+
+class FastListMixin:
+    """
+    Serve list actions from values() rows rendered by a CompiledSerializer
+    instead of instantiating the serializer for every object. The response is
+    the same; requests with ?fields= or ?expand=, serializers the fast path
+    cannot compile and FAST_LIST_SERIALIZATION = False use the regular path.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        compiled = compile_serializer(self.get_serializer_class(), queryset.model)
+        if (
+            compiled is None
+            or not getattr(settings, "FAST_LIST_SERIALIZATION", True)
+            or sparse_params(request) is not None
+        ):
+            return super().list(request, *args, **kwargs)
+
+        keep = [name.lstrip("-") for name in getattr(self, "keyset_ordering", ())]
+        rows = compiled.values(queryset, keep)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(compiled.render(page))
+        return Response(compiled.render(list(rows)))
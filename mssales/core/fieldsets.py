@@ -0,0 +1,215 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def parse_paths(value):
+    """Turn "id,lines.qty" into the tree {"id": {}, "lines": {"qty": {}}}."""
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in path.strip().split("."):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def sparse_params(request):
+    """
+    Return the (fields, expand) trees asked for by a GET request, or None when
+    it wants the full representation. A fields tree of None selects every
+    field.
+    """
+    if request is None or request.method != "GET":
+        return None
+    params = request.query_params
+    if FIELDS_PARAM not in params and EXPAND_PARAM not in params:
+        return None
+    fields = parse_paths(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None
+    return fields, parse_paths(params.get(EXPAND_PARAM, ""))
+
+
+def _expanded(fields, expand):
+    # Asking for fields of a nested object expands it.
+    return set(expand) | {name for name, sub in (fields or {}).items() if sub}
+
+
+def _descend(fields, expand, name):
+    return (fields or {}).get(name) or None, expand.get(name, {})
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin honouring the `?fields=` and `?expand=` query parameters
+    of GET requests.
+
+    `fields` lists the fields to render, `expand` the nested objects to
+    render in full; nested serializers that are not expanded are rendered as
+    primary keys. Both take comma separated, dotted paths, e.g.
+    `?fields=id,number,lines.qty&expand=lines.product`. Requests with neither
+    parameter get the full representation.
+    """
+
+    # Model fields and relations read by fields that are not model fields,
+    # e.g. {"availables": ("availables", "stock_stripes", "stripes")}.
+    sparse_requires = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        params = sparse_params(self.context.get("request"))
+        if params is None:
+            return fields
+
+        selected, expand = params
+        for name in self._sparse_path():
+            selected, expand = _descend(selected, expand, name)
+
+        expanded = _expanded(selected, expand)
+        for name, field in list(fields.items()):
+            if selected is not None and name not in selected:
+                del fields[name]
+            elif isinstance(field, serializers.BaseSerializer) and name not in expanded:
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True,
+                    many=isinstance(field, serializers.ListSerializer),
+                    source=field.source,
+                )
+        return fields
+
+    def _sparse_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return reversed(names)
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _to_many(field):
+    return field.one_to_many or field.many_to_many
+
+
+def _plan(serializer, model, selected, expand):
+    """
+    Work out what rendering `serializer` with `selected` fields reads from
+    `model`: (the names for .only(), or None to load every column, the
+    select_related paths, the prefetch_related lookups).
+    """
+    only = {model._meta.pk.name}
+    complete = True
+    selects, prefetches = [], []
+    expanded = _expanded(selected, expand)
+    requires = getattr(serializer, "sparse_requires", {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only or (selected is not None and name not in selected):
+            continue
+
+        if isinstance(field, serializers.BaseSerializer):
+            relation = _model_field(model, field.source)
+            if relation is None or not relation.is_relation:
+                complete = False
+                continue
+            related = relation.related_model
+            if name in expanded:
+                child = getattr(field, "child", field)
+                sub = _plan(child, related, *_descend(selected, expand, name))
+            else:
+                sub = ({related._meta.pk.name}, [], [])
+            if _to_many(relation):
+                prefetches.append(_prefetch(relation, field.source, sub))
+            else:
+                only.add(field.source)
+                if name in expanded:
+                    _join(field.source, sub, only, selects, prefetches)
+            continue
+
+        for source in requires.get(name, (field.source,)):
+            if source == "*":
+                continue
+            head = source.split(".")[0]
+            model_field = _model_field(model, head)
+            if model_field is None:
+                complete = False
+            elif model_field.is_relation and _to_many(model_field):
+                prefetches.append(head)
+            else:
+                only.add(head)
+                if model_field.is_relation and "." in source:
+                    selects.append(head)
+
+    return (only if complete else None), selects, prefetches
+
+
+def _join(source, sub, only, selects, prefetches):
+    sub_only, sub_selects, sub_prefetches = sub
+    if sub_only is not None:
+        only.update(f"{source}__{name}" for name in sub_only)
+    selects.append(source)
+    selects.extend(f"{source}__{path}" for path in sub_selects)
+    for lookup in sub_prefetches:
+        if isinstance(lookup, Prefetch):
+            lookup = Prefetch(
+                f"{source}__{lookup.prefetch_through}", queryset=lookup.queryset
+            )
+        else:
+            lookup = f"{source}__{lookup}"
+        prefetches.append(lookup)
+
+
+def _prefetch(relation, source, sub):
+    sub_only, sub_selects, sub_prefetches = sub
+    queryset = relation.related_model._default_manager.all()
+    if sub_only is not None:
+        if relation.one_to_many:
+            # The prefetch matches rows back to their parent by this key.
+            sub_only = {*sub_only, relation.field.name}
+        queryset = queryset.only(*sub_only)
+    if sub_selects:
+        queryset = queryset.select_related(*sub_selects)
+    return Prefetch(source, queryset=queryset.prefetch_related(*sub_prefetches))
+
+
+def sparse_queryset(queryset, serializer_class, request, keep=()):
+    """
+    Trim `queryset` to what `serializer_class` renders for the fields and
+    expansions of `request`: columns with .only(), and joins and prefetches
+    for the expanded relations alone. Fields named in `keep` (e.g. the
+    pagination ordering) are always loaded.
+    """
+    params = sparse_params(request)
+    if params is None:
+        return queryset
+    only, selects, prefetches = _plan(serializer_class(), queryset.model, *params)
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if only is not None:
+        queryset = queryset.only(*only, *keep)
+    # select_related() without arguments would follow every foreign key.
+    if selects:
+        queryset = queryset.select_related(*selects)
+    return queryset.prefetch_related(*prefetches)
+
+
+class SparseFieldsetMixin:
+    """
+    Viewset mixin loading only what the `?fields=` and `?expand=` of a GET
+    request render (see SparseFieldsMixin and sparse_queryset).
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        keep = [name.lstrip("-") for name in getattr(self, "keyset_ordering", ())]
+        return sparse_queryset(
+            queryset, self.get_serializer_class(), self.request, keep
+        )
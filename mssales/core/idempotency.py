@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADERS = ("Location",)
+
+# A key still in flight after this long belongs to a request that died before
+# storing its response; the next retry takes it over.
+IN_FLIGHT_TIMEOUT = timedelta(minutes=1)
+POLL_INTERVAL = 0.05
+
+
+def _fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(record):
+    response = Response(
+        record.response_body,
+        status=record.status_code,
+        headers=record.response_headers,
+    )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _error(message, status_code):
+    return Response({"status": status_code, "message": message}, status=status_code)
+
+
+def _claim(key, scope, fingerprint):
+    """
+    Register the key as in flight. Returns (record, created); when the key is
+    already known the existing record is returned instead, with expired or
+    abandoned records being taken over.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                key=key,
+                scope=scope,
+                request_hash=fingerprint,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            )
+        return record, True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(key=key, scope=scope).first()
+    abandoned = record is not None and (
+        record.expires_at <= now
+        or (record.status_code is None and record.created_at <= now - IN_FLIGHT_TIMEOUT)
+    )
+    if record is None or abandoned:
+        if record is not None:
+            IdempotencyKey.objects.filter(
+                pk=record.pk, status_code=record.status_code
+            ).delete()
+        return _claim(key, scope, fingerprint)
+    return record, False
+
+
+def _wait_for(record):
+    """Wait up to IDEMPOTENCY_KEY_WAIT seconds for an in-flight request to finish."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_KEY_WAIT
+    while record is not None and record.status_code is None:
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def idempotent(view_method):
+    """
+    Make a viewset action honour the Idempotency-Key request header.
+
+    The first request carrying a key runs normally and its response is stored
+    for IDEMPOTENCY_KEY_TTL seconds. Retries with the same key, from the same
+    user on the same endpoint, get the stored response back without running the
+    action again. A retry arriving while the first request is still running
+    waits up to IDEMPOTENCY_KEY_WAIT seconds for it, then gets a 409. Reusing a
+    key with a different payload is rejected with a 422. Server errors and
+    conflicts are not stored, so the request can be retried.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return _error(
+                f"{IDEMPOTENCY_HEADER} must be at most 255 characters",
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        scope = f"{request.user.pk}:{request.method}:{request.path}"[:255]
+        fingerprint = _fingerprint(request)
+        record, created = _claim(key, scope, fingerprint)
+
+        if not created:
+            if record.request_hash != fingerprint:
+                return _error(
+                    f"{IDEMPOTENCY_HEADER} was already used for a different request",
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            record = _wait_for(record)
+            if record is None or record.status_code is None:
+                return _error(
+                    "A request with this idempotency key is already in progress",
+                    status.HTTP_409_CONFLICT,
+                )
+            return _replay(record)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if (
+            response.status_code >= 500
+            or response.status_code == status.HTTP_409_CONFLICT
+        ):
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.response_body = response.data
+        record.response_headers = {
+            name: response[name]
+            for name in REPLAYED_HEADERS
+            if response.has_header(name)
+        }
+        record.save(update_fields=["status_code", "response_body", "response_headers"])
+        return response
+
+    return wrapper
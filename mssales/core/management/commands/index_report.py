@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Indexes never scanned since the statistics were last reset. Unique and
+# primary key indexes enforce constraints and are never reported.
+UNUSED_INDEXES = """
+    SELECT s.relname, s.indexrelname, pg_relation_size(s.indexrelid)
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+    ORDER BY pg_relation_size(s.indexrelid) DESC
+"""
+
+# Tables read mostly by sequential scans, each reading many rows: candidates
+# for a missing index.
+SEQUENTIAL_TABLES = """
+    SELECT relname, seq_scan, seq_tup_read, coalesce(idx_scan, 0), n_live_tup
+    FROM pg_stat_user_tables
+    WHERE seq_scan > coalesce(idx_scan, 0)
+        AND n_live_tup >= %s
+        AND seq_tup_read / greatest(seq_scan, 1) >= %s
+    ORDER BY seq_tup_read DESC
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Report unused indexes and tables that look like they miss one, from "
+        "the PostgreSQL statistics collector (pg_stat_user_indexes and "
+        "pg_stat_user_tables). The numbers cover the activity since the "
+        "statistics were last reset, so run it against a database that has "
+        "served real traffic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=10_000,
+            help="Ignore tables with fewer live rows.",
+        )
+        parser.add_argument(
+            "--min-rows-per-scan",
+            type=int,
+            default=1_000,
+            help="Ignore tables whose sequential scans read fewer rows on average.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("index_report reads PostgreSQL statistics.")
+
+        with connection.cursor() as cursor:
+            cursor.execute(UNUSED_INDEXES)
+            unused = cursor.fetchall()
+            cursor.execute(
+                SEQUENTIAL_TABLES,
+                [options["min_rows"], options["min_rows_per_scan"]],
+            )
+            sequential = cursor.fetchall()
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Unused indexes"))
+        for table, index, size in unused:
+            self.stdout.write(f"  {table}.{index}: never scanned, {size // 1024} kB")
+        if not unused:
+            self.stdout.write("  none")
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Possibly missing indexes"))
+        for table, seq_scans, rows_read, index_scans, live_rows in sequential:
+            self.stdout.write(
+                f"  {table}: {seq_scans} sequential scans reading "
+                f"{rows_read // max(seq_scans, 1)} rows each on average, "
+                f"{index_scans} index scans, {live_rows} rows"
+            )
+        if not sequential:
+            self.stdout.write("  none")
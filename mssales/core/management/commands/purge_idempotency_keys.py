@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete the idempotency keys whose TTL has expired, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        purged = 0
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list(
+                    "pk", flat=True
+                )[: options["chunk_size"]]
+            )
+            if not ids:
+                break
+            IdempotencyKey.objects.filter(pk__in=ids).delete()
+            purged += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} idempotency keys"))
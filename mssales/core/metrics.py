@@ -0,0 +1,26 @@
+import threading
+from collections import Counter
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, value=1):
+    """Add `value` to the process-wide counter `name`."""
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot(prefix=""):
+    """Return a copy of the counters whose name starts with `prefix`."""
+    with _lock:
+        return {
+            name: value
+            for name, value in sorted(_counters.items())
+            if name.startswith(prefix)
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
@@ -1,8 +1,30 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
 from django_softdelete.models import SoftDeleteModel
 
+# Condition of partial indexes over the rows the default managers return.
+LIVE_ROWS = models.Q(deleted_at__isnull=True)
+
+
+class ByteOrder(models.Func):
+    """
+    `expression` compared byte by byte, so that a plain btree index over it
+    serves both LIKE 'prefix%' and ORDER BY: the "C" collation on PostgreSQL,
+    BINARY on SQLite.
+    """
+
+    template = '(%(expressions)s COLLATE "C")'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="(%(expressions)s COLLATE BINARY)",
+            **extra_context,
+        )
+
 
 class TimeStampedModel(SoftDeleteModel):
     created_at = models.DateTimeField(
@@ -12,3 +34,28 @@ class TimeStampedModel(SoftDeleteModel):
 
     class Meta:
         abstract = True
+
+
+class IdempotencyKey(models.Model):
+    """The stored outcome of a request sent with an Idempotency-Key header."""
+
+    key = models.CharField(max_length=255)
+    # Who sent the request and which endpoint it targeted.
+    scope = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    # Null while the first request carrying the key is still being processed.
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    response_headers = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key", "scope"], name="unique_idempotency_key_scope"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
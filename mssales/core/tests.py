@@ -1,3 +1,212 @@
-from django.test import TestCase
+import unittest
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from core import metrics
+from core.transactions import TransactionConflict, get_policy, run_atomic
+from products.models import Order, Product
+from suppliers.models import Vendor
+from telesales.models import (
+    ConfirmationRequest,
+    Customer,
+    Reservation,
+    SalesOrder,
+    SalesOrderLine,
+)
+
+
+class AuthenticatedAPITestCase(APITestCase):
+    """API tests run as a superuser."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+
+@override_settings(
+    TRANSACTION_POLICIES={
+        "default": {"max_attempts": 3},
+        "confirm": {"max_attempts": 5, "lock": "nowait"},
+    }
+)
+@mock.patch("core.transactions.time.sleep")
+class RunAtomicTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def flaky(self, failures):
+        """A function raising a lock conflict `failures` times, then succeeding."""
+        calls = []
+
+        def func():
+            calls.append(None)
+            if len(calls) <= failures:
+                raise OperationalError("database is locked")
+            return len(calls)
+
+        return func
+
+    def test_policies_override_the_default(self, sleep):
+        policy = get_policy("confirm")
+        self.assertEqual((policy["max_attempts"], policy["lock"]), (5, "nowait"))
+        policy = get_policy("cancel")
+        self.assertEqual((policy["max_attempts"], policy["lock"]), (3, "wait"))
+        with override_settings(TRANSACTION_POLICIES={"default": {"lock": "later"}}):
+            with self.assertRaises(ValueError):
+                get_policy("confirm")
+
+    def test_lock_conflicts_are_retried(self, sleep):
+        self.assertEqual(run_atomic("cancel", self.flaky(2)), 3)
+
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(
+            metrics.snapshot("transactions."),
+            {"transactions.cancel.attempts": 3, "transactions.cancel.retries": 2},
+        )
+
+    def test_gives_up_after_max_attempts(self, sleep):
+        with self.assertRaises(TransactionConflict), self.assertLogs(
+            "core.transactions", "WARNING"
+        ):
+            run_atomic("cancel", self.flaky(3))
+
+        self.assertEqual(
+            metrics.snapshot("transactions.cancel.conflicts"),
+            {"transactions.cancel.conflicts": 1},
+        )
+
+    def test_other_errors_are_not_retried(self, sleep):
+        def func():
+            raise IntegrityError("duplicate key")
+
+        with self.assertRaises(IntegrityError):
+            run_atomic("confirm", func)
+
+        sleep.assert_not_called()
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Reads PostgreSQL plans")
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class IndexUsageTests(AuthenticatedAPITestCase):
+    """
+    The page query of each list endpoint reads its table through an index
+    rather than scanning and sorting it. Sequential scans are disabled while
+    explaining, so the plan does not depend on how many rows the tables hold.
+    """
+
+    # The list endpoints, the table their page query reads and the index it
+    # must read it through. Cursor URLs are explained on their second page.
+    endpoints = {
+        "/api/products/": ("products_product", "product_catalog_idx"),
+        "/api/products/?pagination=cursor&page_size=1": (
+            "products_product",
+            "product_catalog_idx",
+        ),
+        "/api/sales/orders/": ("telesales_salesorder", "sales_order_live_created_idx"),
+        "/api/sales/orders/?pagination=cursor&page_size=1": (
+            "telesales_salesorder",
+            "sales_order_live_keyset_idx",
+        ),
+        "/api/sales/orders/?status=CONFIRMED&created_at__gte=2020-01-01T00:00:00Z": (
+            "telesales_salesorder",
+            "sales_order_live_status_idx",
+        ),
+        "/api/sales/orders/lines/": (
+            "telesales_salesorderline",
+            "telesales_salesorderline_pkey",
+        ),
+        "/api/sales/reservations/": (
+            "telesales_reservation",
+            "reservation_live_created_idx",
+        ),
+        "/api/sales/reservations/?pagination=cursor&page_size=1": (
+            "telesales_reservation",
+            "reservation_live_created_idx",
+        ),
+        "/api/sales/confirmations/": (
+            "telesales_confirmationrequest",
+            "telesales_confirmationrequest_created_at_",
+        ),
+        "/api/sales/customers/": ("telesales_customer", "telesales_customer_email_key"),
+        "/api/purchase-orders/": ("products_order", "purchase_order_live_idx"),
+        "/api/vendors/": ("suppliers_vendor", "vendor_live_name_idx"),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Two rows of the cursor paginated tables, for a second page.
+        product, _ = Product.objects.bulk_create(
+            Product(name=name, sales_price=Decimal("1.00"), cost=Decimal("1.00"))
+            for name in ("Product", "Other product")
+        )
+        customer = Customer.objects.create(
+            name="Customer", email="customer@example.com", phone="0"
+        )
+        sale_order, _ = SalesOrder.objects.bulk_create(
+            SalesOrder(customer=customer, number=number, status="CONFIRMED")
+            for number in ("SO-1", "SO-2")
+        )
+        SalesOrderLine.objects.create(order=sale_order, product=product, qty=1)
+        Reservation.objects.bulk_create(
+            Reservation(order=sale_order, product=product, qty=1) for _ in range(2)
+        )
+        ConfirmationRequest.objects.create(order=sale_order)
+        vendor = Vendor.objects.create(name="Vendor")
+        Order.objects.create(
+            priority="Normal",
+            order_reference="PO-1",
+            vendor=vendor,
+            purchase_representative="Buyer",
+            order_deadline=timezone.now(),
+            total=Decimal("0"),
+            status="Purchase Order",
+        )
+
+    def page_query(self, url, table):
+        if "pagination=cursor" in url:
+            # Explain a page reached through a cursor, not the first page.
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            url = response.json()["next"]
+            self.assertIsNotNone(url)
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for sql, params in queries:
+            if f'FROM "{table}"' in sql and "ORDER BY" in sql:
+                return sql, params
+        self.fail(f"{url} ran no ordered query on {table}")
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            cursor.execute("SET LOCAL enable_seqscan = on")
+        return plan
+
+    def test_list_endpoints_read_their_table_through_an_index(self):
+        for url, (table, index) in self.endpoints.items():
+            with self.subTest(url=url):
+                plan = self.explain(*self.page_query(url, table))
+                scan = rf"Index (Only )?Scan( Backward)? using {index}\S* on {table}"
+                self.assertRegex(plan, scan)
+                # The index gives the rows in order: no Sort, nor Incremental
+                # Sort, on top of the scan.
+                self.assertNotIn("Sort", plan)
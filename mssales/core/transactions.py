@@ -0,0 +1,135 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, OperationalError, connection, transaction
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+LOCK_MODES = ("wait", "nowait", "skip_locked")
+
+# serialization_failure, deadlock_detected, lock_not_available (NOWAIT and
+# lock_timeout both raise the latter).
+RETRYABLE_SQLSTATES = {"40001", "40P01", "55P03"}
+
+DEFAULT_POLICY = {
+    "lock": "wait",
+    "lock_timeout": None,
+    "max_attempts": 1,
+    "backoff": 0.05,
+    "max_backoff": 1.0,
+}
+
+_current_policy = ContextVar("transaction_policy", default=None)
+
+
+class LockNotAvailable(DatabaseError):
+    """A row needed by the transaction is locked by another transaction."""
+
+
+class TransactionConflict(DatabaseError):
+    """A transaction still hit lock conflicts after all its attempts."""
+
+
+def get_policy(endpoint):
+    """
+    Return the transaction policy of `endpoint`: DEFAULT_POLICY, overridden by
+    TRANSACTION_POLICIES["default"], overridden by TRANSACTION_POLICIES[endpoint].
+
+    - lock: how row locks are taken by for_update(): "wait" blocks (bounded by
+      lock_timeout), "nowait" fails at once, "skip_locked" ignores locked rows.
+    - lock_timeout: longest wait for a lock in milliseconds (PostgreSQL only),
+      None to wait indefinitely.
+    - max_attempts: attempts made before giving up on lock conflicts, deadlocks
+      and serialization failures.
+    - backoff, max_backoff: base and cap, in seconds, of the jittered
+      exponential delay slept between attempts.
+    """
+    policies = getattr(settings, "TRANSACTION_POLICIES", {})
+    policy = {
+        **DEFAULT_POLICY,
+        **policies.get("default", {}),
+        **policies.get(endpoint, {}),
+    }
+    if policy["lock"] not in LOCK_MODES:
+        raise ValueError(
+            f"Unknown lock mode {policy['lock']!r} for {endpoint}, expected one of {LOCK_MODES}"
+        )
+    return policy
+
+
+def for_update(queryset):
+    """Apply select_for_update() as the lock mode of the current policy says."""
+    policy = _current_policy.get() or DEFAULT_POLICY
+    return queryset.select_for_update(
+        nowait=policy["lock"] == "nowait", skip_locked=policy["lock"] == "skip_locked"
+    )
+
+
+def skips_locked():
+    """Whether for_update() currently skips locked rows instead of waiting."""
+    policy = _current_policy.get() or DEFAULT_POLICY
+    return policy["lock"] == "skip_locked"
+
+
+def is_retryable(error):
+    if isinstance(error, LockNotAvailable):
+        return True
+    cause = error.__cause__
+    sqlstate = getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)
+    if sqlstate:
+        return sqlstate in RETRYABLE_SQLSTATES
+    # SQLite reports lock contention as "database is locked".
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def _backoff(policy, attempt):
+    ceiling = min(policy["max_backoff"], policy["backoff"] * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def run_atomic(endpoint, func, *args, **kwargs):
+    """
+    Run `func(*args, **kwargs)` in a transaction governed by the policy of
+    `endpoint` (see get_policy) and return its result.
+
+    Deadlocks, serialization failures and lock conflicts roll the transaction
+    back and run it again after a jittered exponential backoff, up to
+    max_attempts times; the last failure is raised as TransactionConflict.
+    Other errors are raised as they are. The counters
+    `transactions.<endpoint>.attempts`, `.retries` and `.conflicts` track how
+    often this happens.
+    """
+    policy = get_policy(endpoint)
+    token = _current_policy.set(policy)
+    try:
+        attempt = 1
+        while True:
+            metrics.incr(f"transactions.{endpoint}.attempts")
+            try:
+                with transaction.atomic():
+                    if policy["lock_timeout"] and connection.vendor == "postgresql":
+                        with connection.cursor() as cursor:
+                            cursor.execute(
+                                "SELECT set_config('lock_timeout', %s, true)",
+                                [f"{int(policy['lock_timeout'])}ms"],
+                            )
+                    return func(*args, **kwargs)
+            except DatabaseError as e:
+                if not is_retryable(e):
+                    raise
+                if attempt >= policy["max_attempts"]:
+                    metrics.incr(f"transactions.{endpoint}.conflicts")
+                    logger.warning(
+                        "%s gave up after %s attempts: %s", endpoint, attempt, e
+                    )
+                    raise TransactionConflict(str(e)) from e
+                metrics.incr(f"transactions.{endpoint}.retries")
+                time.sleep(_backoff(policy, attempt))
+                attempt += 1
+    finally:
+        _current_policy.reset(token)
@@ -1,5 +1,15 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
@@ -10,3 +20,232 @@ class CustomPagination(PageNumberPagination):
 
 def custom_response(data=None, message="", status=200):
     return Response({"message": message, "data": data, "status": status}, status)
+
+
+def approximate_count(queryset):
+    """
+    Estimate the number of rows of `queryset` from the planner statistics on
+    PostgreSQL, which costs an EXPLAIN instead of a COUNT(*) scan. Other
+    databases get an exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def update_from_values(model, rows, assignments, params=()):
+    """
+    Update many rows of `model` with one UPDATE ... FROM (VALUES ...) and
+    return the number of rows updated.
+
+    `rows` are tuples starting with a primary key; their other items are
+    v.column2, v.column3... in `assignments`, which maps columns to SQL
+    expressions where "{table}" stands for the quoted table name and %s for
+    the items of `params`. Unlike the CASE of bulk_update, the statement
+    costs the same per row whatever the number of rows.
+    """
+    if not rows:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    primary_key = connection.ops.quote_name(model._meta.pk.column)
+    row = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+    updates = ", ".join(
+        f"{connection.ops.quote_name(column)} = {expression.format(table=table)}"
+        for column, expression in assignments.items()
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {updates} "
+            f"FROM (VALUES {', '.join([row] * len(rows))}) AS v "
+            f"WHERE {table}.{primary_key} = v.column1",
+            [*params, *(item for row in rows for item in row)],
+        )
+        return cursor.rowcount
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a unique ordering, e.g. ("-created_at", "-id").
+
+    Each page is fetched with a WHERE clause on the ordering values of the last
+    row seen, so it costs an index range scan however deep it is, and no
+    COUNT(*) is run. Cursors are opaque base64 tokens. Null values sort as the
+    largest values, first in descending order and last in ascending order, as
+    in a default PostgreSQL index, so that a ("-created_at", "-id") index
+    serves the pages in both directions. `?count=approximate` adds an
+    approximate_count of the whole result (see approximate_count).
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    max_page_size = 100
+
+    def __init__(self, ordering=("-created_at", "-id"), page_size=None):
+        self.ordering = [
+            (field.lstrip("-"), field.startswith("-")) for field in ordering
+        ]
+        self.page_size = page_size or api_settings.PAGE_SIZE
+
+    @classmethod
+    def requested(cls, request):
+        """Whether the request asks for keyset pagination."""
+        return request is not None and (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get("pagination") == "cursor"
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.approximate_count = (
+            approximate_count(queryset)
+            if request.query_params.get(self.count_query_param) == "approximate"
+            else None
+        )
+
+        position, backwards = self.decode_cursor(request, queryset.model)
+        ordering = [
+            (name, descending != backwards) for name, descending in self.ordering
+        ]
+        queryset = queryset.order_by(
+            *(
+                (
+                    F(name).desc(nulls_first=True)
+                    if descending
+                    else F(name).asc(nulls_last=True)
+                )
+                for name, descending in ordering
+            )
+        )
+        if position is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, position))
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if backwards:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows and (has_more or backwards):
+            self.next_position = self._position(rows[-1])
+        if rows and (has_more or not backwards) and position is not None:
+            self.previous_position = self._position(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = {
+            "next": self.encode_cursor(self.next_position, backwards=False),
+            "previous": self.encode_cursor(self.previous_position, backwards=True),
+            "results": data,
+        }
+        if self.approximate_count is not None:
+            payload = {"approximate_count": self.approximate_count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "approximate_count": {"type": "integer", "nullable": True},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def _position(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name, _ in self.ordering]
+        return [getattr(row, name) for name, _ in self.ordering]
+
+    def _after(self, model, ordering, position):
+        """
+        Rows strictly after `position` in `ordering`. Nulls sort first in
+        descending order, so a page after a value is a plain range of the index;
+        only ascending pages of nullable columns, the backward walk of a
+        descending ordering, also take the nulls that follow the values.
+        """
+        after = Q(pk__in=[])
+        equal = Q()
+        for (name, descending), value in zip(ordering, position):
+            if value is None:
+                # Every value follows a null in descending order, nothing does
+                # in ascending order.
+                step = Q(**{f"{name}__isnull": False}) if descending else Q(pk__in=[])
+                same = Q(**{f"{name}__isnull": True})
+            else:
+                step = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+                if not descending and model._meta.get_field(name).null:
+                    step |= Q(**{f"{name}__isnull": True})
+                same = Q(**{name: value})
+            after |= equal & step
+            equal &= same
+        return after
+
+    def encode_cursor(self, position, backwards):
+        if position is None:
+            return None
+        token = json.dumps(
+            {"p": [None if value is None else str(value) for value in position]}
+            | ({"b": 1} if backwards else {}),
+            separators=(",", ":"),
+        )
+        cursor = base64.urlsafe_b64encode(token.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            token = json.loads(
+                base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            )
+            values = token["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                None if value is None else model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound("Invalid cursor")
+        return position, bool(token.get("b"))
+
+
+class KeysetPaginationMixin:
+    """
+    Let list requests choose keyset pagination with `?pagination=cursor` (or by
+    sending a `?cursor=`), ordered by `keyset_ordering`; other requests keep
+    the viewset's page number pagination.
+    """
+
+    keyset_ordering = ("-created_at", "-id")
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and KeysetPagination.requested(
+            getattr(self, "request", None)
+        ):
+            page_size = getattr(self.pagination_class, "page_size", None)
+            self._paginator = KeysetPagination(self.keyset_ordering, page_size)
+        return super().paginator
@@ -1,3 +1,23 @@
-from django.shortcuts import render
+from rest_framework.permissions import IsAdminUser
+from rest_framework.views import APIView
 
-# Create your views here.
+from core import metrics
+from core.cache import ratios
+from core.utils import custom_response
+
+
+class MetricsView(APIView):
+    """
+    Process-wide counters, e.g. transaction attempts, retries and conflicts,
+    and the hit and miss ratios of the response caches.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        prefix = request.query_params.get("prefix", "")
+        data = metrics.snapshot(prefix)
+        data.update(
+            (name, value) for name, value in ratios().items() if name.startswith(prefix)
+        )
+        return custom_response(data=data, message="Metrics retrieved successfully")
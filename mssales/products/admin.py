@@ -1,11 +1,20 @@
 from django.contrib import admin
 
 from core.admin import SoftDeleteAdmin
-from products.models import Product
+from products.models import Product, ProductStockStripe
+
+
+class ProductStockStripes(admin.TabularInline):
+    model = ProductStockStripe
+    readonly_fields = ("stripe", "availables")
+    can_delete = False
+    extra = 0
+    max_num = 0
 
 
 @admin.register(Product)
 class ProductAdmin(SoftDeleteAdmin):
+    inlines = [ProductStockStripes]
     ordering = ["-created_at"]
     list_display = ("id", "name", "created_at")
     readonly_fields = ("sales_price",)
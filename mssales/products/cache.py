@@ -0,0 +1,17 @@
+from django.db import transaction
+
+from core.cache import ResponseCache
+
+# Cached product list and detail responses. The "list" generation covers every
+# list page, each product has a generation of its own for its detail page.
+catalog_cache = ResponseCache("products")
+
+
+def invalidate_products(product_ids):
+    """
+    Invalidate the cached catalog responses showing `product_ids`, once the
+    current transaction commits (right away outside of one). A rolled back
+    change invalidates nothing.
+    """
+    scopes = ["list", *sorted(set(product_ids))]
+    transaction.on_commit(lambda: catalog_cache.bump(*scopes), robust=True)
@@ -0,0 +1,188 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from core.utils import update_from_values
+from telesales.models import Reservation, SalesOrderLine
+from .cache import invalidate_products
+from .models import OrderLine, Product
+
+# Purchase orders whose lines are still to be received.
+INCOMING_STATUSES = ("Purchase Order",)
+
+
+def _columns(rows, count, dtype=np.int64):
+    """`rows` of equal length tuples as one NumPy array per column."""
+    table = np.fromiter(rows, dtype=(dtype, count))
+    return [table[:, column] for column in range(count)]
+
+
+def _per_product(ids, product_ids, values):
+    """
+    Scatter `values` of `product_ids` onto the catalog `ids` (sorted),
+    summing duplicates and dropping products outside the catalog.
+    """
+    positions = np.searchsorted(ids, product_ids)
+    positions = np.minimum(positions, len(ids) - 1)
+    known = ids[positions] == product_ids
+    return np.bincount(
+        positions[known], weights=values[known], minlength=len(ids)
+    ).astype(np.float64)
+
+
+def load_catalog():
+    """Primary keys, stock on hand and current forecast of the live products."""
+    return _columns(
+        Product.objects.order_by("pk").values_list(
+            "pk", "quantity_on_hand", "forecasted_quantity"
+        ),
+        3,
+    )
+
+
+def load_reserved(ids):
+    """Quantity held by the open reservations of each product."""
+    rows = (
+        Reservation.objects.order_by()
+        .values("product_id")
+        .annotate(quantity=Sum("qty"))
+        .values_list("product_id", "quantity")
+    )
+    product_ids, quantities = _columns(rows, 2)
+    return _per_product(ids, product_ids, quantities)
+
+
+def load_incoming(ids):
+    """Quantity of each product on purchase orders still to be received."""
+    rows = (
+        OrderLine.objects.filter(order__status__in=INCOMING_STATUSES)
+        .order_by()
+        .values("product_id")
+        .annotate(quantity=Sum(F("quantity") - F("received_quantity")))
+        .values_list("product_id", "quantity")
+    )
+    product_ids, quantities = _columns(rows, 2)
+    return _per_product(ids, product_ids, quantities)
+
+
+def load_demand(days):
+    """
+    The quantities of CONFIRMED sale orders of the last `days` days (today
+    included), per product and day, as a (product, age in days, quantity)
+    column triple; age 0 is today.
+    """
+    today = timezone.localdate()
+    since = timezone.make_aware(
+        datetime.combine(today - timedelta(days=days - 1), datetime.min.time())
+    )
+    rows = (
+        SalesOrderLine.objects.filter(
+            order__status="CONFIRMED", order__created_at__gte=since
+        )
+        .order_by()
+        .values("product_id", day=TruncDate("order__created_at"))
+        .annotate(quantity=Sum("qty"))
+        .values_list("product_id", "day", "quantity")
+    )
+    return _columns(
+        (
+            (product_id, (today - day).days, quantity)
+            for product_id, day, quantity in rows.iterator(chunk_size=10_000)
+        ),
+        3,
+    )
+
+
+def moving_average(ids, demand, window):
+    """Average daily demand of each product over the last `window` days."""
+    product_ids, ages, quantities = demand
+    recent = ages < window
+    return _per_product(ids, product_ids[recent], quantities[recent]) / window
+
+
+def compute_forecast(on_hand, reserved, incoming, short_average, long_average, horizon):
+    """
+    The forecasted quantity of every product: what is on hand, minus what is
+    reserved, plus what is incoming, minus the demand expected over the next
+    `horizon` days. Expected demand is the daily rate halfway between the
+    short and the long moving average, so that it follows recent changes
+    without chasing a single busy day.
+    """
+    rate = (short_average + long_average) / 2
+    return np.rint(on_hand - reserved + incoming - rate * horizon).astype(np.int64)
+
+
+def write_forecasts(product_ids, quantities):
+    """Set the forecasted_quantity of `product_ids` to `quantities`."""
+    update_from_values(
+        Product,
+        list(zip(product_ids, quantities)),
+        {"forecasted_quantity": "v.column2", "updated_at": "%s"},
+        [timezone.now()],
+    )
+    invalidate_products(product_ids)
+
+
+def forecast_catalog(
+    horizon=None, short_window=None, long_window=None, chunk_size=2000, dry_run=False
+):
+    """
+    Compute Product.forecasted_quantity for the whole catalog and write the
+    values that changed.
+
+    Stock, reservations, purchase order lines and the demand history are
+    loaded with one aggregate query each into NumPy arrays aligned on the
+    product primary keys; the forecast is computed over the whole catalog at
+    once (see compute_forecast) and written back `chunk_size` products per
+    UPDATE (see core.utils.update_from_values), each in its own transaction.
+    Returns a summary with the number of products, of changed forecasts and
+    the time taken by each step.
+    """
+    horizon = horizon or settings.FORECAST_HORIZON_DAYS
+    short_window = short_window or settings.FORECAST_SHORT_WINDOW_DAYS
+    long_window = long_window or settings.FORECAST_LONG_WINDOW_DAYS
+    timings = {}
+    started = clock = time.perf_counter()
+
+    def lap(step):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[step] = round(now - clock, 3)
+        clock = now
+
+    ids, on_hand, current = load_catalog()
+    summary = {"products": len(ids), "changed": 0, "timings": timings}
+    if not len(ids):
+        return summary
+    reserved = load_reserved(ids)
+    incoming = load_incoming(ids)
+    demand = load_demand(max(short_window, long_window))
+    lap("load")
+
+    forecast = compute_forecast(
+        on_hand,
+        reserved,
+        incoming,
+        moving_average(ids, demand, short_window),
+        moving_average(ids, demand, long_window),
+        horizon,
+    )
+    changed = np.flatnonzero(forecast != current)
+    summary["changed"] = len(changed)
+    lap("compute")
+
+    if not dry_run:
+        for start in range(0, len(changed), chunk_size):
+            chunk = changed[start : start + chunk_size]
+            with transaction.atomic():
+                write_forecasts(ids[chunk].tolist(), forecast[chunk].tolist())
+        lap("write")
+
+    timings["total"] = round(time.perf_counter() - started, 3)
+    return summary
@@ -0,0 +1,206 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+HISTORY_INTERVALS = ("day", "week", "month")
+STOCK = ("availables", "quantity_on_hand")
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _latest_snapshots(product_ids, at):
+    """{product_id: the product's latest StockSnapshot taken at or before `at`}."""
+    latest = (
+        StockSnapshot.objects.filter(product=OuterRef("pk"), taken_at__lte=at)
+        .order_by("-taken_at")
+        .values("pk")[:1]
+    )
+    snapshot_ids = (
+        Product.global_objects.filter(pk__in=product_ids)
+        .annotate(snapshot_id=Subquery(latest))
+        .values("snapshot_id")
+    )
+    return {
+        snapshot.product_id: snapshot
+        for snapshot in StockSnapshot.objects.filter(pk__in=snapshot_ids)
+    }
+
+
+def _compact_day(day, chunk_size):
+    start, end = _day_start(day), _day_start(day + timedelta(days=1))
+    moved = (
+        StockMovement.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by("product_id")
+        .values("product_id")
+        .annotate(**{column: Sum(column) for column in STOCK})
+    )
+    moved = {row.pop("product_id"): row for row in moved}
+    product_ids = sorted(moved)
+    for first in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[first : first + chunk_size]
+        previous = _latest_snapshots(chunk, start)
+        StockSnapshot.objects.bulk_create(
+            StockSnapshot(
+                product_id=product_id,
+                taken_at=end,
+                **{
+                    column: getattr(previous.get(product_id), column, 0)
+                    + moved[product_id][column]
+                    for column in STOCK
+                },
+            )
+            for product_id in chunk
+        )
+    return len(product_ids)
+
+
+def compact_movements(until, chunk_size=1000):
+    """
+    Snapshot the stock of every product that moved, at the end of each day
+    from the day after the last compacted one up to the day before `until`.
+
+    Each day is compacted in its own transaction: the day's movements are
+    summed per product and added to the product's previous snapshot. Products
+    that did not move keep their previous snapshot. Yields (day, number of
+    products snapshotted).
+    """
+    last = StockSnapshot.objects.aggregate(last=Max("taken_at"))["last"]
+    if last is not None:
+        day = timezone.localdate(last)
+    else:
+        first = StockMovement.objects.aggregate(first=Min("created_at"))["first"]
+        if first is None:
+            return
+        day = timezone.localdate(first)
+
+    while day < until:
+        with transaction.atomic():
+            yield day, _compact_day(day, chunk_size)
+        day += timedelta(days=1)
+
+
+def _movements_since(product_ids, snapshots, until):
+    """Movements of `product_ids` after their snapshot, up to `until`."""
+    condition = Q()
+    for product_id in product_ids:
+        snapshot = snapshots.get(product_id)
+        condition |= Q(
+            product_id=product_id,
+            **({"created_at__gte": snapshot.taken_at} if snapshot else {}),
+        )
+    return StockMovement.objects.filter(condition, created_at__lte=until)
+
+
+def stock_at(product_ids, at):
+    """
+    The stock of `product_ids` at `at`: {product_id: {"availables": ...,
+    "quantity_on_hand": ...}}.
+
+    Reads each product's latest snapshot at or before `at` and adds the
+    movements created since, which are at most a day's worth when
+    `manage.py compact_stock_movements` runs daily. The stock of a product
+    before its first movement is 0.
+    """
+    product_ids = list(product_ids)
+    snapshots = _latest_snapshots(product_ids, at)
+    stock = {
+        product_id: {
+            column: getattr(snapshots.get(product_id), column, 0) for column in STOCK
+        }
+        for product_id in product_ids
+    }
+    tail = (
+        _movements_since(product_ids, snapshots, at)
+        .order_by("product_id")
+        .values("product_id")
+        .annotate(**{column: Sum(column) for column in STOCK})
+    )
+    for row in tail:
+        for column in STOCK:
+            stock[row["product_id"]][column] += row[column]
+    return stock
+
+
+def _next_period(day, interval):
+    if interval == "day":
+        return day + timedelta(days=1)
+    if interval == "week":
+        return day + timedelta(weeks=1)
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def history_periods(start, end, interval):
+    """The first days of the `interval` periods covering `start` to `end`."""
+    if interval == "week":
+        start -= timedelta(days=start.weekday())
+    elif interval == "month":
+        start = start.replace(day=1)
+    periods = []
+    while start <= end:
+        periods.append(start)
+        start = _next_period(start, interval)
+    return periods
+
+
+def stock_history(product_ids, start, end, interval="day"):
+    """
+    The stock of `product_ids` at the close of each `interval` period from
+    `start` to `end`: {product_id: [(period, {"availables": ...,
+    "quantity_on_hand": ...}), ...]}. The current period closes now.
+
+    Reads the snapshots of the range, the snapshot each product had when the
+    range opened and the movements not compacted yet, in four queries
+    whatever the length of the range.
+    """
+    product_ids = list(product_ids)
+    now = timezone.now()
+    periods = history_periods(start, end, interval)
+    closes = [
+        min(_day_start(_next_period(period, interval)), now) for period in periods
+    ]
+    opened = _day_start(periods[0])
+    closed = closes[-1]
+
+    snapshots = defaultdict(list)
+    for snapshot in StockSnapshot.objects.filter(
+        product_id__in=product_ids, taken_at__gt=opened, taken_at__lte=closed
+    ).order_by("product_id", "taken_at"):
+        snapshots[snapshot.product_id].append(snapshot)
+    latest = _latest_snapshots(product_ids, closed)
+    opening = _latest_snapshots(product_ids, opened)
+    movements = defaultdict(list)
+    for movement in (
+        _movements_since(product_ids, latest, closed)
+        .order_by("product_id", "created_at")
+        .only("product_id", "created_at", *STOCK)
+    ):
+        movements[movement.product_id].append(movement)
+
+    history = {}
+    for product_id in product_ids:
+        current = {
+            column: getattr(opening.get(product_id), column, 0) for column in STOCK
+        }
+        pending_snapshots = iter(snapshots[product_id])
+        pending_movements = iter(movements[product_id])
+        snapshot = next(pending_snapshots, None)
+        movement = next(pending_movements, None)
+        points = []
+        for period, close in zip(periods, closes):
+            while snapshot is not None and snapshot.taken_at <= close:
+                current = {column: getattr(snapshot, column) for column in STOCK}
+                snapshot = next(pending_snapshots, None)
+            while movement is not None and movement.created_at < close:
+                for column in STOCK:
+                    current[column] += getattr(movement, column)
+                movement = next(pending_movements, None)
+            points.append((period, dict(current)))
+        history[product_id] = points
+    return history
@@ -0,0 +1,166 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.benchmarks import rolled_back
+from products.forecast import forecast_catalog
+from products.models import Order, OrderLine, Product
+from suppliers.models import Vendor
+from telesales.models import Customer, Reservation, SalesOrder, SalesOrderLine
+
+
+def _batched(objects, batch_size):
+    objects = iter(objects)
+    while batch := list(islice(objects, batch_size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark `manage.py forecast_products`: fill the catalog with "
+        "--products generated products, --orders confirmed sale orders with "
+        "their lines and reservations and --purchase-orders purchase orders, "
+        "then time the forecast of the whole catalog, which must finish "
+        "within --budget seconds. Works in a transaction that is rolled back, "
+        "so nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=200_000)
+        parser.add_argument("--orders", type=int, default=50_000)
+        parser.add_argument("--lines-per-order", type=int, default=4)
+        parser.add_argument("--purchase-orders", type=int, default=5_000)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--budget", type=float, default=10)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._setup(options)
+            summary = forecast_catalog()
+
+        timings = ", ".join(
+            f"{step} {seconds:.2f}s" for step, seconds in summary["timings"].items()
+        )
+        self.stdout.write(
+            f"Forecast {summary['products']} products, {summary['changed']} "
+            f"changed: {timings}"
+        )
+        if summary["timings"]["total"] > options["budget"]:
+            raise CommandError(f"Over the {options['budget']}s budget")
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _setup(self, options):
+        started = time.perf_counter()
+        tag = uuid.uuid4().hex[:8]
+        rng = random.Random(tag)
+        batch_size = options["batch_size"]
+        product_count = options["products"]
+
+        first = Product.objects.order_by("-pk").values_list("pk", flat=True).first()
+        for batch in _batched(
+            (
+                Product(
+                    name=f"forecast {tag} #{i}",
+                    sales_price=Decimal("10.00"),
+                    cost=Decimal("6.00"),
+                    quantity_on_hand=rng.randint(0, 500),
+                    availables=500,
+                )
+                for i in range(product_count)
+            ),
+            batch_size,
+        ):
+            Product.objects.bulk_create(batch)
+        product_ids = list(
+            Product.objects.filter(pk__gt=first or 0).values_list("pk", flat=True)
+        )
+
+        customer = Customer.objects.create(
+            name=f"forecast {tag}", email=f"forecast-{tag}@example.com", phone="0"
+        )
+        for batch in _batched(
+            (
+                SalesOrder(
+                    customer=customer, number=f"FORECAST-{tag}-{i}", status="CONFIRMED"
+                )
+                for i in range(options["orders"])
+            ),
+            batch_size,
+        ):
+            SalesOrder.objects.bulk_create(batch)
+        order_ids = list(
+            SalesOrder.objects.filter(customer=customer).values_list("pk", flat=True)
+        )
+        lines = [
+            (order_id, rng.choice(product_ids), rng.randint(1, 5))
+            for order_id in order_ids
+            for _ in range(options["lines_per_order"])
+        ]
+        for batch in _batched(
+            (
+                SalesOrderLine(
+                    order_id=order_id,
+                    product_id=product_id,
+                    qty=qty,
+                    unit_price=Decimal("10.00"),
+                    sub_total=Decimal("10.00") * qty,
+                )
+                for order_id, product_id, qty in lines
+            ),
+            batch_size,
+        ):
+            SalesOrderLine.objects.bulk_create(batch)
+        for batch in _batched(
+            (
+                Reservation(order_id=order_id, product_id=product_id, qty=qty)
+                for order_id, product_id, qty in lines
+            ),
+            batch_size,
+        ):
+            Reservation.objects.bulk_create(batch)
+
+        vendor = Vendor.objects.create(name=f"forecast {tag}")
+        deadline = timezone.now()
+        for batch in _batched(
+            (
+                Order(
+                    priority="Normal",
+                    order_reference=f"FORECAST-{tag}-{i}",
+                    vendor=vendor,
+                    purchase_representative="benchmark",
+                    order_deadline=deadline,
+                    total=Decimal("0"),
+                    status="Purchase Order",
+                )
+                for i in range(options["purchase_orders"])
+            ),
+            batch_size,
+        ):
+            Order.objects.bulk_create(batch)
+        for batch in _batched(
+            (
+                OrderLine(
+                    order_id=order_id,
+                    product_id=rng.choice(product_ids),
+                    quantity=rng.randint(10, 100),
+                    price_unit=Decimal("6.00"),
+                    subtotal=Decimal("60.00"),
+                )
+                for order_id in Order.objects.filter(vendor=vendor).values_list(
+                    "pk", flat=True
+                )
+            ),
+            batch_size,
+        ):
+            OrderLine.objects.bulk_create(batch)
+
+        self.stdout.write(
+            f"Created {product_count} products, {len(order_ids)} sale orders with "
+            f"{len(lines)} lines and {options['purchase_orders']} purchase orders "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,146 @@
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.benchmarks import rolled_back
+from products.models import Product
+from products.search import ProductSearchFilter
+from products.views import ProductViewSet
+
+WORDS = [
+    "wireless",
+    "keyboard",
+    "mouse",
+    "monitor",
+    "cable",
+    "charger",
+    "speaker",
+    "headset",
+    "laptop",
+    "stand",
+    "adapter",
+    "battery",
+    "camera",
+    "router",
+    "printer",
+    "scanner",
+]
+CATEGORIES = ["Electronics", "Office", "Audio", "Networking", "Accessories"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ?search= on the product catalog: fill it with --products "
+        "generated products, then time words, prefixes, typos, barcodes and "
+        "internal references through ProductSearchFilter. On PostgreSQL the "
+        "p95 latency of every query must stay under --budget-ms. Works in a "
+        "transaction that is rolled back, so nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--budget-ms", type=float, default=20)
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Print the PostgreSQL plan of each search.",
+        )
+
+    def handle(self, *args, **options):
+        postgresql = connection.vendor == "postgresql"
+        if not postgresql:
+            self.stderr.write(
+                self.style.WARNING(
+                    f"{connection.vendor} uses the icontains fallback, which scans "
+                    "the table; the latency budget is only enforced on PostgreSQL."
+                )
+            )
+
+        over_budget = []
+        with rolled_back():
+            tag = self._setup(options["products"], options["batch_size"])
+            for label, search in self._searches(tag):
+                timings, count = self._time(search, options)
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1]
+                self.stdout.write(
+                    f"{label} {search!r}: {count} rows on the first page, "
+                    f"p50 {p50:.1f} ms, p95 {p95:.1f} ms"
+                )
+                if p95 > options["budget_ms"]:
+                    over_budget.append(label)
+                if options["explain"] and postgresql:
+                    self._explain(search, options["page_size"])
+
+        if postgresql and over_budget:
+            raise CommandError(
+                f"Over the {options['budget_ms']} ms budget: {', '.join(over_budget)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _setup(self, product_count, batch_size):
+        tag = uuid.uuid4().hex[:6].upper()
+        rng = random.Random(tag)
+        products = (
+            Product(
+                name=" ".join(rng.sample(WORDS, 3)) + f" {i}",
+                product_category=rng.choice(CATEGORIES),
+                favorite=rng.choice(("yes", "no")),
+                barcode=f"{tag}{i:09d}",
+                internal_reference=f"REF-{tag}-{i}",
+                sales_price=Decimal("12.50"),
+                cost=Decimal("7.25"),
+                quantity_on_hand=100,
+                availables=100,
+            )
+            for i in range(product_count)
+        )
+        started = time.perf_counter()
+        while batch := list(islice(products, batch_size)):
+            Product.objects.bulk_create(batch)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE products_product")
+        self.stdout.write(
+            f"Created {product_count} products in {time.perf_counter() - started:.1f}s"
+        )
+        return tag
+
+    def _searches(self, tag):
+        return [
+            ("word", "keyboard"),
+            ("words", "wireless mouse"),
+            ("prefix", "moni"),
+            ("typo", "wirless keybord"),
+            ("barcode", f"{tag}000004242"),
+            ("reference", f"REF-{tag}-4242"),
+        ]
+
+    def _filtered(self, search):
+        request = Request(APIRequestFactory().get("/api/products/", {"search": search}))
+        view = ProductViewSet()
+        return ProductSearchFilter().filter_queryset(
+            request, ProductViewSet.queryset.all(), view
+        )
+
+    def _time(self, search, options):
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            rows = list(self._filtered(search)[: options["page_size"]])
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, len(rows)
+
+    def _explain(self, search, page_size):
+        self.stdout.write(self._filtered(search)[:page_size].explain(analyze=True))
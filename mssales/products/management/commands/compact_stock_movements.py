@@ -0,0 +1,49 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.ledger import compact_movements
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the stock ledger into daily per-product snapshots (see "
+        "products.ledger), so that point-in-time stock and stock history read "
+        "a snapshot plus at most a day of movements. Compacts every whole day "
+        "not compacted yet, each in its own transaction; run it daily, e.g. "
+        "from cron after midnight. Movements are never deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--until",
+            type=date.fromisoformat,
+            help=(
+                "Compact the days before this one, YYYY-MM-DD (default: today, "
+                "once the day has been running for --lag-minutes)."
+            ),
+        )
+        parser.add_argument(
+            "--lag-minutes",
+            type=int,
+            default=60,
+            help=(
+                "Leave a finished day alone this long, for transactions that "
+                "wrote movements before midnight to commit."
+            ),
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        until = options["until"] or timezone.localdate(
+            timezone.now() - timedelta(minutes=options["lag_minutes"])
+        )
+        days = snapshots = 0
+        for day, count in compact_movements(until, options["chunk_size"]):
+            days += 1
+            snapshots += count
+            self.stdout.write(f"{day}: {count} products")
+        self.stdout.write(
+            self.style.SUCCESS(f"Compacted {days} days into {snapshots} snapshots")
+        )
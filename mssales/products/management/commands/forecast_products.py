@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from products.forecast import forecast_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute Product.forecasted_quantity for the whole catalog: stock on "
+        "hand, minus open reservations, plus purchase order lines still to be "
+        "received, minus the demand projected from the moving averages of "
+        "confirmed sales (see products.forecast). Only changed forecasts are "
+        "written. Run it daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horizon", type=int, help="Days of demand to project.")
+        parser.add_argument("--short-window", type=int)
+        parser.add_argument("--long-window", type=int)
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Compute the forecasts and report, without writing them.",
+        )
+
+    def handle(self, *args, **options):
+        summary = forecast_catalog(
+            horizon=options["horizon"],
+            short_window=options["short_window"],
+            long_window=options["long_window"],
+            chunk_size=options["chunk_size"],
+            dry_run=options["dry_run"],
+        )
+        timings = ", ".join(
+            f"{step} {seconds:.2f}s" for step, seconds in summary["timings"].items()
+        )
+        verb = "would change" if options["dry_run"] else "changed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Forecast {summary['products']} products, {verb} "
+                f"{summary['changed']}: {timings}"
+            )
+        )
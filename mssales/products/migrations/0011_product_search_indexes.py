@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# The expression must stay identical to products.search.SEARCH_DOCUMENT.
+SEARCH_DOCUMENT = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || "
+    "coalesce(product_category, '') || ' ' || coalesce(favorite, ''))"
+)
+
+CREATE_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS products_product_search_idx "
+    f"ON products_product USING gin ({SEARCH_DOCUMENT})",
+    "CREATE INDEX IF NOT EXISTS products_product_name_trgm_idx "
+    "ON products_product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS products_product_barcode_like_idx "
+    "ON products_product (barcode varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS products_product_reference_like_idx "
+    "ON products_product (internal_reference varchar_pattern_ops)",
+]
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS products_product_search_idx",
+    "DROP INDEX IF EXISTS products_product_name_trgm_idx",
+    "DROP INDEX IF EXISTS products_product_barcode_like_idx",
+    "DROP INDEX IF EXISTS products_product_reference_like_idx",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # Text search and trigram indexes only exist on PostgreSQL, other
+        # databases use the SearchFilter fallback.
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_product_stock_stripes"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_INDEXES), _run(DROP_INDEXES)),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_search_indexes'),
+        ('suppliers', '0002_live_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='purchase_order_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('available', True)), fields=['-created_at', '-id'], name='product_catalog_idx'),
+        ),
+    ]
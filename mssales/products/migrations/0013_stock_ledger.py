@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def record_opening_stock(apps, schema_editor):
+    # The ledger starts with the stock the products hold when it is created.
+    Product = apps.get_model("products", "Product")
+    StockMovement = apps.get_model("products", "StockMovement")
+    products = (
+        Product._base_manager.annotate(striped=Sum("stripes__availables"))
+        .values_list("pk", "availables", "striped", "quantity_on_hand")
+        .order_by("pk")
+    )
+    batch = []
+    for pk, availables, striped, quantity_on_hand in products.iterator(
+        chunk_size=2000
+    ):
+        batch.append(
+            StockMovement(
+                product_id=pk,
+                kind="ADJUSTMENT",
+                availables=availables + (striped or 0),
+                quantity_on_hand=quantity_on_hand,
+                reference="Opening stock",
+            )
+        )
+        if len(batch) == 2000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_live_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RESERVATION', 'Reservation'), ('RELEASE', 'Release'), ('RECEIPT', 'Receipt'), ('ADJUSTMENT', 'Adjustment')], max_length=16)),
+                ('availables', models.IntegerField(default=0)),
+                ('quantity_on_hand', models.IntegerField(default=0)),
+                ('reference', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='stock_movement_product_idx'), models.Index(fields=['created_at'], name='stock_movement_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('availables', models.IntegerField()),
+                ('quantity_on_hand', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'taken_at'), name='unique_product_stock_snapshot')],
+            },
+        ),
+        migrations.RunPython(record_opening_stock, migrations.RunPython.noop),
+    ]
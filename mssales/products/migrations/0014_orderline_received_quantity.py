@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderline',
+            name='received_quantity',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
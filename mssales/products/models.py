@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 
-from core.models import TimeStampedModel
+from core.models import LIVE_ROWS, TimeStampedModel
+from .cache import invalidate_products
 from suppliers.models import Vendor
 
 # Create your models here.
@@ -23,14 +24,230 @@ class Product(TimeStampedModel):
         max_length=255, blank=True, null=True
     )
     available = models.BooleanField(default=True)
+    # Number of stock stripes for hot products, 0 keeps the stock in `availables`.
+    # Striped products spread their stock over ProductStockStripe rows so that
+    # concurrent confirmations do not all serialize on this row.
+    stock_stripes = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # The catalog: available products, newest first, and its keyset
+            # pagination, nulls first (see KeysetPagination).
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=LIVE_ROWS & models.Q(available=True),
+                name="product_catalog_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_stock_stripes = instance.__dict__.get("stock_stripes")
+        return instance
+
+    @property
+    def total_availables(self):
+        """Available quantity, including the stock held by the stripes."""
+        if not self.stock_stripes:
+            return self.availables
+        return self.availables + sum(stripe.availables for stripe in self.stripes.all())
+
     def save(self, *args, **kwargs):
-        if not self.pk:
+        """
+        Save the product and record what the save changed of its stock as an
+        ADJUSTMENT in the stock ledger; creating a product records its
+        opening stock.
+        """
+        creating = not self.pk
+        if creating:
             self.availables = self.quantity_on_hand
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        tracks_stock = update_fields is None or bool(
+            {"availables", "quantity_on_hand"}.intersection(update_fields)
+        )
+
+        with transaction.atomic():
+            previous = {"availables": 0, "quantity_on_hand": 0}
+            if not creating and tracks_stock:
+                previous = (
+                    Product.global_objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values("availables", "quantity_on_hand")
+                    .first()
+                ) or previous
+            super().save(*args, **kwargs)
+            if tracks_stock:
+                StockMovement.record_adjustment(
+                    self,
+                    self.availables - previous["availables"],
+                    self.quantity_on_hand - previous["quantity_on_hand"],
+                )
+
+        if self.stock_stripes != getattr(self, "_loaded_stock_stripes", 0):
+            from .stock import rebalance_stripes
+
+            self.availables = rebalance_stripes(self.pk)
+            self._loaded_stock_stripes = self.stock_stripes
+        # Covers soft deletes and restores, which save the row too.
+        invalidate_products([self.pk])
+
+    def delete(self, *args, **kwargs):
+        """
+        Soft delete the product. Stripes are not soft-delete models and the
+        soft delete would remove them for good, so their stock is first folded
+        back into `availables`; restore() spreads it again.
+        """
+        with transaction.atomic():
+            if self.stock_stripes:
+                from .stock import rebalance_stripes
+
+                self.availables = rebalance_stripes(self.pk, count=0)
+                getattr(self, "_prefetched_objects_cache", {}).pop("stripes", None)
+            super().delete(*args, **kwargs)
+
+    def restore(self, strict=True, *args, **kwargs):
+        # A strict restore refuses models that are not soft-delete models,
+        # like the stripes, which delete() folded away: there is nothing of
+        # theirs to restore.
+        with transaction.atomic():
+            super().restore(False, *args, **kwargs)
+            if self.stock_stripes:
+                from .stock import rebalance_stripes
+
+                self.availables = rebalance_stripes(self.pk)
+
+    def hard_delete(self, *args, **kwargs):
+        invalidate_products([self.pk])
+        super().hard_delete(*args, **kwargs)
+
+
+class ProductStockStripe(models.Model):
+    """A slice of a striped product's available stock."""
+
+    product = models.ForeignKey(
+        Product, related_name="stripes", on_delete=models.CASCADE
+    )
+    stripe = models.PositiveSmallIntegerField()
+    availables = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "stripe"], name="unique_product_stock_stripe"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} #{self.stripe}: {self.availables}"
+
+
+class StockMovement(models.Model):
+    """
+    A change of a product's stock. The ledger is append-only: rows are never
+    updated or deleted, StockSnapshot rows summarize them instead.
+
+    Products are soft deleted, and the ledger must survive that: a soft-delete
+    cascade would hard delete the movements and keep restore() from bringing
+    the product back. Movements and snapshots are therefore kept out of the
+    cascade, without a reverse accessor or a database constraint.
+    """
+
+    KIND_CHOICES = [
+        ("RESERVATION", "Reservation"),
+        ("RELEASE", "Release"),
+        ("RECEIPT", "Receipt"),
+        ("ADJUSTMENT", "Adjustment"),
+    ]
+
+    product = models.ForeignKey(
+        Product,
+        related_name="+",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    # Change of the available stock, stripes included, and of the stock on hand.
+    availables = models.IntegerField(default=0)
+    quantity_on_hand = models.IntegerField(default=0)
+    # Sale order number or purchase order reference behind the movement.
+    reference = models.CharField(max_length=64, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product", "created_at"], name="stock_movement_product_idx"
+            ),
+            models.Index(fields=["created_at"], name="stock_movement_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of product {self.product_id}: {self.availables}"
+
+    @classmethod
+    def build(cls, kind, quantities, reference="", on_hand=False):
+        """
+        Unsaved movements, one per product of `quantities` ({product_id:
+        change of availables}). `on_hand` moves the stock on hand by the same
+        quantities.
+        """
+        return [
+            cls(
+                product_id=product_id,
+                kind=kind,
+                availables=quantity,
+                quantity_on_hand=quantity if on_hand else 0,
+                reference=reference,
+            )
+            for product_id, quantity in quantities.items()
+            if quantity
+        ]
+
+    @classmethod
+    def record(cls, kind, quantities, reference="", on_hand=False):
+        """Append the movements of `quantities` with a single INSERT."""
+        return cls.objects.bulk_create(cls.build(kind, quantities, reference, on_hand))
+
+    @classmethod
+    def record_adjustment(cls, product, availables, quantity_on_hand):
+        if availables or quantity_on_hand:
+            cls.objects.create(
+                product=product,
+                kind="ADJUSTMENT",
+                availables=availables,
+                quantity_on_hand=quantity_on_hand,
+            )
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's stock at `taken_at`: its previous snapshot plus the movements
+    created since, written by `manage.py compact_stock_movements`.
+    """
+
+    product = models.ForeignKey(
+        Product,
+        related_name="+",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    taken_at = models.DateTimeField()
+    availables = models.IntegerField()
+    quantity_on_hand = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "taken_at"], name="unique_product_stock_snapshot"
+            )
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} at {self.taken_at}: {self.availables}"
 
 
 class Order(TimeStampedModel):
@@ -55,6 +272,16 @@ class Order(TimeStampedModel):
     total = models.DecimalField(max_digits=12, decimal_places=2)
     status = models.CharField(max_length=32, choices=STATUS_CHOICES)
 
+    class Meta:
+        indexes = [
+            # The list, newest first.
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=LIVE_ROWS,
+                name="purchase_order_live_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.order_reference
 
@@ -63,6 +290,8 @@ class OrderLine(TimeStampedModel):
     order = models.ForeignKey(Order, related_name="lines", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
+    # Set by receipts (see products.purchasing), never above `quantity`.
+    received_quantity = models.IntegerField(default=0, editable=False)
     price_unit = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=12, decimal_places=2)
 
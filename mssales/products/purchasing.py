@@ -0,0 +1,118 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from core.transactions import LockNotAvailable, for_update, skips_locked
+from core.utils import update_from_values
+from .models import Order, OrderLine, StockMovement
+from .stock import receive_stock
+
+# Purchase orders goods can be received for; fully received orders are locked.
+RECEIVABLE_STATUSES = ("Purchase Order",)
+RECEIVED_STATUS = "Locked"
+
+
+class ReceiptError(Exception):
+    """Goods cannot be received; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def receive_purchase_order(pk, quantities=None):
+    """
+    Receive goods of the purchase order `pk`: `quantities` maps order line
+    ids to the quantity received, None receives everything outstanding.
+
+    The order row is locked, as the current transaction policy says (see
+    core.transactions), so that receipts of the same order serialize and a
+    line is never received beyond its quantity. Received quantities are summed
+    per product and added to the products stock with one UPDATE (see
+    receive_stock), the lines' received_quantity is raised with another, a
+    RECEIPT per product is appended to the stock ledger and, once every line
+    is fully received, the order moves to the "Locked" status. Raises
+    Order.DoesNotExist or ReceiptError; any error rolls back the whole
+    receipt. Returns a summary of the receipt.
+    """
+    with transaction.atomic():
+        order = for_update(Order.objects).filter(pk=pk).first()
+        if order is None:
+            if skips_locked() and Order.objects.filter(pk=pk).exists():
+                raise LockNotAvailable(f"Purchase order {pk} is locked")
+            raise Order.DoesNotExist(f"Purchase order {pk} not found")
+        if order.status not in RECEIVABLE_STATUSES:
+            raise ReceiptError(
+                f"Purchase order {pk} cannot be received, current status: {order.status}"
+            )
+
+        lines = {
+            line_id: (product_id, quantity - received)
+            for line_id, product_id, quantity, received in OrderLine.objects.filter(
+                order=order
+            ).values_list("pk", "product_id", "quantity", "received_quantity")
+        }
+        if quantities is None:
+            quantities = {
+                line_id: outstanding
+                for line_id, (_, outstanding) in lines.items()
+                if outstanding > 0
+            }
+
+        unknown = sorted(set(quantities) - lines.keys())
+        if unknown:
+            raise ReceiptError(
+                f"Lines {unknown} are not lines of purchase order {pk}",
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+        excess = sorted(
+            line_id
+            for line_id, quantity in quantities.items()
+            if quantity > lines[line_id][1]
+        )
+        if excess:
+            raise ReceiptError(
+                f"Lines {excess} would be received beyond their ordered quantity"
+            )
+        if not any(quantities.values()):
+            raise ReceiptError(f"Nothing to receive on purchase order {pk}")
+
+        by_product = defaultdict(int)
+        for line_id, quantity in quantities.items():
+            by_product[lines[line_id][0]] += quantity
+        receive_stock(by_product)
+        now = timezone.now()
+        update_from_values(
+            OrderLine,
+            [
+                (line_id, quantity)
+                for line_id, quantity in quantities.items()
+                if quantity
+            ],
+            {
+                "received_quantity": "{table}.received_quantity + v.column2",
+                "updated_at": "%s",
+            },
+            [now],
+        )
+        StockMovement.record(
+            "RECEIPT", by_product, reference=order.order_reference, on_hand=True
+        )
+
+        if all(
+            quantities.get(line_id, 0) == outstanding
+            for line_id, (_, outstanding) in lines.items()
+        ):
+            order.status = RECEIVED_STATUS
+            order.save(update_fields=["status", "updated_at"])
+
+    return {
+        "order_id": order.pk,
+        "status": order.status,
+        "received_lines": sum(1 for quantity in quantities.values() if quantity),
+        "received_quantity": sum(quantities.values()),
+        "products": len(by_product),
+    }
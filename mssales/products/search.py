@@ -0,0 +1,85 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# The text search document of a product. Migration 0011 indexes the very same
+# expression, which PostgreSQL only uses when queries repeat it. Columns are
+# left unqualified so the SQL also works in subqueries, where Django aliases
+# the table.
+SEARCH_DOCUMENT = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || "
+    "coalesce(product_category, '') || ' ' || coalesce(favorite, ''))"
+)
+SEARCH_QUERY = "to_tsquery('simple', %s)"
+
+# Rows matching the words (as prefixes), a name containing words close to the
+# search term (pg_trgm, for typos) or a barcode or internal reference starting
+# with it.
+MATCH_SQL = (
+    f"({SEARCH_DOCUMENT} @@ {SEARCH_QUERY}"
+    " OR %s <%% name OR barcode LIKE %s OR internal_reference LIKE %s)"
+)
+# Exact codes first, then text rank and name similarity.
+RANK_SQL = (
+    f"ts_rank({SEARCH_DOCUMENT}, {SEARCH_QUERY}) + word_similarity(%s, name)"
+    " + CASE WHEN barcode = %s OR internal_reference = %s THEN 1 ELSE 0 END"
+)
+
+
+def _prefix_query(terms):
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def _like_prefix(value):
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def search_products(queryset, search):
+    """
+    Filter `queryset` with the indexed PostgreSQL search of `search`: full
+    text over name, category and favorite, trigram similarity on the name and
+    prefix matches on barcode and internal reference. Rows are annotated with
+    `search_rank` and ordered by it, best match first.
+
+    Ranking every match of a common word would read a large part of the
+    table, so only the first PRODUCT_SEARCH_MAX_RESULTS matches the indexes
+    return are ranked and listed.
+    """
+    search = search.strip()
+    if not search:
+        return queryset
+    tsquery = _prefix_query(re.findall(r"\w+", search))
+    match = RawSQL(
+        MATCH_SQL,
+        (tsquery, search, _like_prefix(search), _like_prefix(search)),
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        RANK_SQL, (tsquery, search, search, search), output_field=FloatField()
+    )
+    candidates = queryset.filter(match).order_by().values("pk")
+    ordering = queryset.query.order_by
+    return (
+        queryset.filter(pk__in=candidates[: settings.PRODUCT_SEARCH_MAX_RESULTS])
+        .annotate(search_rank=rank)
+        .order_by("-search_rank", *ordering)
+    )
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    `?search=` backed by the PostgreSQL text search and trigram indexes (see
+    search_products). Other databases, e.g. the SQLite profile, fall back to
+    SearchFilter's icontains lookups over the view's `search_fields`.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if connections[queryset.db].vendor != "postgresql":
+            return super().filter_queryset(request, queryset, view)
+        search = request.query_params.get(self.search_param, "")
+        return search_products(queryset, search.replace("\x00", ""))
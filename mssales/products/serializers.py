@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
+
+from core.fieldsets import SparseFieldsMixin
+from .ledger import HISTORY_INTERVALS, history_periods
 from .models import (
     Product,
     Order,
@@ -6,11 +11,24 @@ from .models import (
 )
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    availables = serializers.IntegerField(source="total_availables", read_only=True)
+
+    sparse_requires = {"availables": ("availables", "stock_stripes", "stripes")}
+
     class Meta:
         model = Product
         fields = "__all__"
 
+    def validate(self, attrs):
+        # Stock partly lives in the stripes, so `availables` is only moved by
+        # reservations, releases and receipts.
+        if "availables" in getattr(self, "initial_data", {}):
+            raise serializers.ValidationError(
+                {"availables": "This field is read-only."}
+            )
+        return attrs
+
 
 class OrderLineSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -20,13 +38,85 @@ class OrderLineSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = OrderLine
-        fields = ["id"]
-        read_only_fields = "id"
+        fields = [
+            "id",
+            "order",
+            "product",
+            "product_id",
+            "quantity",
+            "received_quantity",
+            "price_unit",
+            "subtotal",
+        ]
+        read_only_fields = ["id", "received_quantity"]
 
 
 class OrderSerializer(serializers.ModelSerializer):
-    order_lines = OrderLineSerializer(many=True, read_only=True)
+    order_lines = OrderLineSerializer(many=True, read_only=True, source="lines")
 
     class Meta:
         model = Order
         fields = "__all__"
+
+
+class ReceiptLineSerializer(serializers.Serializer):
+    line_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class ReceivePurchaseOrderSerializer(serializers.Serializer):
+    lines = ReceiptLineSerializer(
+        many=True, required=False, allow_empty=False, max_length=10000
+    )
+
+    def validate_lines(self, value):
+        quantities = {}
+        for line in value:
+            if line["line_id"] in quantities:
+                raise serializers.ValidationError(
+                    f"Line {line['line_id']} is listed more than once."
+                )
+            quantities[line["line_id"]] = line["quantity"]
+        return quantities
+
+
+class StockQuerySerializer(serializers.Serializer):
+    product = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=100
+    )
+
+    def validate_product(self, value):
+        value = list(dict.fromkeys(value))
+        found = set(
+            Product.global_objects.filter(pk__in=value).values_list("pk", flat=True)
+        )
+        missing = [pk for pk in value if pk not in found]
+        if missing:
+            raise serializers.ValidationError(f"Unknown products: {missing}")
+        return value
+
+
+class StockAtSerializer(StockQuerySerializer):
+    at = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault("at", timezone.now())
+        return attrs
+
+
+class StockHistorySerializer(StockQuerySerializer):
+    start = serializers.DateField()
+    end = serializers.DateField(required=False)
+    interval = serializers.ChoiceField(choices=HISTORY_INTERVALS, default="day")
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.localdate())
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError({"start": "Must not be after end."})
+        points = len(history_periods(attrs["start"], attrs["end"], attrs["interval"]))
+        if points * len(attrs["product"]) > settings.STOCK_HISTORY_MAX_POINTS:
+            raise serializers.ValidationError(
+                f"At most {settings.STOCK_HISTORY_MAX_POINTS} points (products x "
+                "periods) per request, use a longer interval or fewer products."
+            )
+        return attrs
@@ -0,0 +1,237 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from core.transactions import LockNotAvailable, for_update, skips_locked
+from core.utils import update_from_values
+from .cache import invalidate_products
+from .models import Product, ProductStockStripe
+
+
+class InsufficientStock(Exception):
+    """Raised when a product cannot cover the requested quantity."""
+
+    def __init__(self, product_id, available, requested):
+        self.product_id = product_id
+        self.available = available
+        self.requested = requested
+        super().__init__(
+            f"Insufficient stock for product {product_id}, available: {available}, requested: {requested}"
+        )
+
+
+def lock_products(product_ids):
+    """
+    Lock the rows of the non-striped products among `product_ids`, in id order.
+
+    Striped products are left unlocked since their stock lives in the stripes.
+    Rows are locked as the current transaction policy says (see
+    core.transactions.for_update). Returns ({product_id: product}, {ids of
+    striped products}); ids matching no product are in neither.
+    """
+    products = {
+        product.pk: product
+        for product in for_update(Product.objects)
+        .filter(id__in=sorted(product_ids), stock_stripes=0)
+        .order_by("id")
+    }
+    others = set(product_ids) - products.keys()
+    if not others:
+        return products, set()
+
+    rows = dict(
+        Product.objects.filter(id__in=others).values_list("id", "stock_stripes")
+    )
+    striped = {pk for pk, stripes in rows.items() if stripes}
+    if skips_locked() and len(rows) > len(striped):
+        raise LockNotAvailable("Products are locked by another transaction")
+    return products, striped
+
+
+def release_availables(quantities, chunk_size=1000):
+    """
+    Give `quantities` ({product_id: qty}) back to the products availables.
+
+    Each chunk of products is locked in id order, like confirmations lock
+    them, then credited with a single UPDATE ... CASE statement. Released stock
+    of striped products lands in `availables` and is spread over the stripes by
+    their next rebalance.
+    """
+    now = timezone.now()
+    product_ids = sorted(pk for pk, quantity in quantities.items() if quantity)
+    for start in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[start : start + chunk_size]
+        list(
+            Product.global_objects.select_for_update()
+            .filter(pk__in=chunk)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        Product.global_objects.filter(pk__in=chunk).update(
+            availables=F("availables")
+            + Case(
+                *(When(pk=pk, then=Value(quantities[pk])) for pk in chunk),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            updated_at=now,
+        )
+    invalidate_products(product_ids)
+
+
+def receive_stock(quantities):
+    """
+    Add `quantities` ({product_id: qty}) of received goods to the products
+    stock on hand and availables.
+
+    The products are locked in id order, like confirmations lock them, then
+    credited with a single UPDATE whatever their number. Received stock of
+    striped products lands in `availables` and is spread over the stripes by
+    their next rebalance.
+    """
+    product_ids = sorted(pk for pk, quantity in quantities.items() if quantity)
+    list(
+        Product.global_objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    update_from_values(
+        Product,
+        [(pk, quantities[pk]) for pk in product_ids],
+        {
+            "quantity_on_hand": "{table}.quantity_on_hand + v.column2",
+            "availables": "{table}.availables + v.column2",
+            "updated_at": "%s",
+        },
+        [timezone.now()],
+    )
+    invalidate_products(product_ids)
+
+
+def decrement_availables(quantities):
+    """
+    Take `quantities` ({product_id: qty}) out of the products availables
+    without locking the rows up front.
+
+    Each product is decremented with a guarded UPDATE that only matches while
+    `availables >= qty`, so the check and the write happen atomically in the
+    database. Products are updated in id order to keep lock acquisition
+    deterministic between concurrent callers. Striped products are served by
+    decrement_stripes. Raises InsufficientStock on the first product that
+    cannot be served (`available` is None when the product does not exist);
+    the caller's atomic block is expected to roll back the decrements already
+    applied.
+    """
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        updated = Product.objects.filter(
+            pk=product_id, stock_stripes=0, availables__gte=quantity
+        ).update(availables=F("availables") - quantity, updated_at=now)
+        if updated:
+            continue
+
+        row = (
+            Product.objects.filter(pk=product_id)
+            .values_list("availables", "stock_stripes")
+            .first()
+        )
+        if row and row[1]:
+            decrement_stripes({product_id: quantity})
+            continue
+        raise InsufficientStock(product_id, row and row[0], quantity)
+    invalidate_products(quantities)
+
+
+def decrement_stripes(quantities):
+    """
+    Take `quantities` ({product_id: qty}) out of the stripes of striped products.
+
+    A stripe holding enough stock is picked at random among those no other
+    transaction has locked, so concurrent confirmations on a hot product
+    spread over its stripes instead of queuing on one row. When no free stripe
+    can cover the quantity on its own, the product's stock is gathered and
+    redistributed (see rebalance_stripes) before withdrawing from it. A stripe
+    left empty triggers a rebalance once the transaction commits.
+    """
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        stripe = (
+            ProductStockStripe.objects.select_for_update(skip_locked=True)
+            .filter(product_id=product_id, availables__gte=quantity)
+            .order_by("?")
+            .first()
+        )
+        if stripe is None:
+            rebalance_stripes(product_id, withdraw=quantity)
+            continue
+
+        ProductStockStripe.objects.filter(pk=stripe.pk).update(
+            availables=F("availables") - quantity
+        )
+        if stripe.availables == quantity:
+            transaction.on_commit(partial(rebalance_stripes, product_id), robust=True)
+    invalidate_products(quantities)
+
+
+def rebalance_stripes(product_id, withdraw=0, count=None):
+    """
+    Spread a product's available stock evenly over its `stock_stripes` stripes,
+    or over `count` stripes when given.
+
+    The product row and all its stripes are locked, their stock is summed with
+    whatever sits in `Product.availables` (stock released or received since the
+    last rebalance), `withdraw` is taken out of the total and the remainder is
+    redistributed. A product with no stripes gets its whole stock back in
+    `availables` and its stripe rows removed. Returns the new value of
+    `Product.availables`. Raises InsufficientStock when the total cannot cover
+    `withdraw`.
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().filter(pk=product_id).first()
+        if product is None:
+            raise InsufficientStock(product_id, None, withdraw)
+        stripes = list(
+            ProductStockStripe.objects.select_for_update()
+            .filter(product_id=product_id)
+            .order_by("stripe")
+        )
+
+        total = product.availables + sum(stripe.availables for stripe in stripes)
+        if total < withdraw:
+            raise InsufficientStock(product_id, total, withdraw)
+        total -= withdraw
+
+        if count is None:
+            count = product.stock_stripes
+        share, remainder = divmod(total, count) if count else (0, 0)
+        existing = {stripe.stripe: stripe for stripe in stripes}
+        for index, stripe in existing.items():
+            if index < count:
+                stripe.availables = share + (1 if index < remainder else 0)
+        ProductStockStripe.objects.filter(
+            product_id=product_id, stripe__gte=count
+        ).delete()
+        ProductStockStripe.objects.bulk_update(
+            [stripe for index, stripe in existing.items() if index < count],
+            ["availables"],
+        )
+        ProductStockStripe.objects.bulk_create(
+            ProductStockStripe(
+                product_id=product_id,
+                stripe=index,
+                availables=share + (1 if index < remainder else 0),
+            )
+            for index in range(count)
+            if index not in existing
+        )
+
+        availables = 0 if count else total
+        Product.objects.filter(pk=product_id).update(
+            availables=availables, updated_at=timezone.now()
+        )
+        invalidate_products([product_id])
+    return availables
@@ -1,3 +1,536 @@
-from django.test import TestCase
+import io
+import unittest
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.tests import AuthenticatedAPITestCase
+from suppliers.models import Vendor
+from .cache import catalog_cache
+from .forecast import forecast_catalog
+from .ledger import stock_at, stock_history
+from .models import (
+    Order,
+    OrderLine,
+    Product,
+    ProductStockStripe,
+    StockMovement,
+    StockSnapshot,
+)
+
+
+def make_product(name="Product", quantity=10, **fields):
+    return Product.objects.create(
+        name=name,
+        sales_price=Decimal("10.00"),
+        cost=Decimal("5.00"),
+        quantity_on_hand=quantity,
+        **fields,
+    )
+
+
+def make_purchase_order(status="Purchase Order", *lines, reference="PO"):
+    """A purchase order with a line per (product, quantity) of `lines`."""
+    order = Order.objects.create(
+        priority="Normal",
+        order_reference=reference,
+        vendor=Vendor.objects.get_or_create(name="Vendor")[0],
+        purchase_representative="Buyer",
+        order_deadline=timezone.now(),
+        total=Decimal("0"),
+        status=status,
+    )
+    OrderLine.objects.bulk_create(
+        OrderLine(
+            order=order,
+            product=product,
+            quantity=quantity,
+            price_unit=Decimal("1.00"),
+            subtotal=Decimal(quantity),
+        )
+        for product, quantity in lines
+    )
+    return order
+
+
+class StripedProductTests(AuthenticatedAPITestCase):
+    def striped_product(self, quantity=70, stripes=4):
+        product = make_product(quantity=quantity)
+        product.stock_stripes = stripes
+        product.save()
+        return product
+
+    def test_soft_delete_folds_the_stripes_into_availables(self):
+        product = self.striped_product()
+
+        response = self.client.delete(f"/api/products/{product.pk}/")
+
+        self.assertEqual(response.status_code, 204)
+        product = Product.global_objects.get(pk=product.pk)
+        self.assertTrue(product.is_deleted)
+        self.assertEqual(product.availables, 70)
+        self.assertFalse(ProductStockStripe.objects.filter(product=product).exists())
+
+    def test_restore_spreads_the_stock_over_the_stripes_again(self):
+        product = self.striped_product()
+        product.delete()
+
+        product = Product.global_objects.get(pk=product.pk)
+        product.restore()
+
+        product = Product.objects.get(pk=product.pk)
+        self.assertEqual(product.availables, 0)
+        self.assertEqual(product.total_availables, 70)
+        self.assertEqual(product.stripes.count(), 4)
+
+    def test_availables_cannot_be_written(self):
+        product = make_product()
+
+        response = self.client.patch(
+            f"/api/products/{product.pk}/", {"availables": 99}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("availables", response.json())
+        product.refresh_from_db()
+        self.assertEqual(product.availables, 10)
+
+
+class StockLedgerTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from telesales.services import cancel_sales_orders, confirm_sales_orders
+        from telesales.tests import make_customer, make_order
+
+        super().setUpTestData()
+        cls.a = make_product("A", quantity=100)
+        cls.b = make_product("B", quantity=50)
+        customer = make_customer()
+        orders = [
+            make_order(customer, (cls.a, 5), (cls.b, 2)),
+            make_order(customer, (cls.a, 3)),
+            make_order(customer, (cls.b, 1)),
+        ]
+        confirm_sales_orders([sale_order.pk for sale_order in orders])
+        cancel_sales_orders([orders[1].pk])
+        cls.a.refresh_from_db()
+        cls.a.quantity_on_hand = 120
+        cls.a.save()
+        cls.b.refresh_from_db()
+
+    def stock(self):
+        return stock_at([self.a.pk, self.b.pk], timezone.now())
+
+    def test_movements_add_up_to_the_stock(self):
+        self.assertEqual(
+            self.stock(),
+            {
+                self.a.pk: {"availables": 95, "quantity_on_hand": 120},
+                self.b.pk: {"availables": 47, "quantity_on_hand": 50},
+            },
+        )
+        self.assertEqual(self.b.availables, 47)
+        self.assertEqual(
+            StockMovement.objects.filter(product_id=self.a.pk, kind="RELEASE").count(),
+            1,
+        )
+
+    def test_compaction_keeps_the_stock(self):
+        stock = self.stock()
+        now = timezone.now()
+        today = timezone.localdate()
+        for i, pk in enumerate(
+            StockMovement.objects.order_by("pk").values_list("pk", flat=True)
+        ):
+            StockMovement.objects.filter(pk=pk).update(
+                created_at=now - timedelta(days=3 - min(i, 3))
+            )
+
+        call_command(
+            "compact_stock_movements", "--until", str(today), stdout=io.StringIO()
+        )
+
+        self.assertTrue(StockSnapshot.objects.exists())
+        self.assertEqual(self.stock(), stock)
+        with self.assertNumQueries(4):
+            history = stock_history(
+                [self.a.pk, self.b.pk], today - timedelta(days=5), today, "day"
+            )
+        self.assertEqual(
+            history[self.a.pk][0][1], {"availables": 0, "quantity_on_hand": 0}
+        )
+        self.assertEqual(history[self.a.pk][-1][1], stock[self.a.pk])
+
+    def test_endpoints(self):
+        response = self.client.get("/api/products/stock-at/", {"product": [self.a.pk]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["results"][0]["availables"], 95)
+
+        response = self.client.get(
+            "/api/products/stock-history/",
+            {
+                "product": [self.a.pk, self.b.pk],
+                "start": str(timezone.localdate() - timedelta(days=40)),
+                "interval": "week",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]["results"]), 2)
+
+        for url, params in (
+            ("/api/products/stock-at/", {"product": [99999]}),
+            (
+                "/api/products/stock-history/",
+                {"product": [self.a.pk], "start": "1900-01-01"},
+            ),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+    def test_ledger_outlives_soft_deletes(self):
+        product = make_product()
+        StockSnapshot.objects.create(
+            product=product,
+            taken_at=timezone.now(),
+            availables=10,
+            quantity_on_hand=10,
+        )
+        StockMovement.record("RECEIPT", {product.pk: 5}, on_hand=True)
+        movements = StockMovement.objects.filter(product_id=product.pk).count()
+        stock = stock_at([product.pk], timezone.now())
+
+        product.delete()
+
+        self.assertEqual(
+            StockMovement.objects.filter(product_id=product.pk).count(), movements
+        )
+        self.assertTrue(StockSnapshot.objects.filter(product_id=product.pk).exists())
+
+        Product.global_objects.get(pk=product.pk).restore()
+
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+        self.assertEqual(stock_at([product.pk], timezone.now()), stock)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class FastProductListTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(25):
+            make_product(
+                f"Product {i}",
+                quantity=i,
+                barcode=f"400638133{i:04d}",
+                stock_stripes=2 if i % 5 == 0 else 0,
+            )
+
+    def test_fast_path_renders_the_same_json(self):
+        for params in ({}, {"page": 2}, {"pagination": "cursor"}):
+            with self.subTest(**params):
+                pages = []
+                for fast in (False, True):
+                    with override_settings(FAST_LIST_SERIALIZATION=fast):
+                        response = self.client.get("/api/products/", params)
+                    self.assertEqual(response.status_code, 200)
+                    pages.append(response.content)
+                self.assertEqual(pages[0], pages[1])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class KeysetPaginationTests(AuthenticatedAPITestCase):
+    url = "/api/products/?pagination=cursor&page_size=7"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(30):
+            make_product(f"Product {i}")
+        # Rows without a created_at sort first, as in a descending index, and
+        # fill more than a page.
+        Product.objects.filter(name__in=[f"Product {i}" for i in range(3, 12)]).update(
+            created_at=None
+        )
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, page):
+        return [product["id"] for product in page["results"]]
+
+    def test_walks_every_row_once_both_ways(self):
+        expected = list(
+            Product.objects.order_by(
+                F("created_at").desc(nulls_first=True), "-id"
+            ).values_list("id", flat=True)
+        )
+        seen = []
+        page = {"next": self.url + "&count=approximate"}
+        while page["next"]:
+            page = self.get(page["next"])
+            seen += self.ids(page)
+        self.assertEqual(seen, expected)
+        self.assertEqual(page["approximate_count"], 30)
+
+        back = self.ids(page)
+        while page["previous"]:
+            page = self.get(page["previous"])
+            back = self.ids(page) + back
+        self.assertEqual(back, expected)
+
+    def test_next_pages_are_index_ranges(self):
+        page = self.get(self.get(self.get(self.url)["next"])["next"])
+        self.assertIsNotNone(page["next"])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get(page["next"])
+
+        [sql] = [
+            query["sql"]
+            for query in queries
+            if 'FROM "products_product"' in query["sql"] and "ORDER BY" in query["sql"]
+        ]
+        where = sql[sql.index("WHERE") : sql.index("ORDER BY")]
+        self.assertNotIn('"created_at" IS NULL', where)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url + "&cursor=zzz")
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ResponseCacheTests(AuthenticatedAPITestCase):
+    list_url = "/api/products/?search=Cache&page=1"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.a = make_product("Cache A")
+        cls.b = make_product("Cache B")
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        catalog_cache.clear_local()
+
+    def test_repeated_requests_are_served_from_the_cache(self):
+        first = self.client.get(self.list_url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/products/?page=1&search=Cache")
+        self.assertEqual(response.content, first.content)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        catalog_cache.clear_local()
+        with self.assertNumQueries(0):
+            self.client.get(self.list_url)
+
+    def test_changes_invalidate_the_pages_showing_the_product(self):
+        first = self.client.get(self.list_url)
+        detail = self.client.get(f"/api/products/{self.a.pk}/")
+        self.client.get(f"/api/products/{self.b.pk}/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.a.availables -= 3
+            self.a.save()
+
+        response = self.client.get(self.list_url)
+        self.assertNotEqual(response.content, first.content)
+        response = self.client.get(f"/api/products/{self.a.pk}/")
+        self.assertNotEqual(response.content, detail.content)
+        with self.assertNumQueries(0):
+            self.client.get(f"/api/products/{self.b.pk}/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b.delete()
+
+        response = self.client.get(f"/api/products/{self.b.pk}/")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotContains(self.client.get(self.list_url), "Cache B")
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class ProductSearchTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.keyboard = make_product(
+            "Wireless Keyboard",
+            barcode="4006381333931",
+            internal_reference="KB-001",
+            product_category="Office",
+        )
+        cls.mouse = make_product("Wireless Mouse", barcode="4006381999999")
+        cls.monitor = make_product("Monitor stand", product_category="Office")
+
+    def search(self, search):
+        response = self.client.get("/api/products/", {"search": search})
+        self.assertEqual(response.status_code, 200)
+        return [product["id"] for product in response.json()["results"]]
+
+    def test_words(self):
+        self.assertEqual(self.search("keyboard"), [self.keyboard.pk])
+        self.assertCountEqual(
+            self.search("wireless"), [self.keyboard.pk, self.mouse.pk]
+        )
+
+    def test_barcode_and_internal_reference_prefixes(self):
+        self.assertEqual(self.search("4006381333"), [self.keyboard.pk])
+        self.assertEqual(self.search("KB-00"), [self.keyboard.pk])
+
+    def test_no_match(self):
+        self.assertEqual(self.search("printer"), [])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Uses pg_trgm")
+    def test_typos_and_word_prefixes(self):
+        self.assertEqual(self.search("wirless keybord")[0], self.keyboard.pk)
+        self.assertEqual(self.search("moni"), [self.monitor.pk])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Uses text search")
+    def test_exact_codes_rank_first(self):
+        self.assertEqual(self.search("4006381333931")[0], self.keyboard.pk)
+
+
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from telesales.models import SalesOrder, SalesOrderLine
+        from telesales.services import confirm_sales_order
+        from telesales.tests import make_customer
+
+        cls.a = make_product("A", quantity=100)
+        cls.b = make_product("B", quantity=50)
+        cls.c = make_product("C", quantity=10)
+        sale_order = SalesOrder.objects.create(customer=make_customer())
+        for product, qty in ((cls.a, 14), (cls.b, 7)):
+            SalesOrderLine.objects.create(
+                order=sale_order, product=product, qty=qty, discount_pct=Decimal(0)
+            )
+        confirm_sales_order(sale_order.pk)
+        make_purchase_order("Purchase Order", (cls.c, 30), reference="PO1")
+        make_purchase_order("RFQ", (cls.c, 99), reference="PO2")
+
+    def forecast(self):
+        return forecast_catalog(horizon=14, short_window=7, long_window=28)
+
+    def test_forecast(self):
+        self.forecast()
+
+        forecasts = dict(Product.objects.values_list("name", "forecasted_quantity"))
+        # On hand - reserved + incoming - the mean of the short and long daily
+        # demand averages over the horizon; RFQs are not incoming yet.
+        self.assertEqual(forecasts["A"], 68)
+        self.assertEqual(forecasts["B"], round(50 - 7 - (1 + 0.25) / 2 * 14))
+        self.assertEqual(forecasts["C"], 40)
+
+    def test_unchanged_forecasts_are_not_written_again(self):
+        self.forecast()
+
+        self.assertEqual(self.forecast()["changed"], 0)
+
+
+class PurchaseOrderListQueryTests(AuthenticatedAPITestCase):
+    """The purchase order lists run a fixed number of queries per page."""
+
+    budgets = {
+        # Count, page, lines with their products, stripes.
+        "/api/purchase-orders/": 4,
+        "/api/purchase-orders/lines/": 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        products = [make_product(f"Product {i}", stock_stripes=2) for i in range(10)]
+        for i in range(5):
+            make_purchase_order(
+                "Purchase Order",
+                *((product, 10) for product in products),
+                reference=f"PO-{i}",
+            )
+
+    def test_queries_do_not_depend_on_the_number_of_lines(self):
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
+class ReceivePurchaseOrderTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.a = make_product("A", quantity=5)
+        cls.b = make_product("B", quantity=0)
+        cls.order = make_purchase_order(
+            "Purchase Order", (cls.a, 10), (cls.b, 4), (cls.a, 6), reference="PO-1"
+        )
+        cls.lines = list(cls.order.lines.order_by("pk"))
+
+    def receive(self, *lines, pk=None):
+        data = {"lines": [{"line_id": line, "quantity": qty} for line, qty in lines]}
+        return self.client.post(
+            f"/api/purchase-orders/{pk or self.order.pk}/receive/",
+            data if lines else {},
+            format="json",
+        )
+
+    def test_partial_then_full_receipt(self):
+        first, second, third = self.lines
+
+        response = self.receive((first.pk, 3), (third.pk, 6))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["received_quantity"], 9)
+        self.assertEqual(data["products"], 1)
+        self.assertEqual(data["status"], "Purchase Order")
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.quantity_on_hand, self.a.availables), (14, 14))
+        first.refresh_from_db()
+        self.assertEqual(first.received_quantity, 3)
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(kind="RECEIPT").values_list(
+                    "product_id", "availables", "quantity_on_hand", "reference"
+                )
+            ),
+            [(self.a.pk, 9, 9, "PO-1")],
+        )
+
+        response = self.receive()
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["status"], "Locked")
+        self.assertEqual(data["received_quantity"], 11)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual(self.a.quantity_on_hand, 21)
+        self.assertEqual((self.b.quantity_on_hand, self.b.availables), (4, 4))
+        self.assertEqual(self.receive().status_code, 400)
+
+    def test_invalid_receipts(self):
+        line = self.lines[0]
+        for lines, status_code in (
+            (((line.pk, 11),), 400),
+            (((line.pk, 1), (line.pk, 1)), 400),
+            (((99999, 1),), 404),
+        ):
+            with self.subTest(lines=lines):
+                self.assertEqual(self.receive(*lines).status_code, status_code)
+        self.assertEqual(self.receive(pk=99999).status_code, 404)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.quantity_on_hand, 5)
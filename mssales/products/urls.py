@@ -1,9 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from products.views import ProductViewSet
+from products.views import OrderLineViewSet, OrderViewSet, ProductViewSet
 
 router = DefaultRouter()
 router.register(r"products", ProductViewSet, basename="products")
+# Registered before purchase-orders so that "lines" is not read as an order id.
+router.register(
+    r"purchase-orders/lines", OrderLineViewSet, basename="purchase-order-lines"
+)
+router.register(r"purchase-orders", OrderViewSet, basename="purchase-orders")
 
 urlpatterns = [path("", include(router.urls))]
@@ -1,19 +1,63 @@
-from rest_framework import viewsets, filters
+from django.db import DatabaseError
+from django.db.models import Prefetch, Sum
+from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiResponse
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
-from core.utils import CustomPagination, custom_response
+from core.cache import ResponseCacheMixin
+from core.conditional import ConditionalGetMixin
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetMixin
+from core.idempotency import idempotent
+from core.transactions import run_atomic
+from core.utils import CustomPagination, KeysetPaginationMixin, custom_response
+from products.cache import catalog_cache
 from products.filters import ProductFilter
+from products.ledger import stock_at, stock_history
+from products.purchasing import ReceiptError, receive_purchase_order
+from products.search import ProductSearchFilter
 from .models import Product, Order, OrderLine
-from .serializers import ProductSerializer, OrderSerializer, OrderLineSerializer
+from .serializers import (
+    OrderLineSerializer,
+    OrderSerializer,
+    ProductSerializer,
+    ReceivePurchaseOrderSerializer,
+    StockAtSerializer,
+    StockHistorySerializer,
+)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.filter(available=True).order_by("-created_at")
+class ProductViewSet(
+    ConditionalGetMixin,
+    ResponseCacheMixin,
+    FastListMixin,
+    SparseFieldsetMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = (
+        Product.objects.filter(available=True)
+        .order_by("-created_at")
+        .prefetch_related("stripes")
+    )
     serializer_class = ProductSerializer
     pagination_class = CustomPagination
     filterset_class = ProductFilter
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
-    search_fields = ["name", "product_category", "favorite"]
+    filter_backends = (DjangoFilterBackend, ProductSearchFilter)
+    # Used by the fallback of ProductSearchFilter on databases other than
+    # PostgreSQL.
+    search_fields = [
+        "name",
+        "product_category",
+        "favorite",
+        "barcode",
+        "internal_reference",
+    ]
+    # Taking stock from a stripe does not touch the product row.
+    conditional_aggregates = {"stripes_availables": Sum("stripes__availables")}
+    response_cache = catalog_cache
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -48,12 +92,195 @@ class ProductViewSet(viewsets.ModelViewSet):
             data=serializer.data, message="Product partially updated successfully"
         )
 
+    @extend_schema(
+        parameters=[StockAtSerializer],
+        responses={
+            200: OpenApiResponse(
+                description="availables and quantity_on_hand of each product."
+            ),
+            400: OpenApiResponse(description="Invalid parameters."),
+        },
+        description=(
+            "Stock of one or more products (repeat `product`) at `at`, now by "
+            "default, from the stock ledger: the latest snapshot before `at` "
+            "plus the movements since. Stock before the ledger was created "
+            "reads as 0."
+        ),
+        tags=["Stock History"],
+        summary="Stock of products at a point in time",
+    )
+    @action(detail=False, methods=["get"], url_path="stock-at")
+    def stock_at(self, request):
+        serializer = StockAtSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        stock = stock_at(data["product"], data["at"])
+        return custom_response(
+            data={
+                "at": data["at"],
+                "results": [
+                    {"product_id": product_id, **stock[product_id]}
+                    for product_id in data["product"]
+                ],
+            },
+            message="Stock retrieved successfully",
+        )
+
+    @extend_schema(
+        parameters=[StockHistorySerializer],
+        responses={
+            200: OpenApiResponse(
+                description=(
+                    "For each product, its availables and quantity_on_hand at the "
+                    "close of every period."
+                )
+            ),
+            400: OpenApiResponse(description="Invalid parameters."),
+        },
+        description=(
+            "Stock of one or more products (repeat `product`) at the close of "
+            "each day, week or month from `start` to `end`. Reads the daily "
+            "snapshots written by `manage.py compact_stock_movements` and the "
+            "movements not compacted yet, in the same number of queries "
+            "whatever the length of the range."
+        ),
+        tags=["Stock History"],
+        summary="Stock history of products",
+    )
+    @action(detail=False, methods=["get"], url_path="stock-history")
+    def stock_history(self, request):
+        serializer = StockHistorySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        history = stock_history(
+            data["product"], data["start"], data["end"], data["interval"]
+        )
+        return custom_response(
+            data={
+                "start": data["start"],
+                "end": data["end"],
+                "interval": data["interval"],
+                "results": [
+                    {
+                        "product_id": product_id,
+                        "points": [
+                            {"period": period, **stock}
+                            for period, stock in history[product_id]
+                        ],
+                    }
+                    for product_id in data["product"]
+                ],
+            },
+            message="Stock history retrieved successfully",
+        )
+
+
+def lines_with_products():
+    """Purchase order lines with what OrderLineSerializer reads of their product."""
+    return (
+        OrderLine.objects.select_related("product")
+        .prefetch_related("product__stripes")
+        .order_by("pk")
+    )
+
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().order_by("-created_at")
+    queryset = Order.objects.prefetch_related(
+        Prefetch("lines", queryset=lines_with_products())
+    ).order_by("-created_at")
     serializer_class = OrderSerializer
 
+    @extend_schema(
+        request=ReceivePurchaseOrderSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="Goods received.",
+                examples=[
+                    OpenApiExample(
+                        "Partial Receipt",
+                        value={
+                            "message": "Received 12 units on 2 lines",
+                            "data": {
+                                "order_id": 1,
+                                "status": "Purchase Order",
+                                "received_lines": 2,
+                                "received_quantity": 12,
+                                "products": 2,
+                            },
+                            "status": 200,
+                        },
+                    )
+                ],
+            ),
+            400: OpenApiResponse(
+                description=(
+                    "The order cannot be received, or a line would be received "
+                    "beyond its ordered quantity."
+                ),
+                examples=[
+                    OpenApiExample(
+                        "Over Receipt",
+                        value={
+                            "error": "Lines [3] would be received beyond their ordered quantity"
+                        },
+                    ),
+                ],
+            ),
+            404: OpenApiResponse(
+                description="Purchase order, or one of the lines, not found."
+            ),
+            409: OpenApiResponse(description="The purchase order is locked."),
+        },
+        description=(
+            "Receive goods of a purchase order. `lines` lists the received "
+            "quantity of each line, for full or partial receipts; without it "
+            "every line is received in full. Received quantities are summed per "
+            "product and added to the products stock on hand and availables "
+            "with one set-based update, in the same transaction as the lines "
+            "and the stock ledger. The order is locked once every line is "
+            "fully received."
+        ),
+        tags=["Purchase Orders"],
+        summary="Receive a Purchase Order",
+    )
+    @action(detail=True, methods=["post"], url_path="receive")
+    @idempotent
+    def receive(self, request, pk=None):
+        serializer = ReceivePurchaseOrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantities = serializer.validated_data.get("lines")
+        try:
+            receipt = run_atomic(
+                "purchase_receive", receive_purchase_order, pk, quantities
+            )
+        except ReceiptError as e:
+            return Response({"error": e.message}, status=e.status_code)
+        except Order.DoesNotExist:
+            return Response(
+                {
+                    "status": status.HTTP_404_NOT_FOUND,
+                    "message": "Purchase order not found",
+                },
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except DatabaseError:
+            return Response(
+                {
+                    "status": status.HTTP_409_CONFLICT,
+                    "message": "Purchase order is locked, please try again",
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return custom_response(
+            data=receipt,
+            message=(
+                f"Received {receipt['received_quantity']} units on "
+                f"{receipt['received_lines']} lines"
+            ),
+        )
+
 
 class OrderLineViewSet(viewsets.ModelViewSet):
-    queryset = OrderLine.objects.all()
+    queryset = lines_with_products().order_by("pk")
     serializer_class = OrderLineSerializer
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['name', 'id'], name='vendor_live_name_idx'),
+        ),
+    ]
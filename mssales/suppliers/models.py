@@ -2,6 +2,8 @@ from django.db import models
 
 from django_softdelete.models import SoftDeleteModel
 
+from core.models import LIVE_ROWS
+
 
 class Vendor(SoftDeleteModel):
     name = models.CharField(max_length=255)
@@ -22,5 +24,12 @@ class Vendor(SoftDeleteModel):
     state = models.CharField(max_length=64, blank=True, null=True)
     country = models.CharField(max_length=64, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["name", "id"], condition=LIVE_ROWS, name="vendor_live_name_idx"
+            ),
+        ]
+
     def __str__(self):
         return self.name
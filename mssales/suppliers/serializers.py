@@ -1,8 +1,10 @@
 from rest_framework import serializers
+
+from core.fieldsets import SparseFieldsMixin
 from .models import Vendor
 
 
-class VendorSerializer(serializers.ModelSerializer):
+class VendorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Vendor
         fields = "__all__"
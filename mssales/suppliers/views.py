@@ -1,12 +1,13 @@
 from rest_framework import viewsets
 
+from core.fieldsets import SparseFieldsetMixin
 from core.utils import custom_response
 from .models import Vendor
 from .serializers import VendorSerializer
 
 
-class VendorViewSet(viewsets.ModelViewSet):
-    queryset = Vendor.objects.all()
+class VendorViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
+    queryset = Vendor.objects.all().order_by("name", "id")
     serializer_class = VendorSerializer
 
     def retrieve(self, request, *args, **kwargs):
@@ -22,6 +22,9 @@ class SalesOrderLines(admin.TabularInline):
     )
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
 
 @admin.register(SalesOrder)
 class SalesOrderAdmin(SoftDeleteAdmin):
@@ -35,6 +38,7 @@ class SalesOrderAdmin(SoftDeleteAdmin):
         "status",
         "customer__name",
     )
+    list_select_related = ("customer",)
     readonly_fields = ("order_total",)
     list_editable = ("status",)
     sortable_by = ("created_at", "order_tota")
@@ -0,0 +1,186 @@
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import DailyCustomerSales, DailyProductSales, SalesOrder, SalesOrderLine
+
+ANALYTICS_GROUPS = ("day", "week", "month", "product", "customer")
+PERIODS = {"day": F("day"), "week": TruncWeek("day"), "month": TruncMonth("day")}
+TOTALS = ("quantity", "revenue", "discount", "order_count")
+
+# Each summary table, the field its rows are keyed by and the order line
+# column that field is computed from.
+SUMMARIES = {
+    DailyProductSales: ("product", "product_id"),
+    DailyCustomerSales: ("customer", "order__customer_id"),
+}
+
+
+def _aggregate(lines, key):
+    """Sum `lines` per day of their order's creation and `key`."""
+    decimal = DecimalField(max_digits=16, decimal_places=2)
+    return (
+        lines.order_by()
+        .values(day=TruncDate("order__created_at"), key=F(key))
+        .annotate(
+            quantity=Sum("qty"),
+            revenue=Sum("sub_total"),
+            discount=Sum(
+                F("qty") * F("unit_price") - F("sub_total"), output_field=decimal
+            ),
+            order_count=Count("order_id", distinct=True),
+        )
+    )
+
+
+def _add(model, rows, sign):
+    """
+    Add `rows` (multiplied by `sign`) to the summaries of `model` with one
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent writers never lose an
+    increment.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    key = quote(model._meta.get_field(SUMMARIES[model][0]).column)
+    columns = ["day", key, *TOTALS]
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+    updates = ", ".join(
+        f"{column} = {table}.{column} + excluded.{column}" for column in TOTALS
+    )
+    params = []
+    for row in rows:
+        params.extend(
+            [
+                row["day"],
+                row["key"],
+                *(sign * row[column] for column in TOTALS),
+            ]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} "
+            f"ON CONFLICT (day, {key}) DO UPDATE SET {updates}",
+            params,
+        )
+
+
+def _apply(order_ids, sign):
+    if not order_ids:
+        return
+    lines = SalesOrderLine.objects.filter(order_id__in=order_ids)
+    days = set()
+    for model, (_, key) in SUMMARIES.items():
+        rows = list(_aggregate(lines, key))
+        _add(model, rows, sign)
+        days.update(row["day"] for row in rows)
+    if sign < 0:
+        for model in SUMMARIES:
+            model.objects.filter(day__in=days, order_count__lte=0).delete()
+
+
+def add_orders(order_ids):
+    """Count the lines of newly CONFIRMED orders in the daily summaries."""
+    _apply(order_ids, 1)
+
+
+def remove_orders(order_ids):
+    """Take the lines of orders leaving CONFIRMED out of the daily summaries."""
+    _apply(order_ids, -1)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild_days(first, last):
+    """
+    Recompute the summaries of the days from `first` to `last` from the
+    CONFIRMED orders created on them, in one transaction. Returns the number
+    of orders counted.
+    """
+    orders = SalesOrder.objects.filter(
+        status="CONFIRMED",
+        created_at__gte=_day_start(first),
+        created_at__lt=_day_start(last + timedelta(days=1)),
+    )
+    lines = SalesOrderLine.objects.filter(order__in=orders)
+    with transaction.atomic():
+        for model, (field, key) in SUMMARIES.items():
+            model.objects.filter(day__range=(first, last)).delete()
+            model.objects.bulk_create(
+                (
+                    model(
+                        day=row["day"],
+                        **{f"{field}_id": row["key"]},
+                        **{column: row[column] for column in TOTALS},
+                    )
+                    for row in _aggregate(lines, key)
+                ),
+                batch_size=1000,
+            )
+        return orders.count()
+
+
+def _amounts(row):
+    """Render the totals of `row` like the API renders money, "12.50"."""
+    row = {**row, **{column: row[column] or 0 for column in TOTALS}}
+    for column in ("revenue", "discount"):
+        row[column] = f"{row[column]:.2f}"
+    return row
+
+
+def sales_summary(start, end, group_by="day", product=None, customer=None, limit=100):
+    """
+    Sales totals between `start` and `end` (inclusive dates), per period
+    (day, week or month) or per product or customer, read from the daily
+    summaries only.
+
+    Per product figures and everything filtered by `product` come from the
+    product summaries, where an order counts once per product it contains;
+    everything else comes from the customer summaries, where it counts once.
+    Product and customer groups are the `limit` best by revenue.
+    """
+    by_product = group_by == "product" or product is not None
+    model = DailyProductSales if by_product else DailyCustomerSales
+    rows = model.objects.filter(day__range=(start, end))
+    if product is not None:
+        rows = rows.filter(product_id=product)
+    if customer is not None:
+        rows = rows.filter(customer_id=customer)
+    sums = {column: Sum(column) for column in TOTALS}
+
+    if group_by in PERIODS:
+        groups = (
+            rows.values(period=PERIODS[group_by]).annotate(**sums).order_by("period")
+        )
+    else:
+        # Summaries outlive their product or customer (the foreign keys have no
+        # constraint): a join would drop the groups of deleted ones, which the
+        # totals still count. Their name is null instead.
+        related = model._meta.get_field(group_by).related_model
+        name = related.global_objects.filter(pk=OuterRef(f"{group_by}_id"))
+        groups = (
+            rows.values(
+                f"{group_by}_id",
+                **{f"{group_by}_name": Subquery(name.values("name")[:1])},
+            )
+            .annotate(**sums)
+            .order_by("-revenue", f"{group_by}_id")[:limit]
+        )
+
+    # Totals over the product summaries would count an order once per product.
+    if by_product and product is None:
+        rows = DailyCustomerSales.objects.filter(day__range=(start, end))
+    totals = rows.aggregate(**sums)
+    return {
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "totals": _amounts(totals),
+        "results": [_amounts(group) for group in groups],
+    }
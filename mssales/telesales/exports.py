@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .models import Reservation, SalesOrderLine
+
+EXPORT_FORMATS = ("csv", "ndjson")
+# What a CSV row is; NDJSON always writes one order, with its lines and
+# reservations nested, per line.
+EXPORT_RECORDS = ("lines", "reservations")
+
+ORDER_FIELDS = [
+    "id",
+    "number",
+    "status",
+    "created_at",
+    "updated_at",
+    "notes",
+    "vat_rate",
+    "order_total",
+]
+CUSTOMER_FIELDS = ["id", "name", "email", "phone"]
+LINE_FIELDS = ["id", "product_id", "qty", "unit_price", "discount_pct", "sub_total"]
+RESERVATION_FIELDS = ["id", "product_id", "qty", "created_at", "expires_at"]
+
+
+def _columns(prefix, fields):
+    return [f"{prefix}_{field}" for field in fields]
+
+
+CSV_COLUMNS = {
+    "lines": [
+        *_columns("order", ORDER_FIELDS),
+        *_columns("customer", CUSTOMER_FIELDS),
+        *_columns("line", LINE_FIELDS),
+        "product_name",
+    ],
+    "reservations": [
+        *_columns("order", ORDER_FIELDS),
+        *_columns("customer", CUSTOMER_FIELDS),
+        *_columns("reservation", RESERVATION_FIELDS),
+    ],
+}
+
+
+def _order_rows(orders, chunk_size):
+    """
+    Yield lists of at most `chunk_size` orders as dicts with a nested
+    "customer", read through a server-side cursor.
+    """
+    columns = [*ORDER_FIELDS, *(f"customer__{field}" for field in CUSTOMER_FIELDS)]
+    rows = orders.order_by("pk").values(*columns).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        for row in chunk:
+            row["customer"] = {
+                field: row.pop(f"customer__{field}") for field in CUSTOMER_FIELDS
+            }
+        yield chunk
+
+
+def _children(queryset, fields, order_ids, **expressions):
+    grouped = defaultdict(list)
+    for row in (
+        queryset.filter(order_id__in=order_ids)
+        .order_by("order_id", "pk")
+        .values("order_id", *fields, **expressions)
+    ):
+        grouped[row.pop("order_id")].append(row)
+    return grouped
+
+
+def iter_order_chunks(orders, chunk_size=2000, lines=True, reservations=True):
+    """
+    Yield the orders of `orders` in chunks of `chunk_size`, each order a dict
+    with its "customer" and, when asked for, its "lines" and "reservations".
+
+    Orders are read with a server-side cursor and the lines and reservations
+    of a chunk with one query each, so memory holds one chunk at a time
+    whatever the size of the export.
+    """
+    for chunk in _order_rows(orders, chunk_size):
+        order_ids = [order["id"] for order in chunk]
+        if lines:
+            by_order = _children(
+                SalesOrderLine.objects,
+                LINE_FIELDS,
+                order_ids,
+                product_name=F("product__name"),
+            )
+            for order in chunk:
+                order["lines"] = by_order.get(order["id"], [])
+        if reservations:
+            by_order = _children(Reservation.objects, RESERVATION_FIELDS, order_ids)
+            for order in chunk:
+                order["reservations"] = by_order.get(order["id"], [])
+        yield chunk
+
+
+def _flat(order, fields, child=None):
+    row = [order[field] for field in ORDER_FIELDS]
+    row.extend(order["customer"][field] for field in CUSTOMER_FIELDS)
+    row.extend(child[field] if child else None for field in fields)
+    return row
+
+
+def _csv_rows(chunk, records):
+    for order in chunk:
+        if records == "lines":
+            for line in order["lines"] or [None]:
+                row = _flat(order, LINE_FIELDS, line)
+                row.append(line["product_name"] if line else None)
+                yield row
+        else:
+            for reservation in order["reservations"]:
+                yield _flat(order, RESERVATION_FIELDS, reservation)
+
+
+def iter_export(orders, output="csv", records="lines", chunk_size=2000):
+    """
+    Yield the export of `orders` as text, one piece per chunk of orders.
+
+    CSV has a header and one row per order line (orders without lines get a
+    row with empty line columns) or per reservation, with the order and
+    customer columns repeated. NDJSON has one order per line, with its
+    customer, lines and reservations nested.
+    """
+    if output == "ndjson":
+        for chunk in iter_order_chunks(orders, chunk_size):
+            yield "".join(
+                json.dumps(order, cls=DjangoJSONEncoder) + "\n" for order in chunk
+            )
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS[records])
+    chunks = iter_order_chunks(
+        orders,
+        chunk_size,
+        lines=records == "lines",
+        reservations=records == "reservations",
+    )
+    for chunk in chunks:
+        writer.writerows(_csv_rows(chunk, records))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_stream(pieces, level=6):
+    """Compress an iterable of text pieces into a gzip stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for piece in pieces:
+        data = compressor.compress(piece.encode())
+        if data:
+            yield data
+    yield compressor.flush()
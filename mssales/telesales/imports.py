@@ -0,0 +1,309 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import chain, groupby, islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from .models import (
+    Customer,
+    OrderImport,
+    OrderImportError,
+    SalesOrder,
+    SalesOrderLine,
+)
+from .services import build_order_line
+
+# CSV files hold one order line per row; consecutive rows sharing an
+# order_ref make up one order, whose fields are read from its first row.
+CSV_COLUMNS = [
+    "order_ref",
+    "customer_email",
+    "notes",
+    "vat_rate",
+    "product_id",
+    "barcode",
+    "qty",
+    "discount_pct",
+]
+REPORT_COLUMNS = ["row", "reference", "error"]
+# Largest value of an IntegerField column on every database.
+MAX_QTY = 2**31 - 1
+
+
+class RowError(Exception):
+    """A record of the import file cannot be turned into a sale order."""
+
+
+def read_ndjson(stream):
+    """
+    Yield (line number, order record, error) for each line of an NDJSON
+    stream. Each line is an object with the order fields and a "lines" list.
+    """
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def read_csv(stream):
+    """
+    Yield (line number, order record, error) for each order of a CSV stream,
+    grouping consecutive rows with the same order_ref (see CSV_COLUMNS).
+    """
+    reader = csv.DictReader(stream)
+    missing = {"customer_email", "qty"} - set(reader.fieldnames or ())
+    if missing:
+        raise RowError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+
+    rows = ((reader.line_num, row) for row in reader)
+    # Rows without an order_ref are orders of their own.
+    groups = groupby(rows, key=lambda item: item[1].get("order_ref") or -item[0])
+    for _, group in groups:
+        group = list(group)
+        number, first = group[0]
+        record = {
+            "order_ref": first.get("order_ref"),
+            "customer_email": first.get("customer_email"),
+            "notes": first.get("notes"),
+            "vat_rate": first.get("vat_rate"),
+            "lines": [
+                {
+                    "product_id": row.get("product_id"),
+                    "barcode": row.get("barcode"),
+                    "qty": row.get("qty"),
+                    "discount_pct": row.get("discount_pct"),
+                }
+                for _, row in group
+            ],
+        }
+        yield number, record, None
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+def _value(value):
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in (None, "") else value
+
+
+def _integer(value, name):
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError(f"{name} must be an integer, got {value!r}")
+    if isinstance(value, float) and number != value:
+        raise RowError(f"{name} must be an integer, got {value!r}")
+    return number
+
+
+def _decimal(value, name, default=None):
+    value = _value(value)
+    if value is None:
+        return default
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(f"{name} must be a number, got {value!r}")
+    if not number.is_finite():
+        raise RowError(f"{name} must be a finite number, got {value!r}")
+    return number
+
+
+def _check_column(value, model, field_name, name):
+    """
+    Raise RowError when `value`, once rounded to the decimal places of the
+    DecimalField `field_name` of `model`, has too many digits for its column.
+    """
+    field = model._meta.get_field(field_name)
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if abs(value) >= limit - Decimal(10) ** -field.decimal_places / 2:
+        raise RowError(f"{name} must be less than {limit} in absolute value")
+
+
+def _build_order(record, customers, prices, barcodes):
+    email = _value(record.get("customer_email"))
+    if email not in customers:
+        raise RowError(f"Unknown customer {email!r}")
+    lines = record.get("lines")
+    if not lines or not isinstance(lines, list):
+        raise RowError("Order must have at least one order line")
+
+    order_lines = []
+    for index, line in enumerate(lines, start=1):
+        if not isinstance(line, dict):
+            raise RowError(f"Line {index}: expected an object")
+        product_id = _value(line.get("product_id"))
+        barcode = _value(line.get("barcode"))
+        if product_id is not None:
+            product_id = _integer(product_id, f"Line {index}: product_id")
+            if product_id not in prices:
+                raise RowError(f"Line {index}: unknown product {product_id}")
+            unit_price = prices[product_id]
+        elif barcode is not None:
+            if barcode not in barcodes:
+                raise RowError(f"Line {index}: unknown barcode {barcode!r}")
+            product_id, unit_price = barcodes[barcode]
+        else:
+            raise RowError(f"Line {index}: product_id or barcode is required")
+
+        qty = _integer(_value(line.get("qty")), f"Line {index}: qty")
+        if not 1 <= qty <= MAX_QTY:
+            raise RowError(f"Line {index}: qty must be between 1 and {MAX_QTY}")
+        discount_pct = _decimal(
+            line.get("discount_pct"), f"Line {index}: discount_pct", Decimal(0)
+        )
+        if not 0 <= discount_pct <= 100:
+            raise RowError(f"Line {index}: discount_pct must be between 0 and 100")
+        order_line = build_order_line(product_id, unit_price, qty, discount_pct)
+        _check_column(
+            order_line.sub_total,
+            SalesOrderLine,
+            "sub_total",
+            f"Line {index}: sub_total",
+        )
+        order_lines.append(order_line)
+
+    vat_rate = _decimal(record.get("vat_rate"), "vat_rate", Decimal(0))
+    _check_column(vat_rate, SalesOrder, "vat_rate", "vat_rate")
+    order_total = sum(order_line.sub_total for order_line in order_lines)
+    _check_column(order_total, SalesOrder, "order_total", "Order total")
+    sale_order = SalesOrder(
+        number=SalesOrder.generate_number(),
+        customer_id=customers[email],
+        notes=_value(record.get("notes")),
+        vat_rate=vat_rate,
+        order_total=order_total,
+    )
+    return sale_order, order_lines
+
+
+def _lookup(chunk):
+    """Resolve the customers and products a chunk refers to, in three queries."""
+    emails, product_ids, barcodes = set(), set(), set()
+    for _, record, _ in chunk:
+        if record is None:
+            continue
+        emails.add(_value(record.get("customer_email")))
+        for line in record.get("lines") or ():
+            if not isinstance(line, dict):
+                continue
+            try:
+                product_ids.add(int(_value(line.get("product_id"))))
+            except (TypeError, ValueError):
+                pass
+            barcodes.add(_value(line.get("barcode")))
+
+    customers = dict(
+        Customer.objects.filter(email__in=emails - {None}).values_list("email", "pk")
+    )
+    prices = dict(
+        Product.objects.filter(pk__in=product_ids).values_list("pk", "sales_price")
+    )
+    # Barcodes are not unique, the oldest product wins.
+    by_barcode = {}
+    for pk, barcode, price in (
+        Product.objects.filter(barcode__in=barcodes - {None})
+        .order_by("-pk")
+        .values_list("pk", "barcode", "sales_price")
+    ):
+        by_barcode[barcode] = (pk, price)
+    return customers, prices, by_barcode
+
+
+def _import_chunk(order_import, chunk):
+    customers, prices, barcodes = _lookup(chunk)
+
+    sale_orders, order_lines, errors = [], [], []
+    for number, record, error in chunk:
+        if error is None:
+            try:
+                sale_order, lines = _build_order(record, customers, prices, barcodes)
+            except RowError as e:
+                error = str(e)
+            else:
+                sale_orders.append(sale_order)
+                order_lines.append(lines)
+                continue
+        errors.append(
+            OrderImportError(
+                order_import=order_import,
+                row=number,
+                reference=str(_value((record or {}).get("order_ref")) or "")[:255]
+                or None,
+                error=error,
+            )
+        )
+
+    with transaction.atomic():
+        SalesOrder.objects.bulk_create(sale_orders)
+        for sale_order, lines in zip(sale_orders, order_lines):
+            for line in lines:
+                line.order = sale_order
+        lines = SalesOrderLine.objects.bulk_create(chain.from_iterable(order_lines))
+        OrderImportError.objects.bulk_create(errors)
+
+    order_import.orders_read += len(chunk)
+    order_import.orders_created += len(sale_orders)
+    order_import.lines_created += len(lines)
+    order_import.errors_count += len(errors)
+
+
+def import_orders(stream, file_format, order_import=None, chunk_size=1000):
+    """
+    Import the sale orders of a CSV or NDJSON text stream (see read_csv and
+    read_ndjson).
+
+    The stream is read incrementally, `chunk_size` orders at a time. The
+    customers (by email) and products (by id or barcode) of a chunk are looked
+    up with one query each, and its orders and lines are inserted with one
+    bulk_create each, in the chunk's own transaction. Invalid records are
+    skipped and recorded as OrderImportError rows, the import report. An
+    unreadable file fails the import; any other error fails it too, and is
+    raised. Returns the OrderImport, with its counters and duration.
+    """
+    if order_import is None:
+        order_import = OrderImport.objects.create(file_format=file_format)
+    started = time.monotonic()
+    records = READERS[file_format](stream)
+    try:
+        while chunk := list(islice(records, chunk_size)):
+            _import_chunk(order_import, chunk)
+            order_import.duration = time.monotonic() - started
+            order_import.save()
+    except Exception as e:
+        OrderImportError.objects.create(
+            order_import=order_import, error=str(e) or repr(e)
+        )
+        order_import.errors_count += 1
+        order_import.status = "FAILED"
+        # Only errors of the file itself are reported rather than raised.
+        if not isinstance(e, (RowError, UnicodeDecodeError, csv.Error)):
+            raise
+    else:
+        order_import.status = "COMPLETED"
+    finally:
+        order_import.duration = time.monotonic() - started
+        order_import.finished_at = timezone.now()
+        order_import.save()
+    return order_import
+
+
+def iter_error_report(order_import):
+    """Yield the rows of the import's error report, header first."""
+    yield REPORT_COLUMNS
+    for error in order_import.errors.order_by("pk").iterator(chunk_size=2000):
+        yield [error.row, error.reference, error.error]
@@ -0,0 +1,81 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from core import metrics
+from core.models import ByteOrder
+from .models import Customer
+from .phones import normalize_phone
+
+LOOKUP_FIELDS = ("id", "name", "email", "phone", "billing_address", "shipping_address")
+
+# Queries made only of these characters are phone numbers.
+PHONE_PATTERN = re.compile(r"[\d\s()+./-]+")
+
+
+def _matches(query):
+    """The customers `query` matches, in the order of the index serving it."""
+    if PHONE_PATTERN.fullmatch(query):
+        phone = normalize_phone(query)
+        if phone:
+            # Scans the phone_normalized index in order and stops at the limit.
+            return Customer.objects.filter(phone_normalized__startswith=phone).order_by(
+                "phone_normalized"
+            )
+    # Upper case keys in byte order, as the customer_*_prefix_idx indexes are:
+    # the prefix match is an index range already in order.
+    customers = Customer.objects.alias(
+        name_key=ByteOrder(Upper("name")), email_key=ByteOrder(Upper("email"))
+    )
+    prefix = query.upper()
+    if "@" in query:
+        return customers.filter(email_key__startswith=prefix).order_by(
+            "email_key", "id"
+        )
+    return customers.filter(
+        Q(name_key__startswith=prefix) | Q(email_key__startswith=prefix)
+    ).order_by("name_key", "id")
+
+
+def _search(query, limit):
+    rows = list(_matches(query).values(*LOOKUP_FIELDS)[: limit + 1])
+    return {"results": rows[:limit], "truncated": len(rows) > limit}
+
+
+def lookup_customers(query, limit=None):
+    """
+    Find the customers whose phone, email or name starts with `query`, for
+    caller ID and type-ahead.
+
+    Phone numbers are matched on their normalized form (see normalize_phone),
+    email addresses and names case insensitively; every lookup is a prefix
+    match served by an index, in the order of that index (phone, email or
+    name, then id). At most `limit` customers are returned and
+    nothing is counted: "truncated" tells that more customers match. Results
+    are cached for CUSTOMER_LOOKUP_CACHE_TTL seconds, so a caller calling back
+    is found without a query.
+    """
+    query = query.strip()
+    limit = min(
+        limit or settings.CUSTOMER_LOOKUP_MAX_RESULTS,
+        settings.CUSTOMER_LOOKUP_MAX_RESULTS,
+    )
+    ttl = settings.CUSTOMER_LOOKUP_CACHE_TTL
+    if not ttl:
+        return _search(query, limit)
+
+    cache = caches[settings.RESPONSE_CACHE_ALIAS]
+    digest = hashlib.md5(f"{query.lower()}\0{limit}".encode()).hexdigest()
+    key = f"customers:lookup:{digest}"
+    result = cache.get(key)
+    if result is not None:
+        metrics.incr("customer_lookup.hits")
+        return result
+    metrics.incr("customer_lookup.misses")
+    result = _search(query, limit)
+    cache.set(key, result, timeout=ttl)
+    return result
@@ -0,0 +1,131 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from products.models import Product
+from telesales.models import Customer, SalesOrder, SalesOrderLine
+from telesales.services import (
+    RESERVATION_STRATEGIES,
+    ConfirmationError,
+    confirm_sales_order,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark sale order confirmation under concurrent load for each "
+        "reservation strategy. Creates its own products, customer and orders "
+        "and removes them afterwards. Run it against PostgreSQL: SQLite "
+        "serializes writers and cannot show lock contention."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument(
+            "--products",
+            type=int,
+            default=1,
+            help="Number of hot products shared by all the orders.",
+        )
+        parser.add_argument(
+            "--stripes",
+            type=int,
+            default=0,
+            help="Stock stripes given to each hot product (0 disables striping).",
+        )
+        parser.add_argument(
+            "--strategy",
+            choices=RESERVATION_STRATEGIES,
+            action="append",
+            help="Strategy to benchmark, may be repeated (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == "sqlite" and options["threads"] > 1:
+            self.stderr.write(
+                self.style.WARNING(
+                    "SQLite serializes writes, expect 'database is locked' conflicts."
+                )
+            )
+
+        for strategy in options["strategy"] or RESERVATION_STRATEGIES:
+            customer, products, order_ids = self._setup(
+                options["orders"], options["products"], options["stripes"]
+            )
+            try:
+                self._run(strategy, order_ids, options["threads"], options["stripes"])
+            finally:
+                self._teardown(customer, products)
+
+    def _setup(self, orders, product_count, stripes):
+        tag = uuid.uuid4().hex[:8]
+        customer = Customer.objects.create(
+            name=f"benchmark {tag}", email=f"benchmark-{tag}@example.com", phone="0"
+        )
+        products = [
+            Product.objects.create(
+                name=f"benchmark {tag} #{i}",
+                sales_price=Decimal("1.00"),
+                cost=Decimal("1.00"),
+                quantity_on_hand=orders,
+                stock_stripes=stripes,
+            )
+            for i in range(product_count)
+        ]
+        sale_orders = SalesOrder.objects.bulk_create(
+            SalesOrder(customer=customer, number=f"BENCH-{tag}-{i}")
+            for i in range(orders)
+        )
+        SalesOrderLine.objects.bulk_create(
+            SalesOrderLine(
+                order=sale_order,
+                product=products[i % product_count],
+                qty=1,
+                unit_price=Decimal("1.00"),
+                sub_total=Decimal("1.00"),
+            )
+            for i, sale_order in enumerate(sale_orders)
+        )
+        order_ids = list(
+            SalesOrder.objects.filter(customer=customer).values_list("pk", flat=True)
+        )
+        return customer, products, order_ids
+
+    def _teardown(self, customer, products):
+        Customer.global_objects.filter(pk=customer.pk).delete()
+        Product.global_objects.filter(pk__in=[p.pk for p in products]).delete()
+
+    def _run(self, strategy, order_ids, threads, stripes):
+        def worker(pks):
+            outcomes = []
+            try:
+                for pk in pks:
+                    try:
+                        confirm_sales_order(pk, strategy=strategy)
+                        outcomes.append("confirmed")
+                    except ConfirmationError:
+                        outcomes.append("rejected")
+                    except DatabaseError:
+                        outcomes.append("conflict")
+            finally:
+                connection.close()
+            return outcomes
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            chunks = [order_ids[i::threads] for i in range(threads)]
+            outcomes = [o for result in executor.map(worker, chunks) for o in result]
+        elapsed = time.perf_counter() - started
+
+        confirmed = outcomes.count("confirmed")
+        self.stdout.write(
+            f"{strategy:<12} stripes={stripes} orders={len(order_ids)} threads={threads} "
+            f"confirmed={confirmed} rejected={outcomes.count('rejected')} "
+            f"conflicts={outcomes.count('conflict')} "
+            f"elapsed={elapsed:.2f}s throughput={confirmed / elapsed:.1f} confirms/s"
+        )
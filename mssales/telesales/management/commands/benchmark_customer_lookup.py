@@ -0,0 +1,114 @@
+import random
+import statistics
+import time
+import uuid
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.benchmarks import rolled_back
+from telesales.lookup import lookup_customers
+from telesales.models import Customer
+from telesales.phones import normalize_phone
+
+FIRST_NAMES = ["Alice", "Bruno", "Carine", "Didier", "Esther", "Franck", "Grace"]
+LAST_NAMES = ["Mbarga", "Nkoulou", "Fotso", "Tchoua", "Ebogo", "Kamga", "Ngono"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the customer lookup (caller ID and type-ahead): fill the "
+        "customers table with --customers generated customers, then time phone, "
+        "email and name prefix lookups with the cache off, and a cached repeat. "
+        "On PostgreSQL the p95 of every lookup must stay under --budget-ms. "
+        "Works in a transaction that is rolled back, so nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=3_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--budget-ms", type=float, default=10)
+
+    def handle(self, *args, **options):
+        postgresql = connection.vendor == "postgresql"
+        if not postgresql:
+            self.stderr.write(
+                self.style.WARNING(
+                    "The prefix indexes of names and emails are PostgreSQL only, "
+                    "the latency budget is only enforced on PostgreSQL."
+                )
+            )
+
+        over_budget = []
+        with rolled_back():
+            tag = self._setup(options["customers"], options["batch_size"])
+            for label, query in self._queries(tag):
+                with override_settings(CUSTOMER_LOOKUP_CACHE_TTL=0):
+                    timings, count = self._time(query, options["repeat"])
+                p50 = statistics.median(timings)
+                p95 = statistics.quantiles(timings, n=20)[-1]
+                self.stdout.write(
+                    f"{label} {query!r}: {count} customers, "
+                    f"p50 {p50:.2f} ms, p95 {p95:.2f} ms"
+                )
+                if p95 > options["budget_ms"]:
+                    over_budget.append(label)
+
+            caller = f"+1 {tag} 0000 42"
+            lookup_customers(caller)
+            timings, count = self._time(caller, options["repeat"])
+            self.stdout.write(
+                f"cached repeat: {count} customers, "
+                f"p50 {statistics.median(timings):.2f} ms"
+            )
+
+        if postgresql and over_budget:
+            raise CommandError(
+                f"Over the {options['budget_ms']} ms budget: {', '.join(over_budget)}"
+            )
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _setup(self, customer_count, batch_size):
+        # A numeric tag keeps the generated phone numbers unique to this run.
+        tag = f"{random.randrange(100, 1000)}"
+        rng = random.Random(tag)
+        email_tag = uuid.uuid4().hex[:8]
+        customers = (
+            Customer(
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+                email=f"lookup-{email_tag}-{i}@example.com",
+                phone=f"+1 {tag} {i:08d}",
+                phone_normalized=normalize_phone(f"+1 {tag} {i:08d}"),
+            )
+            for i in range(customer_count)
+        )
+        started = time.perf_counter()
+        while batch := list(islice(customers, batch_size)):
+            Customer.objects.bulk_create(batch)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE telesales_customer")
+        self.stdout.write(
+            f"Created {customer_count} customers in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+        return tag
+
+    def _queries(self, tag):
+        return [
+            ("full phone", f"+1 {tag} 0000 4242"),
+            ("phone prefix", f"+1 {tag} 00"),
+            ("email prefix", "lookup-"),
+            ("name prefix", "Carine Fo"),
+        ]
+
+    def _time(self, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = lookup_customers(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, len(result["results"])
@@ -0,0 +1,116 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmarks import rolled_back
+from products.models import Product
+from products.views import ProductViewSet
+from telesales.models import Customer, SalesOrder, SalesOrderLine
+from telesales.views import SalesOrderViewSet
+
+ENDPOINTS = {
+    "ProductViewSet.list": ("/api/products/", ProductViewSet),
+    "SalesOrderViewSet.list": ("/api/sales/orders/", SalesOrderViewSet),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the list endpoints of products and sale orders with the "
+        "regular serializers and with the compiled values() path "
+        "(FAST_LIST_SERIALIZATION). That both render the same bytes is checked "
+        "by the test suite. Works in a transaction that is rolled back, so "
+        "nothing is left behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--lines", type=int, default=5, help="Lines per order.")
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Measures serialization, not the catalog response cache.
+        with rolled_back(), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            RESPONSE_CACHE_TIMEOUT=0,
+        ):
+            self._setup(options["products"], options["orders"], options["lines"])
+            user = get_user_model()(pk=0, is_staff=True)
+            for name, (url, viewset) in ENDPOINTS.items():
+                for fast in (False, True):
+                    with override_settings(FAST_LIST_SERIALIZATION=fast):
+                        rows, elapsed = self._run(url, viewset, user, options)
+                    label = "fast" if fast else "regular"
+                    self.stdout.write(
+                        f"{name} {label}: {rows} rows in {elapsed:.2f}s, "
+                        f"{rows / elapsed:.0f} rows/s"
+                    )
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def _run(self, url, viewset, user, options):
+        view = viewset.as_view({"get": "list"})
+        factory = APIRequestFactory()
+        rows = 0
+        started = time.perf_counter()
+        for _ in range(options["repeat"]):
+            page = 1
+            while True:
+                request = factory.get(
+                    url, {"page": page, "page_size": options["page_size"]}
+                )
+                force_authenticate(request, user=user)
+                response = view(request)
+                response.render()
+                if response.status_code != 200:
+                    raise CommandError(f"{url} answered {response.status_code}")
+                rows += len(response.data["results"])
+                if not response.data["next"]:
+                    break
+                page += 1
+        return rows, time.perf_counter() - started
+
+    def _setup(self, product_count, order_count, line_count):
+        tag = uuid.uuid4().hex[:8]
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"benchmark {tag} #{i}",
+                barcode=f"{tag}{i}",
+                sales_price=Decimal("12.50"),
+                cost=Decimal("7.25"),
+                quantity_on_hand=100,
+                availables=100,
+            )
+            for i in range(max(product_count, line_count))
+        )
+        customers = Customer.objects.bulk_create(
+            Customer(name=f"benchmark {tag}", email=f"benchmark-{tag}-{i}@example.com")
+            for i in range(order_count)
+        )
+        sale_orders = SalesOrder.objects.bulk_create(
+            SalesOrder(
+                number=SalesOrder.generate_number(),
+                customer=customer,
+                vat_rate=Decimal("19.25"),
+                order_total=Decimal("12.50") * line_count,
+            )
+            for customer in customers
+        )
+        SalesOrderLine.objects.bulk_create(
+            SalesOrderLine(
+                order=sale_order,
+                product=product,
+                qty=1,
+                unit_price=product.sales_price,
+                sub_total=product.sales_price,
+            )
+            for sale_order in sale_orders
+            for product in products[:line_count]
+        )
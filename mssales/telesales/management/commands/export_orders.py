@@ -0,0 +1,80 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from telesales.exports import EXPORT_FORMATS, EXPORT_RECORDS, gzip_stream, iter_export
+from telesales.filters import OrderFilter
+from telesales.models import SalesOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Export sale orders with their customer and their lines or reservations "
+        "as CSV or NDJSON (see telesales.exports), optionally gzip compressed. "
+        "Orders are read through a server-side cursor and written chunk by "
+        "chunk, so memory stays flat whatever the size of the export."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to write, "-" for stdout.')
+        parser.add_argument("--output", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument(
+            "--records",
+            choices=EXPORT_RECORDS,
+            default="lines",
+            help="What a CSV row is, ignored by NDJSON.",
+        )
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--status", choices=dict(SalesOrder.STATUS_CHOICES))
+        parser.add_argument("--created-after", help="ISO datetime, inclusive.")
+        parser.add_argument("--created-before", help="ISO datetime, inclusive.")
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.ORDER_EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        data = {
+            key: options[option]
+            for key, option in (
+                ("status", "status"),
+                ("created_at__gte", "created_after"),
+                ("created_at__lte", "created_before"),
+            )
+            if options[option]
+        }
+        filterset = OrderFilter(data, queryset=SalesOrder.objects.all())
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+
+        pieces = iter_export(
+            filterset.qs,
+            output=options["output"],
+            records=options["records"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["gzip"]:
+            pieces = gzip_stream(pieces)
+        else:
+            pieces = (piece.encode() for piece in pieces)
+
+        started = time.perf_counter()
+        written = 0
+        path = options["path"]
+        stream = sys.stdout.buffer if path == "-" else open(path, "wb")
+        try:
+            for piece in pieces:
+                stream.write(piece)
+                written += len(piece)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+
+        if path != "-":
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Wrote {written} bytes to {path} "
+                    f"in {time.perf_counter() - started:.2f}s"
+                )
+            )
@@ -0,0 +1,66 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from telesales.imports import import_orders, iter_error_report
+from telesales.models import OrderImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Import sale orders from a CSV or NDJSON file (see telesales.imports). "
+        "The file is read incrementally and written in chunks; rejected rows "
+        "are recorded in the import's error report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=[choice for choice, _ in OrderImport.FORMAT_CHOICES],
+            help="File format, guessed from the extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--report", help="Write the rows that could not be imported to this CSV."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["file_format"]
+        if file_format is None:
+            extension = os.path.splitext(path)[1].lower()
+            file_format = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(
+                extension
+            )
+            if file_format is None:
+                raise CommandError("Cannot tell the file format, use --format")
+
+        order_import = OrderImport.objects.create(
+            file_name=os.path.basename(path)[:255], file_format=file_format
+        )
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            import_orders(
+                stream, file_format, order_import, chunk_size=options["chunk_size"]
+            )
+
+        if options["report"]:
+            with open(options["report"], "w", newline="") as report:
+                csv.writer(report).writerows(iter_error_report(order_import))
+
+        style = (
+            self.style.SUCCESS
+            if order_import.status == "COMPLETED"
+            else self.style.ERROR
+        )
+        self.stdout.write(
+            style(
+                f"Import {order_import.pk} {order_import.status.lower()}: "
+                f"{order_import.orders_created} of {order_import.orders_read} orders "
+                f"and {order_import.lines_created} lines imported, "
+                f"{order_import.errors_count} errors, in {order_import.duration:.2f}s "
+                f"({order_import.orders_per_second or 0} orders/s)"
+            )
+        )
@@ -0,0 +1,72 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from telesales.services import process_confirmation_requests
+
+
+class Command(BaseCommand):
+    help = (
+        "Drain the queue of sale order confirmations (CONFIRMATION_MODE=queued). "
+        "Each batch is confirmed in one transaction; workers claim batches with "
+        "SKIP LOCKED, so several workers or several instances of this command "
+        "can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of worker processes."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for more.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] <= 1:
+            self.drain(options["batch_size"], options["interval"], options["once"])
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=self.drain,
+                args=(options["batch_size"], options["interval"], options["once"]),
+            )
+            for _ in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def drain(self, batch_size, interval, once):
+        processed = 0
+        try:
+            while True:
+                count = process_confirmation_requests(batch_size)
+                processed += count
+                if count:
+                    self.stdout.write(f"Processed {count} confirmation requests")
+                elif once:
+                    break
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connections.close_all()
+        self.stdout.write(
+            self.style.SUCCESS(f"Done, {processed} confirmation requests processed")
+        )
@@ -0,0 +1,64 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from telesales.analytics import rebuild_days
+from telesales.models import SalesOrder
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales summaries behind /api/sales/analytics/ "
+        "from the CONFIRMED sale orders (see telesales.analytics), --days at "
+        "a time, each chunk in its own transaction. Run it once after "
+        "deploying the summaries, and to repair them after editing the lines "
+        "of confirmed orders. Orders confirmed or cancelled while a chunk is "
+        "being rebuilt can be counted twice or missed, so run it when the "
+        "order endpoints are quiet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help="First day, YYYY-MM-DD (default: the oldest confirmed order).",
+        )
+        parser.add_argument(
+            "--end",
+            type=date.fromisoformat,
+            help="Last day, YYYY-MM-DD (default: today).",
+        )
+        parser.add_argument("--days", type=int, default=7)
+
+    def handle(self, *args, **options):
+        end = options["end"] or timezone.localdate()
+        start = options["start"]
+        if start is None:
+            oldest = SalesOrder.objects.filter(status="CONFIRMED").aggregate(
+                oldest=Min("created_at")
+            )["oldest"]
+            if oldest is None:
+                self.stdout.write("No confirmed sale orders")
+                return
+            start = timezone.localdate(oldest)
+        if start > end:
+            raise CommandError("--start is after --end")
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1")
+
+        orders = 0
+        first = start
+        while first <= end:
+            last = min(first + timedelta(days=options["days"] - 1), end)
+            counted = rebuild_days(first, last)
+            orders += counted
+            self.stdout.write(f"{first} to {last}: {counted} orders")
+            first = last + timedelta(days=1)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt the sales summaries from {start} to {end}: {orders} orders"
+            )
+        )
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from telesales.models import SalesOrder, SalesOrderLine
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute order_total from the order lines for the orders whose stored "
+        "total drifted. Works over primary key ranges, each fixed with one "
+        "set-based UPDATE in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many orders drifted.",
+        )
+
+    def handle(self, *args, **options):
+        line_totals = (
+            SalesOrderLine.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum("sub_total"))
+            .values("total")
+        )
+        computed = Coalesce(Subquery(line_totals), Value(Decimal(0)))
+
+        bounds = SalesOrder.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            self.stdout.write(self.style.SUCCESS("No sale orders"))
+            return
+
+        fixed = 0
+        chunk_size = options["chunk_size"]
+        for start in range(bounds["low"], bounds["high"] + 1, chunk_size):
+            with transaction.atomic():
+                orders = SalesOrder.objects.filter(
+                    pk__gte=start, pk__lt=start + chunk_size
+                )
+                drifted = (
+                    orders.annotate(computed_total=computed)
+                    .exclude(order_total=F("computed_total"))
+                    .values("pk")
+                )
+                if options["dry_run"]:
+                    fixed += drifted.count()
+                else:
+                    fixed += SalesOrder.objects.filter(pk__in=drifted).update(
+                        order_total=computed, updated_at=timezone.now()
+                    )
+
+        verb = "drifted" if options["dry_run"] else "fixed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{fixed} sale order totals {verb} "
+                f"(ids {bounds['low']} to {bounds['high']})"
+            )
+        )
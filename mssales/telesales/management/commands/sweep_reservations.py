@@ -0,0 +1,84 @@
+import multiprocessing
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from telesales.services import sweep_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        "Give the stock held by expired reservations back to the products and "
+        "mark their sale orders EXPIRED (see RESERVATION_TTL). Reservations are "
+        "claimed in chunks with SKIP LOCKED, so several workers or several "
+        "instances of this command can run side by side."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of worker processes."
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60.0,
+            help="Seconds to wait when no reservation has expired.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no expired reservation is left instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] <= 1:
+            self.sweep(options["chunk_size"], options["interval"], options["once"])
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(
+                target=self.sweep,
+                args=(options["chunk_size"], options["interval"], options["once"]),
+            )
+            for _ in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def sweep(self, chunk_size, interval, once):
+        reservations = orders = quantity = 0
+        products = Counter()
+        try:
+            while True:
+                summary = sweep_expired_reservations(chunk_size)
+                if summary["reservations"]:
+                    reservations += summary["reservations"]
+                    orders += summary["orders"]
+                    quantity += summary["quantity"]
+                    products.update(summary["products"])
+                    self.stdout.write(
+                        f"Released {summary['reservations']} reservations "
+                        f"({summary['quantity']} units), "
+                        f"{summary['orders']} orders expired"
+                    )
+                elif once:
+                    break
+                else:
+                    time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connections.close_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done, {reservations} reservations released, {quantity} units "
+                f"reclaimed over {len(products)} products, {orders} orders expired"
+            )
+        )
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telesales', '0012_reservation_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deleted_at', models.DateTimeField(blank=True, null=True)),
+                ('restored_at', models.DateTimeField(blank=True, null=True)),
+                ('transaction_id', models.UUIDField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('ndjson', 'NDJSON')], max_length=8)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='RUNNING', max_length=16)),
+                ('orders_read', models.PositiveIntegerField(default=0)),
+                ('orders_created', models.PositiveIntegerField(default=0)),
+                ('lines_created', models.PositiveIntegerField(default=0)),
+                ('errors_count', models.PositiveIntegerField(default=0)),
+                ('duration', models.FloatField(default=0)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderImportError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.PositiveIntegerField(blank=True, null=True)),
+                ('reference', models.CharField(blank=True, max_length=255, null=True)),
+                ('error', models.TextField()),
+                ('order_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='telesales.orderimport')),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:10
+
+from django.db import migrations, models
+
+from telesales.phones import normalize_phone
+
+# Case insensitive prefix matches (istartswith) of the customer lookup.
+CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS telesales_customer_name_prefix_idx "
+    "ON telesales_customer (upper(name::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS telesales_customer_email_prefix_idx "
+    "ON telesales_customer (upper(email::text) text_pattern_ops)",
+]
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS telesales_customer_name_prefix_idx",
+    "DROP INDEX IF EXISTS telesales_customer_email_prefix_idx",
+]
+
+
+def normalize_phones(apps, schema_editor):
+    Customer = apps.get_model("telesales", "Customer")
+    customers = Customer._base_manager.only("pk", "phone").order_by("pk")
+    batch = []
+    for customer in customers.iterator(chunk_size=2000):
+        customer.phone_normalized = normalize_phone(customer.phone)
+        batch.append(customer)
+        if len(batch) == 2000:
+            Customer._base_manager.bulk_update(batch, ["phone_normalized"])
+            batch = []
+    Customer._base_manager.bulk_update(batch, ["phone_normalized"])
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # Expression indexes with pattern operator classes are PostgreSQL only.
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telesales', '0014_customer_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=40),
+        ),
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+        migrations.RunPython(_run(CREATE_INDEXES), _run(DROP_INDEXES)),
+    ]
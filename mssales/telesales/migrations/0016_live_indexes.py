@@ -0,0 +1,52 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_live_indexes'),
+        ('telesales', '0015_customer_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='salesorder',
+            name='status',
+            field=models.CharField(choices=[('DRAFT', 'Draft'), ('CONFIRMED', 'Confirmed'), ('CANCELLED', 'Cancelled'), ('EXPIRED', 'Expired')], default='DRAFT', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='confirmationrequest',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('status', 'PENDING')), fields=['id'], name='confirmation_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='reservation_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['product', '-created_at'], name='reservation_live_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True), ('expires_at__isnull', False)), fields=['expires_at', 'id'], name='reservation_expiring_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-status'], name='sales_order_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['-created_at', '-id'], name='sales_order_live_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['status', '-created_at'], name='sales_order_live_status_idx'),
+        ),
+    ]
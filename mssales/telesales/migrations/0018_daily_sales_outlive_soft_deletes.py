@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0014_orderline_received_quantity"),
+        ("telesales", "0017_daily_sales_summaries"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailycustomersales",
+            name="customer",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="telesales.customer",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="dailyproductsales",
+            name="product",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="products.product",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:28
+
+import core.models
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# The text_pattern_ops indexes of 0015 serve the prefix match but not the
+# ORDER BY of the lookup; the byte order indexes below serve both.
+CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS telesales_customer_name_prefix_idx "
+    "ON telesales_customer (upper(name::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS telesales_customer_email_prefix_idx "
+    "ON telesales_customer (upper(email::text) text_pattern_ops)",
+]
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS telesales_customer_name_prefix_idx",
+    "DROP INDEX IF EXISTS telesales_customer_email_prefix_idx",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("telesales", "0018_daily_sales_outlive_soft_deletes"),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(DROP_INDEXES), _run(CREATE_INDEXES)),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                core.models.ByteOrder(django.db.models.functions.text.Upper("name")),
+                models.F("id"),
+                name="customer_name_prefix_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                core.models.ByteOrder(django.db.models.functions.text.Upper("email")),
+                models.F("id"),
+                name="customer_email_prefix_idx",
+            ),
+        ),
+    ]
@@ -1,9 +1,16 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Upper
+from django.utils import timezone
 
 from django_softdelete.models import SoftDeleteModel
 
-from core.models import TimeStampedModel
+from core.models import LIVE_ROWS, ByteOrder, TimeStampedModel
 from products.models import Product
+from .phones import normalize_phone
 import uuid
 
 
@@ -11,39 +18,111 @@ class Customer(SoftDeleteModel):
     name = models.CharField(max_length=255)
     email = models.EmailField(max_length=255, unique=True)
     phone = models.CharField(max_length=32)
+    # `phone` in canonical form (see normalize_phone), for caller ID lookups.
+    phone_normalized = models.CharField(
+        max_length=40, blank=True, default="", editable=False, db_index=True
+    )
     billing_address = models.CharField(max_length=255, blank=True, null=True)
     shipping_address = models.CharField(max_length=255, blank=True, null=True)
+    updated_at = models.DateTimeField(null=True, blank=True, auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Type-ahead lookups: case insensitive prefix matches, in order
+            # (see telesales.lookup).
+            models.Index(
+                ByteOrder(Upper("name")), "id", name="customer_name_prefix_idx"
+            ),
+            models.Index(
+                ByteOrder(Upper("email")), "id", name="customer_email_prefix_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_normalized"}
+        super().save(*args, **kwargs)
+
 
 class SalesOrder(TimeStampedModel):
     STATUS_CHOICES = [
         ("DRAFT", "Draft"),
         ("CONFIRMED", "Confirmed"),
         ("CANCELLED", "Cancelled"),
+        ("EXPIRED", "Expired"),
     ]
 
     number = models.CharField(max_length=64, unique=True, editable=False)
     customer = models.ForeignKey(
         Customer, related_name="sales_orders", on_delete=models.CASCADE
     )
-    status = models.CharField(
-        max_length=16, choices=STATUS_CHOICES, default="DRAFT", db_index=True
-    )
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="DRAFT")
     notes = models.TextField(blank=True, null=True)
     vat_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0, null=True)
     order_total = models.DecimalField(
         max_digits=10, decimal_places=2, default=0, null=True
     )
 
+    class Meta:
+        indexes = [
+            # The default list ordering, ("-created_at", "-status"): the keyset
+            # index below only gives it with an Incremental Sort on status.
+            models.Index(
+                fields=["-created_at", "-status"],
+                condition=LIVE_ROWS,
+                name="sales_order_live_created_idx",
+            ),
+            # Keyset pagination. Descending index columns keep their nulls
+            # first, where KeysetPagination sorts them.
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=LIVE_ROWS,
+                name="sales_order_live_keyset_idx",
+            ),
+            # OrderFilter: a status and a created_at range, newest first.
+            models.Index(
+                fields=["status", "-created_at"],
+                condition=LIVE_ROWS,
+                name="sales_order_live_status_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.number
 
+    @property
+    def total_incl_vat(self):
+        """order_total with the order's VAT added."""
+        total = self.order_total or Decimal(0)
+        vat_rate = self.vat_rate or Decimal(0)
+        return (total * (1 + vat_rate / 100)).quantize(Decimal("0.01"))
+
+    @classmethod
+    def add_to_totals(cls, deltas):
+        """
+        Add `deltas` ({order_id: amount}) to the orders' order_total, each with
+        an atomic UPDATE. The orders' updated_at is bumped even when their
+        delta is 0, since their lines changed.
+        """
+        now = timezone.now()
+        for order_id, delta in sorted(deltas.items()):
+            cls.global_objects.filter(pk=order_id).update(
+                order_total=Coalesce(F("order_total"), Value(Decimal(0))) + delta,
+                updated_at=now,
+            )
+
+    @staticmethod
+    def generate_number():
+        return f"SO-{uuid.uuid4().hex[:10].upper()}"
+
     def save(self, *args, **kwargs):
         if not self.number:
-            self.number = f"SO-{uuid.uuid4().hex[:10].upper()}"
+            self.number = self.generate_number()
         super().save(*args, **kwargs)
 
 
@@ -62,11 +141,51 @@ class SalesOrderLine(TimeStampedModel):
     def __str__(self):
         return f"{self.product.name} ({self.qty})"
 
+    def compute_sub_total(self):
+        return self.qty * self.unit_price * (1 - Decimal(self.discount_pct) / 100)
+
     def save(self, *args, **kwargs):
-        if not self.pk:
-            self.unit_price = self.product.sales_price
-            self.sub_total = self.qty * self.unit_price * (1 - self.discount_pct / 100)
-        super().save(*args, **kwargs)
+        """
+        Save the line and apply the change of its sub total to its order's
+        order_total, so that the total never needs a scan over the lines.
+        Soft-deleted lines do not count toward the total.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "unit_price", "sub_total"}
+
+        with transaction.atomic():
+            previous = (
+                SalesOrderLine.global_objects.select_for_update()
+                .filter(pk=self.pk)
+                .values("order_id", "product_id", "sub_total", "deleted_at")
+                .first()
+                if self.pk
+                else None
+            )
+            if previous is None or previous["product_id"] != self.product_id:
+                self.unit_price = self.product.sales_price
+            self.sub_total = self.compute_sub_total()
+            super().save(*args, **kwargs)
+
+            deltas = defaultdict(Decimal)
+            if previous and previous["deleted_at"] is None:
+                deltas[previous["order_id"]] -= previous["sub_total"]
+            if self.deleted_at is None:
+                deltas[self.order_id] += self.sub_total
+            SalesOrder.add_to_totals(deltas)
+
+    def hard_delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = (
+                SalesOrderLine.global_objects.select_for_update()
+                .filter(pk=self.pk, deleted_at__isnull=True)
+                .values_list("order_id", "sub_total")
+                .first()
+            )
+            super().hard_delete(*args, **kwargs)
+            if previous:
+                SalesOrder.add_to_totals({previous[0]: -previous[1]})
 
 
 class Reservation(TimeStampedModel):
@@ -75,6 +194,175 @@ class Reservation(TimeStampedModel):
     )
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     qty = models.IntegerField()
+    # Released by `manage.py sweep_reservations` once past; never when null.
+    expires_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The list and its keyset pagination, nulls first (see
+            # KeysetPagination).
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=LIVE_ROWS,
+                name="reservation_live_created_idx",
+            ),
+            models.Index(
+                fields=["product", "-created_at"],
+                condition=LIVE_ROWS,
+                name="reservation_live_product_idx",
+            ),
+            # The sweep claims the expiring reservations in this order.
+            models.Index(
+                fields=["expires_at", "id"],
+                condition=LIVE_ROWS & models.Q(expires_at__isnull=False),
+                name="reservation_expiring_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Reservation: {self.qty} x {self.product.name} for Order {self.order.number}"
+
+
+class ConfirmationRequest(TimeStampedModel):
+    """A sale order confirmation queued for the confirmation workers."""
+
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("CONFIRMED", "Confirmed"),
+        ("REJECTED", "Rejected"),
+    ]
+
+    order = models.ForeignKey(
+        SalesOrder, related_name="confirmation_requests", on_delete=models.CASCADE
+    )
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default="PENDING", db_index=True
+    )
+    error = models.TextField(blank=True, null=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # The queue the confirmation workers claim from, oldest first.
+            models.Index(
+                fields=["id"],
+                condition=LIVE_ROWS & models.Q(status="PENDING"),
+                name="confirmation_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Confirmation {self.pk} of order {self.order_id}: {self.status}"
+
+
+class OrderImport(TimeStampedModel):
+    """A bulk import of sale orders from a CSV or NDJSON file."""
+
+    FORMAT_CHOICES = [
+        ("csv", "CSV"),
+        ("ndjson", "NDJSON"),
+    ]
+    STATUS_CHOICES = [
+        ("RUNNING", "Running"),
+        ("COMPLETED", "Completed"),
+        ("FAILED", "Failed"),
+    ]
+
+    file_name = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=8, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="RUNNING")
+    orders_read = models.PositiveIntegerField(default=0)
+    orders_created = models.PositiveIntegerField(default=0)
+    lines_created = models.PositiveIntegerField(default=0)
+    errors_count = models.PositiveIntegerField(default=0)
+    # Seconds spent importing.
+    duration = models.FloatField(default=0)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Import {self.pk} of {self.file_name}: {self.status}"
+
+    @property
+    def orders_per_second(self):
+        return round(self.orders_created / self.duration, 1) if self.duration else None
+
+
+class OrderImportError(models.Model):
+    """A row of an import file that could not be imported."""
+
+    order_import = models.ForeignKey(
+        OrderImport, related_name="errors", on_delete=models.CASCADE
+    )
+    # Line of the file the order starts on; null for errors about the whole file.
+    row = models.PositiveIntegerField(blank=True, null=True)
+    reference = models.CharField(max_length=255, blank=True, null=True)
+    error = models.TextField()
+
+    def __str__(self):
+        return f"Row {self.row}: {self.error}"
+
+
+class DailySales(models.Model):
+    """
+    Totals of the CONFIRMED sale orders created on a day, kept up to date
+    by telesales.analytics as orders are confirmed, cancelled or expired.
+
+    Products and customers are soft deleted, and deleting one must neither
+    drop its past sales nor let its soft-delete cascade reach the summaries,
+    which would keep restore() from bringing it back: the summaries are kept
+    out of the cascade, without a reverse accessor or a database constraint.
+    """
+
+    day = models.DateField()
+    quantity = models.BigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    # What the line discounts took off the revenue.
+    discount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(DailySales):
+    product = models.ForeignKey(
+        Product,
+        related_name="+",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "product"], name="unique_daily_product_sales"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["product", "day"], name="daily_product_sales_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} product {self.product_id}: {self.revenue}"
+
+
+class DailyCustomerSales(DailySales):
+    customer = models.ForeignKey(
+        Customer,
+        related_name="+",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "customer"], name="unique_daily_customer_sales"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["customer", "day"], name="daily_customer_sales_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} customer {self.customer_id}: {self.revenue}"
@@ -0,0 +1,26 @@
+import re
+
+from django.conf import settings
+
+
+def normalize_phone(value):
+    """
+    Canonical form of a phone number, used to index and look up customers.
+
+    Separators are dropped and international numbers ("+237 6 99...",
+    "00237699...") become "+" and their digits. National numbers get the
+    PHONE_COUNTRY_CODE prefix, without their trunk "0", when it is set and are
+    left as plain digits otherwise. A partial number normalizes to a prefix of
+    the complete one, e.g. "699 12" and "+23769912".
+    """
+    value = (value or "").strip()
+    digits = re.sub(r"\D", "", value)
+    if not digits:
+        return ""
+    if value.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    if settings.PHONE_COUNTRY_CODE:
+        return f"+{settings.PHONE_COUNTRY_CODE}{digits.removeprefix('0')}"
+    return digits
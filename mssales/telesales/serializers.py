@@ -1,16 +1,34 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.reverse import reverse
 
+from core.fieldsets import SparseFieldsMixin
 from products.serializers import ProductSerializer
-from .models import Product, Customer, SalesOrder, SalesOrderLine, Reservation
+from .analytics import ANALYTICS_GROUPS
+from .exports import EXPORT_FORMATS, EXPORT_RECORDS
+from .services import create_sales_order
+from .models import (
+    Product,
+    ConfirmationRequest,
+    Customer,
+    OrderImport,
+    SalesOrder,
+    SalesOrderLine,
+    Reservation,
+)
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = "__all__"
 
 
-class SalesOrderLineSerializer(serializers.ModelSerializer):
+class SalesOrderLineSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(
         queryset=Product.objects.all(), source="product", write_only=True
@@ -37,8 +55,27 @@ class SalesOrderLineSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "product", "unit_price", "sub_total"]
 
 
-class SalesOrderSerializer(serializers.ModelSerializer):
+class SalesOrderLineInputSerializer(serializers.Serializer):
+    """An order line as sent nested in a sale order creation."""
+
+    product_id = serializers.IntegerField(min_value=1)
+    qty = serializers.IntegerField(min_value=1)
+    discount_pct = serializers.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        min_value=0,
+        max_value=100,
+        default=Decimal(0),
+    )
+
+
+class SalesOrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     lines = SalesOrderLineSerializer(many=True, read_only=True)
+    order_total_incl_vat = serializers.DecimalField(
+        source="total_incl_vat", max_digits=12, decimal_places=2, read_only=True
+    )
+
+    sparse_requires = {"order_total_incl_vat": ("order_total", "vat_rate")}
     customer = CustomerSerializer(read_only=True)
     customer_id = serializers.PrimaryKeyRelatedField(
         queryset=Customer.objects.all(), source="customer", write_only=True
@@ -46,13 +83,44 @@ class SalesOrderSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         # Ensure order has at least one order line when creating
-        if self.context["request"].method == "POST":
-            if not self.context["request"].data.get("lines"):
+        if self.instance is None:
+            if not self.initial_data.get("lines"):
                 raise serializers.ValidationError(
                     "Order must have at least one order line."
                 )
+            data["lines"] = self.validate_lines(self.initial_data["lines"])
         return data
 
+    def validate_lines(self, lines):
+        """
+        Validate all the nested lines at once and attach their products,
+        fetched with a single query.
+        """
+        serializer = SalesOrderLineInputSerializer(data=lines, many=True)
+        if not serializer.is_valid():
+            raise serializers.ValidationError({"lines": serializer.errors})
+
+        lines = serializer.validated_data
+        products = Product.objects.in_bulk({line["product_id"] for line in lines})
+        errors = [
+            (
+                {}
+                if line["product_id"] in products
+                else {"product_id": [f"Invalid pk \"{line['product_id']}\"."]}
+            )
+            for line in lines
+        ]
+        if any(errors):
+            raise serializers.ValidationError({"lines": errors})
+
+        for line in lines:
+            line["product"] = products[line.pop("product_id")]
+        return lines
+
+    def create(self, validated_data):
+        lines = validated_data.pop("lines")
+        return create_sales_order(lines, **validated_data)
+
     class Meta:
         model = SalesOrder
         fields = [
@@ -63,13 +131,15 @@ class SalesOrderSerializer(serializers.ModelSerializer):
             "lines",
             "status",
             "notes",
+            "vat_rate",
             "order_total",
+            "order_total_incl_vat",
             "created_at",
         ]
         read_only_fields = ["id", "status", "number", "customer", "order_total"]
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Reservation
         fields = "__all__"
@@ -77,3 +147,150 @@ class ReservationSerializer(serializers.ModelSerializer):
 
 class ConfirmSaleOrderSerializer(serializers.Serializer):
     order_id = serializers.CharField()
+
+
+class ConfirmSaleOrdersBatchSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000
+    )
+
+
+class ConfirmationRequestSerializer(serializers.ModelSerializer):
+    order_number = serializers.CharField(source="order.number", read_only=True)
+    order_status = serializers.CharField(source="order.status", read_only=True)
+    status_url = serializers.SerializerMethodField()
+
+    def get_status_url(self, obj):
+        return reverse(
+            "sale_confirmations-detail",
+            kwargs={"pk": obj.pk},
+            request=self.context.get("request"),
+        )
+
+    class Meta:
+        model = ConfirmationRequest
+        fields = [
+            "id",
+            "order",
+            "order_number",
+            "order_status",
+            "status",
+            "error",
+            "status_url",
+            "created_at",
+            "processed_at",
+        ]
+
+
+class CancelSaleOrdersBatchSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=10000,
+    )
+
+
+class CustomerLookupSerializer(serializers.Serializer):
+    q = serializers.CharField(min_length=2, max_length=255)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.CUSTOMER_LOOKUP_MAX_RESULTS, required=False
+    )
+
+
+class CustomerLookupResultSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Customer
+        fields = [
+            "id",
+            "name",
+            "email",
+            "phone",
+            "billing_address",
+            "shipping_address",
+        ]
+
+
+class SaleOrderExportSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=EXPORT_FORMATS, default="csv")
+    records = serializers.ChoiceField(choices=EXPORT_RECORDS, default="lines")
+    compress = serializers.ChoiceField(choices=["gzip"], required=False)
+
+
+class SalesAnalyticsSerializer(serializers.Serializer):
+    # Without dates, the last 30 days up to today.
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=ANALYTICS_GROUPS, default="day")
+    product = serializers.IntegerField(required=False)
+    customer = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.localdate())
+        attrs.setdefault("start", attrs["end"] - timedelta(days=29))
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError({"start": "Must not be after end."})
+        # Products and customers are summarized separately.
+        if attrs.get("customer") is not None and (
+            attrs.get("product") is not None or attrs["group_by"] == "product"
+        ):
+            raise serializers.ValidationError(
+                {"customer": "Cannot be combined with a product."}
+            )
+        if attrs.get("product") is not None and attrs["group_by"] == "customer":
+            raise serializers.ValidationError(
+                {"product": "Cannot be combined with group_by=customer."}
+            )
+        return attrs
+
+
+class OrderImportUploadSerializer(serializers.Serializer):
+    EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(
+        choices=OrderImport.FORMAT_CHOICES, required=False
+    )
+
+    def validate(self, data):
+        if "file_format" not in data:
+            name = data["file"].name.lower()
+            for extension, file_format in self.EXTENSIONS.items():
+                if name.endswith(extension):
+                    data["file_format"] = file_format
+                    break
+            else:
+                raise serializers.ValidationError(
+                    {"file_format": "Cannot tell the format from the file name."}
+                )
+        return data
+
+
+class OrderImportSerializer(serializers.ModelSerializer):
+    orders_per_second = serializers.FloatField(read_only=True)
+    report_url = serializers.SerializerMethodField()
+
+    def get_report_url(self, obj):
+        return reverse(
+            "sale_order_imports-report",
+            kwargs={"pk": obj.pk},
+            request=self.context.get("request"),
+        )
+
+    class Meta:
+        model = OrderImport
+        fields = [
+            "id",
+            "file_name",
+            "file_format",
+            "status",
+            "orders_read",
+            "orders_created",
+            "lines_created",
+            "errors_count",
+            "duration",
+            "orders_per_second",
+            "report_url",
+            "created_at",
+            "finished_at",
+        ]
@@ -0,0 +1,552 @@
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import status
+
+from core.transactions import LockNotAvailable, for_update, run_atomic, skips_locked
+from products.cache import invalidate_products
+from products.models import Product, StockMovement
+from products.stock import (
+    InsufficientStock,
+    decrement_availables,
+    decrement_stripes,
+    lock_products,
+    release_availables,
+)
+from .analytics import add_orders, remove_orders
+from .models import ConfirmationRequest, SalesOrder, SalesOrderLine, Reservation
+
+RESERVATION_STRATEGIES = ("lock", "conditional")
+
+
+class ConfirmationError(Exception):
+    """A sale order cannot be confirmed; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
+
+
+def get_reservation_strategy(strategy=None):
+    """
+    Return the stock reservation strategy to use for confirmations.
+
+    - "lock" locks the product rows with SELECT ... FOR UPDATE, validates the
+      stock in Python and writes the new availables back.
+    - "conditional" takes no lock up front and decrements availables with a
+      guarded UPDATE that only succeeds while enough stock is left.
+    """
+    strategy = strategy or settings.RESERVATION_STRATEGY
+    if strategy not in RESERVATION_STRATEGIES:
+        raise ImproperlyConfigured(
+            f"Unknown reservation strategy {strategy!r}, expected one of {RESERVATION_STRATEGIES}"
+        )
+    return strategy
+
+
+def _unique(ids):
+    """Return ids without duplicates, keeping the caller's order."""
+    return list(dict.fromkeys(ids))
+
+
+def _quantities_by_product(lines):
+    """Sum the ordered quantity of each product over a list of order lines."""
+    quantities = defaultdict(int)
+    for line in lines:
+        quantities[line.product_id] += line.qty
+    return quantities
+
+
+def _negated(quantities):
+    return {pk: -qty for pk, qty in quantities.items()}
+
+
+def _only(quantities, product_ids):
+    return {pk: qty for pk, qty in quantities.items() if pk in product_ids}
+
+
+def _without(quantities, product_ids):
+    return {pk: qty for pk, qty in quantities.items() if pk not in product_ids}
+
+
+def _check_order(sale_order, order_lines):
+    """Validate that a sale order can go through confirmation."""
+    if sale_order.status != "DRAFT":
+        raise ConfirmationError(
+            f"Sale order {sale_order.pk} is not in DRAFT state, current status: {sale_order.status}"
+        )
+    if not order_lines:
+        raise ConfirmationError(f"Sale order {sale_order.pk} has no order lines")
+
+
+def _check_stock(products, quantities):
+    """Validate locked products against the quantities an order needs."""
+    for product_id, quantity in quantities.items():
+        stock = products.get(product_id)
+        if stock is None:
+            raise ConfirmationError(
+                f"Product {product_id} not found in stock",
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+        if stock.availables < quantity:
+            raise ConfirmationError(
+                str(InsufficientStock(product_id, stock.availables, quantity))
+            )
+
+
+def _decrement_stock(quantities, decrement=decrement_availables):
+    """Lock-free decrement of stock, translated into a ConfirmationError."""
+    try:
+        decrement(quantities)
+    except InsufficientStock as e:
+        if e.available is None:
+            raise ConfirmationError(
+                f"Product {e.product_id} not found in stock",
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+        raise ConfirmationError(str(e))
+
+
+def build_order_line(product_id, unit_price, qty, discount_pct=Decimal(0)):
+    """An unsaved SalesOrderLine with its sub total computed."""
+    return SalesOrderLine(
+        product_id=product_id,
+        qty=qty,
+        discount_pct=discount_pct,
+        unit_price=unit_price,
+        sub_total=qty * unit_price * (1 - discount_pct / 100),
+    )
+
+
+def create_sales_order(lines, **order_data):
+    """
+    Create a sale order with its lines in one transaction.
+
+    `lines` are dicts with the line's `product` instance, `qty` and
+    `discount_pct`. Prices, sub totals and the order total are computed in
+    memory, so the order is written once and the lines are inserted with a
+    single bulk_create: the number of queries does not depend on the number of
+    lines.
+    """
+    order_lines = [
+        build_order_line(
+            line["product"].pk,
+            line["product"].sales_price,
+            line["qty"],
+            line["discount_pct"],
+        )
+        for line in lines
+    ]
+
+    with transaction.atomic():
+        sale_order = SalesOrder.objects.create(
+            **order_data,
+            order_total=sum(order_line.sub_total for order_line in order_lines),
+        )
+        for order_line in order_lines:
+            order_line.order = sale_order
+        SalesOrderLine.objects.bulk_create(order_lines)
+    return sale_order
+
+
+def _reservations(sale_order, order_lines):
+    expires_at = (
+        timezone.now() + timedelta(seconds=settings.RESERVATION_TTL)
+        if settings.RESERVATION_TTL
+        else None
+    )
+    return [
+        Reservation(
+            order=sale_order,
+            product_id=line.product_id,
+            qty=line.qty,
+            expires_at=expires_at,
+        )
+        for line in order_lines
+    ]
+
+
+def confirm_sales_order(pk, strategy=None):
+    """
+    Confirm a single DRAFT sale order and reserve its stock.
+
+    The sale order row is locked, as the current transaction policy says (see
+    core.transactions), to prevent double confirmation. Stock is then
+    reserved with the configured strategy (see get_reservation_strategy) and
+    one Reservation is created per order line, and the order is counted in
+    the daily sales summaries (see telesales.analytics). Raises
+    SalesOrder.DoesNotExist or ConfirmationError; any error rolls back the
+    whole confirmation.
+    """
+    strategy = get_reservation_strategy(strategy)
+
+    with transaction.atomic():
+        sale_order = for_update(SalesOrder.objects).filter(pk=pk).first()
+        if sale_order is None:
+            if skips_locked() and SalesOrder.objects.filter(pk=pk).exists():
+                raise LockNotAvailable(f"Sale order {pk} is locked")
+            raise SalesOrder.DoesNotExist(f"Sale order {pk} not found")
+        order_lines = list(sale_order.lines.all())
+        _check_order(sale_order, order_lines)
+        quantities = _quantities_by_product(order_lines)
+
+        if strategy == "conditional":
+            _decrement_stock(quantities)
+        else:
+            products, striped = lock_products(quantities)
+            _check_stock(products, _without(quantities, striped))
+            now = timezone.now()
+            for product_id, product in products.items():
+                product.availables -= quantities[product_id]
+                product.updated_at = now
+            Product.objects.bulk_update(products.values(), ["availables", "updated_at"])
+            invalidate_products(products)
+            _decrement_stock(_only(quantities, striped), decrement_stripes)
+
+        Reservation.objects.bulk_create(_reservations(sale_order, order_lines))
+        StockMovement.record(
+            "RESERVATION", _negated(quantities), reference=sale_order.number
+        )
+
+        sale_order.status = "CONFIRMED"
+        sale_order.save()
+        add_orders([sale_order.pk])
+
+    return sale_order
+
+
+def confirm_sales_orders(order_ids, strategy=None):
+    """
+    Confirm many DRAFT sale orders in a single transaction.
+
+    All the sale orders are locked once, in primary key order. With the "lock"
+    strategy the products they reference are locked the same way, stock is
+    checked across the whole batch (an order is confirmed only if every one of
+    its products still has enough availables once the orders before it in the
+    batch have been served) and decrements are written with one bulk update.
+    With the "conditional" strategy each order decrements its products with
+    guarded updates inside its own savepoint. Striped products are never
+    locked as a whole: their stripes are decremented inside a savepoint of the
+    order. Reservations, and the RESERVATION movements of the stock ledger, are
+    written with one bulk insert each in all cases.
+
+    Returns a list with one result per requested order id, in request order.
+    A failing order does not prevent the other orders from being confirmed.
+    """
+    strategy = get_reservation_strategy(strategy)
+    order_ids = _unique(order_ids)
+    results = []
+
+    with transaction.atomic():
+        orders = {
+            order.pk: order
+            for order in for_update(SalesOrder.objects)
+            .filter(pk__in=order_ids)
+            .order_by("pk")
+        }
+        locked_ids = set()
+        if skips_locked() and len(orders) < len(order_ids):
+            locked_ids = set(
+                SalesOrder.objects.filter(pk__in=order_ids)
+                .exclude(pk__in=orders.keys())
+                .values_list("pk", flat=True)
+            )
+
+        lines_by_order = defaultdict(list)
+        for line in SalesOrderLine.objects.filter(order_id__in=orders.keys()):
+            lines_by_order[line.order_id].append(line)
+
+        products, striped = {}, set()
+        if strategy == "lock":
+            products, striped = lock_products(
+                {line.product_id for lines in lines_by_order.values() for line in lines}
+            )
+
+        reservations = []
+        movements = []
+        confirmed_ids = []
+        touched_product_ids = set()
+
+        for order_id in order_ids:
+            sale_order = orders.get(order_id)
+            order_lines = lines_by_order[order_id]
+            try:
+                if order_id in locked_ids:
+                    raise ConfirmationError(
+                        f"Sale order {order_id} is locked, please try again",
+                        status_code=status.HTTP_409_CONFLICT,
+                    )
+                if sale_order is None:
+                    raise ConfirmationError("Sale order not found")
+                _check_order(sale_order, order_lines)
+                quantities = _quantities_by_product(order_lines)
+
+                if strategy == "conditional":
+                    with transaction.atomic():
+                        _decrement_stock(quantities)
+                else:
+                    plain = _without(quantities, striped)
+                    _check_stock(products, plain)
+                    if striped.intersection(quantities):
+                        with transaction.atomic():
+                            _decrement_stock(
+                                _only(quantities, striped), decrement_stripes
+                            )
+                    for product_id, quantity in plain.items():
+                        products[product_id].availables -= quantity
+                        touched_product_ids.add(product_id)
+            except ConfirmationError as e:
+                results.append(
+                    {"order_id": order_id, "confirmed": False, "error": e.message}
+                )
+                continue
+
+            reservations.extend(_reservations(sale_order, order_lines))
+            movements.extend(
+                StockMovement.build(
+                    "RESERVATION", _negated(quantities), sale_order.number
+                )
+            )
+            confirmed_ids.append(order_id)
+            results.append(
+                {
+                    "order_id": order_id,
+                    "number": sale_order.number,
+                    "confirmed": True,
+                    "status": "CONFIRMED",
+                }
+            )
+
+        now = timezone.now()
+        updated_products = [products[pk] for pk in sorted(touched_product_ids)]
+        for product in updated_products:
+            product.updated_at = now
+        Product.objects.bulk_update(updated_products, ["availables", "updated_at"])
+        invalidate_products(touched_product_ids)
+        Reservation.objects.bulk_create(reservations)
+        StockMovement.objects.bulk_create(movements)
+        SalesOrder.objects.filter(pk__in=confirmed_ids).update(
+            status="CONFIRMED", updated_at=now
+        )
+        add_orders(confirmed_ids)
+
+    return results
+
+
+def enqueue_confirmation(pk):
+    """
+    Queue the confirmation of a DRAFT sale order for the confirmation workers.
+
+    A sale order has at most one pending request: queuing it again returns the
+    existing one. Raises SalesOrder.DoesNotExist or ConfirmationError.
+    """
+    sale_order = SalesOrder.objects.get(pk=pk)
+    if sale_order.status != "DRAFT":
+        raise ConfirmationError(
+            f"Sale order {pk} is not in DRAFT state, current status: {sale_order.status}"
+        )
+    confirmation, _ = ConfirmationRequest.objects.get_or_create(
+        order=sale_order, status="PENDING"
+    )
+    return confirmation
+
+
+def process_confirmation_requests(batch_size=100, strategy=None):
+    """
+    Confirm up to `batch_size` pending confirmation requests in one transaction.
+
+    Requests are claimed oldest first with SELECT ... FOR UPDATE SKIP LOCKED so
+    several workers can drain the queue side by side, then confirmed together
+    with confirm_sales_orders: the products of the whole batch are locked once
+    and the reservations are inserted in bulk. Returns the number of requests
+    processed, 0 when the queue is empty.
+    """
+    with transaction.atomic():
+        confirmations = list(
+            ConfirmationRequest.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING")
+            .order_by("id")[:batch_size]
+        )
+        if not confirmations:
+            return 0
+
+        results = {
+            result["order_id"]: result
+            for result in confirm_sales_orders(
+                [confirmation.order_id for confirmation in confirmations], strategy
+            )
+        }
+
+        now = timezone.now()
+        for confirmation in confirmations:
+            result = results[confirmation.order_id]
+            confirmation.status = "CONFIRMED" if result["confirmed"] else "REJECTED"
+            confirmation.error = result.get("error")
+            confirmation.processed_at = now
+            confirmation.updated_at = now
+        ConfirmationRequest.objects.bulk_update(
+            confirmations, ["status", "error", "processed_at", "updated_at"]
+        )
+    return len(confirmations)
+
+
+CANCELLABLE_STATUSES = ("DRAFT", "CONFIRMED")
+
+
+def release_reservations(order_ids):
+    """
+    Give the stock reserved by `order_ids` back and soft-delete their
+    reservations.
+
+    Reservations are summed per product in the database, the totals are
+    credited back with set-based updates (see release_availables), a RELEASE
+    per order and product is appended to the stock ledger and the
+    reservations are soft-deleted with a single UPDATE sharing one
+    transaction_id. Returns {product_id: released quantity}.
+    """
+    reservations = Reservation.objects.filter(order_id__in=order_ids)
+    quantities = defaultdict(int)
+    movements = []
+    for number, product_id, quantity in (
+        reservations.order_by()
+        .values("order__number", "product_id")
+        .annotate(quantity=Sum("qty"))
+        .values_list("order__number", "product_id", "quantity")
+    ):
+        quantities[product_id] += quantity
+        movements.extend(StockMovement.build("RELEASE", {product_id: quantity}, number))
+    release_availables(quantities)
+    StockMovement.objects.bulk_create(movements)
+    reservations.update(
+        deleted_at=timezone.now(), restored_at=None, transaction_id=uuid.uuid4()
+    )
+    return dict(quantities)
+
+
+def _cancel_chunk(order_ids):
+    orders = {
+        order.pk: order
+        for order in for_update(SalesOrder.objects)
+        .filter(pk__in=order_ids)
+        .order_by("pk")
+    }
+
+    results = []
+    cancelled_ids = []
+    for order_id in order_ids:
+        sale_order = orders.get(order_id)
+        if sale_order is None:
+            error = "Sale order not found"
+        elif sale_order.status not in CANCELLABLE_STATUSES:
+            error = f"Sale order {order_id} cannot be cancelled, current status: {sale_order.status}"
+        else:
+            cancelled_ids.append(order_id)
+            results.append(
+                {
+                    "order_id": order_id,
+                    "number": sale_order.number,
+                    "cancelled": True,
+                    "status": "CANCELLED",
+                }
+            )
+            continue
+        results.append({"order_id": order_id, "cancelled": False, "error": error})
+
+    confirmed_ids = [pk for pk in cancelled_ids if orders[pk].status == "CONFIRMED"]
+    release_reservations(confirmed_ids)
+    remove_orders(confirmed_ids)
+    SalesOrder.objects.filter(pk__in=cancelled_ids).update(
+        status="CANCELLED", updated_at=timezone.now()
+    )
+    return results
+
+
+def cancel_sales_orders(order_ids, chunk_size=500):
+    """
+    Cancel DRAFT and CONFIRMED sale orders, giving confirmed orders' stock back.
+
+    Orders are processed in chunks, each in its own transaction governed by the
+    "cancel" transaction policy: the chunk's orders are locked, their
+    reservations are released in bulk (see release_reservations), confirmed
+    orders are taken out of the daily sales summaries and their status is set
+    with one UPDATE. Returns a list with one result per
+    requested order id, in request order.
+    """
+    order_ids = _unique(order_ids)
+    results = []
+    for start in range(0, len(order_ids), chunk_size):
+        results.extend(
+            run_atomic("cancel", _cancel_chunk, order_ids[start : start + chunk_size])
+        )
+    return results
+
+
+def _sweep_chunk(chunk_size):
+    now = timezone.now()
+    claimed = list(
+        Reservation.objects.select_for_update(skip_locked=True)
+        .filter(expires_at__lte=now)
+        .order_by("expires_at", "pk")
+        .values_list("pk", "order_id", "product_id", "qty")[:chunk_size]
+    )
+    # An order being cancelled or swept elsewhere is locked; its reservations
+    # are left for a later run.
+    orders = {
+        pk: (status, number)
+        for pk, status, number in SalesOrder.objects.select_for_update(skip_locked=True)
+        .filter(pk__in={order_id for _, order_id, _, _ in claimed})
+        .order_by("pk")
+        .values_list("pk", "status", "number")
+    }
+    claimed = [row for row in claimed if row[1] in orders]
+
+    quantities = defaultdict(int)
+    movements = []
+    for _, order_id, product_id, qty in claimed:
+        quantities[product_id] += qty
+        movements.extend(
+            StockMovement.build("RELEASE", {product_id: qty}, orders[order_id][1])
+        )
+    release_availables(quantities)
+    StockMovement.objects.bulk_create(movements)
+    Reservation.objects.filter(pk__in=[pk for pk, _, _, _ in claimed]).update(
+        deleted_at=now, restored_at=None, transaction_id=uuid.uuid4()
+    )
+    expired_ids = {
+        order_id for _, order_id, _, _ in claimed if orders[order_id][0] == "CONFIRMED"
+    }
+    remove_orders(expired_ids)
+    expired = SalesOrder.objects.filter(pk__in=expired_ids).update(
+        status="EXPIRED", updated_at=now
+    )
+
+    return {
+        "reservations": len(claimed),
+        "orders": expired,
+        "quantity": sum(quantities.values()),
+        "products": dict(quantities),
+    }
+
+
+def sweep_expired_reservations(chunk_size=500):
+    """
+    Release up to `chunk_size` reservations whose expiry has passed.
+
+    Expired reservations and their orders are claimed with FOR UPDATE SKIP
+    LOCKED, so concurrent sweepers (and cancellations) never wait on each
+    other: each takes rows nobody else holds. The claimed quantities are
+    credited back with one set-based update (see release_availables), the
+    reservations are soft-deleted and their CONFIRMED orders are marked
+    EXPIRED, all in one transaction governed by the "reservation_sweep"
+    policy. Returns a summary of what was reclaimed: the number of
+    reservations and orders, the total quantity and the quantity per product.
+    """
+    return run_atomic("reservation_sweep", _sweep_chunk, chunk_size)
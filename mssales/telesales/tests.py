@@ -1,3 +1,1092 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+from core.tests import AuthenticatedAPITestCase
+from products.models import Product, ProductStockStripe
+from products.stock import rebalance_stripes
+from products.tests import make_product
+from .imports import import_orders
+from .models import (
+    Customer,
+    DailyCustomerSales,
+    DailyProductSales,
+    OrderImport,
+    Reservation,
+    SalesOrder,
+    SalesOrderLine,
+)
+from .phones import normalize_phone
+from .serializers import SalesOrderSerializer
+from .services import (
+    cancel_sales_orders,
+    confirm_sales_order,
+    confirm_sales_orders,
+    sweep_expired_reservations,
+)
+
+
+def make_customer(email="customer@example.com", **fields):
+    return Customer.objects.create(
+        name="Customer", email=email, phone="+33 6 12 34 56 78", **fields
+    )
+
+
+def make_order(customer, *lines):
+    """A DRAFT sale order with a line per (product, qty) of `lines`."""
+    sale_order = SalesOrder.objects.create(customer=customer)
+    for product, qty in lines:
+        SalesOrderLine.objects.create(
+            order=sale_order, product=product, qty=qty, discount_pct=Decimal(0)
+        )
+    return sale_order
+
+
+def make_orders(count, lines):
+    """`count` sale orders of `lines` lines each, with their reservations."""
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer-{i}@example.com")
+        for i in range(count)
+    )
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Product {i}",
+            sales_price=Decimal("1.00"),
+            cost=Decimal("1.00"),
+            quantity_on_hand=100,
+            availables=100,
+        )
+        for i in range(lines)
+    )
+    sale_orders = SalesOrder.objects.bulk_create(
+        SalesOrder(number=SalesOrder.generate_number(), customer=customer)
+        for customer in customers
+    )
+    SalesOrderLine.objects.bulk_create(
+        SalesOrderLine(
+            order=sale_order,
+            product=product,
+            qty=1,
+            unit_price=product.sales_price,
+            sub_total=product.sales_price,
+        )
+        for sale_order in sale_orders
+        for product in products
+    )
+    Reservation.objects.bulk_create(
+        Reservation(order=sale_order, product=product, qty=1)
+        for sale_order in sale_orders
+        for product in products
+    )
+    return sale_orders
+
+
+class ConfirmSalesOrderTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = make_customer()
+        cls.a = make_product("A", quantity=10)
+        cls.b = make_product("B", quantity=5)
+
+    def confirm(self, sale_order):
+        return self.client.post(f"/api/sales/orders/{sale_order.pk}/confirm/")
+
+    def assert_availables(self, a, b):
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.availables, self.b.availables), (a, b))
+
+    def test_confirm(self):
+        sale_order = make_order(self.customer, (self.a, 2), (self.b, 1))
+
+        response = self.confirm(sale_order)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "CONFIRMED")
+        self.assert_availables(8, 4)
+        self.assertEqual(Reservation.objects.filter(order=sale_order).count(), 2)
+
+        response = self.confirm(sale_order)
+
+        self.assertEqual(response.status_code, 400)
+        self.assert_availables(8, 4)
+
+    def test_insufficient_stock_reserves_nothing(self):
+        sale_order = make_order(self.customer, (self.a, 1), (self.b, 3), (self.b, 3))
+
+        response = self.confirm(sale_order)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Insufficient stock", response.json()["error"])
+        self.assert_availables(10, 5)
+        sale_order.refresh_from_db()
+        self.assertEqual(sale_order.status, "DRAFT")
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_unknown_order(self):
+        response = self.client.post("/api/sales/orders/99999/confirm/")
+
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch("core.transactions.time.sleep")
+    def test_lock_conflicts_answer_409(self, sleep):
+        sale_order = make_order(self.customer, (self.a, 1))
+
+        with mock.patch(
+            "telesales.views.confirm_sales_order",
+            side_effect=OperationalError("database is locked"),
+        ), self.assertLogs("core.transactions", "WARNING"):
+            response = self.confirm(sale_order)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(sleep.call_count, 4)
+
+    def test_batch_confirmation(self):
+        first = make_order(self.customer, (self.a, 4), (self.b, 2))
+        short = make_order(self.customer, (self.b, 4))
+        last = make_order(self.customer, (self.a, 6))
+
+        response = self.client.post(
+            "/api/sales/orders/confirm-batch/",
+            {"order_ids": [first.pk, short.pk, last.pk, 99999]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual((data["confirmed"], data["failed"]), (2, 2))
+        self.assertEqual(
+            [result["confirmed"] for result in data["results"]],
+            [True, False, True, False],
+        )
+        self.assert_availables(0, 3)
+        self.assertEqual(
+            dict(SalesOrder.objects.values_list("pk", "status")),
+            {first.pk: "CONFIRMED", short.pk: "DRAFT", last.pk: "CONFIRMED"},
+        )
+        self.assertEqual(Reservation.objects.count(), 3)
+
+
+class CancelSalesOrderTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = make_customer()
+        cls.a = make_product("A", quantity=10)
+        cls.b = make_product("B", quantity=10)
+
+    def confirmed_order(self, *lines):
+        sale_order = make_order(self.customer, *lines)
+        confirm_sales_order(sale_order.pk)
+        return sale_order
+
+    def cancel(self, sale_order):
+        return self.client.post(f"/api/sales/orders/{sale_order.pk}/cancel/")
+
+    def test_cancel_releases_the_reservations(self):
+        sale_order = self.confirmed_order((self.a, 3), (self.b, 2))
+
+        response = self.cancel(sale_order)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "CANCELLED")
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.availables, self.b.availables), (10, 10))
+        self.assertFalse(Reservation.objects.exists())
+        self.assertEqual(Reservation.deleted_objects.count(), 2)
+
+        self.assertEqual(self.cancel(sale_order).status_code, 400)
+        self.assertEqual(
+            self.client.post("/api/sales/orders/99999/cancel/").status_code, 404
+        )
+
+    def test_batch_cancellation(self):
+        draft = make_order(self.customer, (self.a, 1))
+        confirmed = self.confirmed_order((self.a, 2))
+        cancelled = self.confirmed_order((self.a, 3))
+        cancel_sales_orders([cancelled.pk])
+
+        response = self.client.post(
+            "/api/sales/orders/cancel-batch/",
+            {"order_ids": [draft.pk, confirmed.pk, cancelled.pk, 99999]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual((data["cancelled"], data["failed"]), (2, 2))
+        self.assertEqual(
+            [result["cancelled"] for result in data["results"]],
+            [True, True, False, False],
+        )
+        self.assertEqual(
+            set(SalesOrder.objects.values_list("status", flat=True)), {"CANCELLED"}
+        )
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.availables, 10)
+
+
+class ReservationSweepTests(TestCase):
+    def test_expired_reservations_are_released(self):
+        customer = make_customer()
+        a = make_product("A", quantity=10)
+        b = make_product("B", quantity=10)
+        with override_settings(RESERVATION_TTL=-1):
+            expired = [
+                make_order(customer, (a, 3), (b, 2)),
+                make_order(customer, (a, 1)),
+            ]
+            for sale_order in expired:
+                confirm_sales_order(sale_order.pk)
+        current = make_order(customer, (a, 4))
+        confirm_sales_order(current.pk)
+
+        call_command(
+            "sweep_reservations", "--once", "--chunk-size", "2", stdout=io.StringIO()
+        )
+
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.availables, b.availables), (6, 10))
+        self.assertEqual(
+            list(SalesOrder.objects.order_by("pk").values_list("status", flat=True)),
+            ["EXPIRED", "EXPIRED", "CONFIRMED"],
+        )
+        self.assertEqual(
+            list(Reservation.objects.values_list("order", flat=True)), [current.pk]
+        )
+
+
+@override_settings(RESERVATION_STRATEGY="conditional")
+class ConditionalConfirmSalesOrderTests(ConfirmSalesOrderTests):
+    """The same confirmations with the lock-free conditional decrement."""
+
+
+class StripedStockTests(AuthenticatedAPITestCase):
+    """Confirmations of a product whose stock is spread over 4 stripes of 10."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = make_customer()
+        cls.product = make_product("Hot product", quantity=40, stock_stripes=4)
+
+    def stripes(self):
+        return list(
+            ProductStockStripe.objects.filter(product=self.product)
+            .order_by("stripe")
+            .values_list("availables", flat=True)
+        )
+
+    def confirm(self, qty):
+        sale_order = make_order(self.customer, (self.product, qty))
+        response = self.client.post(f"/api/sales/orders/{sale_order.pk}/confirm/")
+        sale_order.refresh_from_db()
+        return response, sale_order
+
+    def test_confirmation_takes_from_a_single_stripe(self):
+        response, sale_order = self.confirm(3)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(self.stripes()), [7, 10, 10, 10])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.availables, 0)
+        self.assertEqual(Reservation.objects.get(order=sale_order).qty, 3)
+
+    def test_quantity_above_every_stripe_rebalances_first(self):
+        response, _ = self.confirm(15)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stripes(), [7, 6, 6, 6])
+
+    def test_quantity_above_the_stock_fails(self):
+        response, sale_order = self.confirm(41)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Insufficient stock", response.json()["error"])
+        self.assertEqual(sale_order.status, "DRAFT")
+        self.assertEqual(self.stripes(), [10, 10, 10, 10])
+
+    def test_emptied_stripe_is_refilled_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response, _ = self.confirm(10)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stripes(), [8, 8, 7, 7])
+
+    def test_batch_confirmation(self):
+        orders = [make_order(self.customer, (self.product, qty)) for qty in (4, 9, 50)]
+
+        response = self.client.post(
+            "/api/sales/orders/confirm-batch/",
+            {"order_ids": [sale_order.pk for sale_order in orders]},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result["confirmed"] for result in response.json()["data"]["results"]],
+            [True, True, False],
+        )
+        self.assertEqual(sum(self.stripes()), 27)
+
+    def test_cancel_returns_the_stock_to_the_stripes(self):
+        _, sale_order = self.confirm(3)
+
+        response = self.client.post(f"/api/sales/orders/{sale_order.pk}/cancel/")
+
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.availables, 3)
+        self.assertEqual(self.product.total_availables, 40)
+        rebalance_stripes(self.product.pk)
+        self.assertEqual(self.stripes(), [10, 10, 10, 10])
+
+
+@override_settings(RESERVATION_STRATEGY="conditional")
+class ConditionalStripedStockTests(StripedStockTests):
+    """The same confirmations with the lock-free conditional decrement."""
+
+
+@override_settings(CONFIRMATION_MODE="queued")
+class QueuedConfirmationTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = make_customer()
+        cls.product = make_product(quantity=5)
+
+    def confirm(self, sale_order):
+        return self.client.post(f"/api/sales/orders/{sale_order.pk}/confirm/")
+
+    def test_confirmations_are_queued_and_processed_in_order(self):
+        first = make_order(self.customer, (self.product, 3))
+        second = make_order(self.customer, (self.product, 3))
+
+        response = self.confirm(first)
+
+        self.assertEqual(response.status_code, 202)
+        request = response.json()
+        self.assertEqual(request["status"], "PENDING")
+        self.assertEqual(response["Location"], request["status_url"])
+        self.assertEqual(self.confirm(first).json()["id"], request["id"])
+        rejected = self.confirm(second).json()
+
+        call_command("process_confirmations", "--once", stdout=io.StringIO())
+
+        data = self.client.get(request["status_url"]).json()["data"]
+        self.assertEqual((data["status"], data["order_status"]), ("CONFIRMED",) * 2)
+        data = self.client.get(rejected["status_url"]).json()["data"]
+        self.assertEqual((data["status"], data["order_status"]), ("REJECTED", "DRAFT"))
+        self.assertIn("Insufficient stock", data["error"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.availables, 2)
+        self.assertEqual(self.confirm(first).status_code, 400)
+
+
+class IdempotencyTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = make_customer()
+        cls.product = make_product(quantity=5)
+
+    def create(self, **fields):
+        data = {
+            "customer_id": self.customer.pk,
+            "lines": [{"product_id": self.product.pk, "qty": 2}],
+            **fields,
+        }
+        return self.client.post(
+            "/api/sales/orders/", data, format="json", HTTP_IDEMPOTENCY_KEY="abc"
+        )
+
+    def test_create_is_replayed(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+
+        replay = self.create()
+
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(SalesOrder.objects.count(), 1)
+
+    def test_key_reused_for_another_request(self):
+        self.create()
+
+        response = self.create(notes="Another request")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(SalesOrder.objects.count(), 1)
+
+    def test_confirm_is_replayed(self):
+        sale_order = make_order(self.customer, (self.product, 2))
+        url = f"/api/sales/orders/{sale_order.pk}/confirm/"
+        self.assertEqual(
+            self.client.post(url, HTTP_IDEMPOTENCY_KEY="abc").status_code, 200
+        )
+
+        replay = self.client.post(url, HTTP_IDEMPOTENCY_KEY="abc")
+
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.availables, 3)
+
+    def test_expired_keys_are_purged(self):
+        self.create()
+        IdempotencyKey.objects.update(expires_at="2000-01-01T00:00Z")
+
+        call_command("purge_idempotency_keys", stdout=io.StringIO())
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class OrderTotalTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.a = make_product("A")
+        cls.b = make_product("B")
+        cls.b.sales_price = Decimal("5.00")
+        cls.b.save()
+
+    def setUp(self):
+        super().setUp()
+        response = self.client.post(
+            "/api/sales/orders/",
+            {
+                "customer_id": make_customer().pk,
+                "vat_rate": "20",
+                "lines": [{"product_id": self.a.pk, "qty": 2}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        data = response.json()["data"]
+        self.assertEqual(data["order_total_incl_vat"], "24.00")
+        self.sale_order = SalesOrder.objects.get(pk=data["id"])
+
+    def assert_total(self, total):
+        self.sale_order.refresh_from_db()
+        self.assertEqual(self.sale_order.order_total, Decimal(total))
+
+    def test_total_follows_line_changes(self):
+        response = self.client.post(
+            "/api/sales/orders/lines/",
+            {
+                "order_id": self.sale_order.pk,
+                "product_id": self.b.pk,
+                "qty": 3,
+                "discount_pct": "10",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assert_total("33.50")
+        url = f"/api/sales/orders/lines/{response.json()['id']}/"
+
+        self.client.patch(url, {"qty": 1}, format="json")
+        self.assert_total("24.50")
+
+        self.client.delete(url)
+        self.assert_total("20.00")
+
+        line = SalesOrderLine.deleted_objects.get()
+        line.restore()
+        self.assert_total("24.50")
+
+        line.hard_delete()
+        self.assert_total("20.00")
+
+    def test_recompute_fixes_drifted_totals(self):
+        SalesOrder.objects.filter(pk=self.sale_order.pk).update(order_total=999)
+
+        call_command("recompute_order_totals", "--dry-run", stdout=io.StringIO())
+        self.assert_total("999")
+        call_command(
+            "recompute_order_totals", "--chunk-size", "1", stdout=io.StringIO()
+        )
+        self.assert_total("20.00")
+
+
+class SalesOrderCreateQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        # SQLite splits bulk inserts of more than about 70 lines into several
+        # queries.
+        cls.products = [make_product(f"Product {i}") for i in range(50)]
+
+    def test_query_count_does_not_depend_on_the_number_of_lines(self):
+        for line_count in (1, 10, 50):
+            data = {
+                "customer_id": self.customer.pk,
+                "lines": [
+                    {"product_id": product.pk, "qty": 1}
+                    for product in self.products[:line_count]
+                ],
+            }
+            with self.subTest(lines=line_count), self.assertNumQueries(6):
+                serializer = SalesOrderSerializer(data=data)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+
+class ImportOrdersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.product = make_product()
+
+    def import_ndjson(self, *records):
+        stream = io.StringIO("".join(json.dumps(record) + "\n" for record in records))
+        return import_orders(stream, "ndjson")
+
+    def order(self, line=None, **fields):
+        return {
+            "customer_email": self.customer.email,
+            "lines": [{"product_id": self.product.pk, "qty": 1, **(line or {})}],
+            **fields,
+        }
+
+    def test_out_of_range_values_are_row_errors(self):
+        invalid = [
+            self.order({"discount_pct": "NaN"}),
+            self.order({"discount_pct": "Infinity"}),
+            self.order(vat_rate=123456),
+            self.order({"qty": 1e9}),
+            self.order({"qty": 2**40}),
+            self.order({"qty": 1.5}),
+        ]
+
+        order_import = self.import_ndjson(self.order(), *invalid)
+
+        self.assertEqual(order_import.status, "COMPLETED")
+        self.assertEqual(order_import.orders_created, 1)
+        self.assertEqual(order_import.errors_count, len(invalid))
+        self.assertEqual(
+            list(order_import.errors.order_by("row").values_list("row", flat=True)),
+            list(range(2, len(invalid) + 2)),
+        )
+        self.assertEqual(SalesOrder.objects.count(), 1)
+
+    def test_unexpected_errors_fail_the_import(self):
+        with mock.patch(
+            "telesales.imports._import_chunk", side_effect=RuntimeError("boom")
+        ):
+            with self.assertRaises(RuntimeError):
+                self.import_ndjson(self.order())
+
+        order_import = OrderImport.objects.get()
+        self.assertEqual(order_import.status, "FAILED")
+        self.assertIsNotNone(order_import.finished_at)
+        self.assertEqual(order_import.errors.get().error, "boom")
+
+
+class ListQueryBudgetTests(AuthenticatedAPITestCase):
+    """The list endpoints run a fixed number of queries per page."""
+
+    budgets = {
+        # The ETag/Last-Modified aggregate, count, page, lines, products.
+        "/api/sales/orders/": 5,
+        "/api/sales/orders/lines/": 3,
+        "/api/sales/reservations/": 2,
+    }
+
+    def assert_within_budgets(self):
+        for url, budget in self.budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_one_small_order(self):
+        make_orders(1, 1)
+        self.assert_within_budgets()
+
+    def test_pages_of_orders_with_many_lines(self):
+        make_orders(12, 10)
+        self.assert_within_budgets()
+
+
+class SalesOrderConditionalGetTests(AuthenticatedAPITestCase):
+    url = "/api/sales/orders/"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        [cls.order] = make_orders(1, 2)
+
+    def etag(self, url=None):
+        response = self.client.get(url or self.url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_unchanged_list_answers_304_without_reading_the_lines(self):
+        etag = self.etag()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("telesales_salesorderline", queries[0]["sql"])
+
+    def test_changing_a_line_changes_the_etag(self):
+        etag = self.etag()
+        line = self.order.lines.first()
+        line.discount_pct = Decimal(0)
+        line.save()
+
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_removing_a_line_changes_the_etag(self):
+        etag = self.etag()
+        self.order.lines.first().delete()
+
+        self.assertNotEqual(self.etag(), etag)
+
+    def test_changing_the_customer_changes_the_etags(self):
+        detail_url = f"{self.url}{self.order.pk}/"
+        etags = (self.etag(), self.etag(detail_url))
+        updated_at = SalesOrder.objects.get(pk=self.order.pk).updated_at
+        customer = self.order.customer
+        customer.name = "Renamed"
+        customer.save()
+
+        self.assertNotEqual(self.etag(), etags[0])
+        self.assertNotEqual(self.etag(detail_url), etags[1])
+        # The customer's orders are not rewritten.
+        self.assertEqual(
+            SalesOrder.objects.get(pk=self.order.pk).updated_at, updated_at
+        )
+
+
+class SparseFieldsetTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.customer = make_customer()
+        cls.product = make_product("Product", quantity=5)
+        cls.order = make_order(cls.customer, (cls.product, 2))
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_fields(self):
+        [order] = self.get("/api/sales/orders/", fields="id,number,customer,lines")[
+            "results"
+        ]
+
+        self.assertEqual(
+            order,
+            {
+                "id": self.order.pk,
+                "number": self.order.number,
+                "customer": self.customer.pk,
+                "lines": [self.order.lines.get().pk],
+            },
+        )
+
+    def test_nested_fields(self):
+        [order] = self.get(
+            "/api/sales/orders/",
+            fields="id,lines.qty,lines.product.name,lines.product.availables",
+        )["results"]
+
+        self.assertEqual(
+            order,
+            {
+                "id": self.order.pk,
+                "lines": [{"qty": 2, "product": {"name": "Product", "availables": 5}}],
+            },
+        )
+
+    def test_expand(self):
+        [order] = self.get("/api/sales/orders/", expand="customer")["results"]
+        self.assertEqual(order["customer"]["email"], self.customer.email)
+
+        data = self.get(
+            f"/api/sales/orders/{self.order.pk}/", fields="number,customer.email"
+        )["data"]
+        self.assertEqual(
+            data,
+            {"number": self.order.number, "customer": {"email": self.customer.email}},
+        )
+
+        [line] = self.get(
+            "/api/sales/orders/lines/", expand="product", fields="id,product.name"
+        )["results"]
+        self.assertEqual(line["product"], {"name": "Product"})
+
+    def test_unselected_columns_are_not_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get("/api/sales/orders/", fields="id,number")
+
+        page = next(
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('SELECT "telesales_salesorder"."id"')
+        )
+        self.assertNotIn("order_total", page)
+
+
+class ExportTests(AuthenticatedAPITestCase):
+    url = "/api/sales/orders/export/"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        alpha = make_product("Alpha", quantity=50)
+        beta = make_product("Beta", quantity=50)
+        cls.first = make_order(make_customer("a@example.com"), (alpha, 2), (beta, 3))
+        customer = make_customer("b@example.com")
+        cls.confirmed = make_order(customer, (alpha, 1))
+        cls.empty = make_order(customer)
+        Reservation.objects.create(order=cls.first, product=alpha, qty=2)
+        SalesOrder.objects.filter(pk=cls.confirmed.pk).update(status="CONFIRMED")
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=2)
+    def test_csv_has_a_row_per_line(self):
+        response, content = self.export()
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(
+            [(row["order_id"], row["product_name"]) for row in rows],
+            [
+                (str(self.first.pk), "Alpha"),
+                (str(self.first.pk), "Beta"),
+                (str(self.confirmed.pk), "Alpha"),
+                (str(self.empty.pk), ""),
+            ],
+        )
+
+    def test_reservations(self):
+        _, content = self.export(records="reservations")
+
+        [row] = csv.DictReader(io.StringIO(content.decode()))
+        self.assertEqual(row["reservation_qty"], "2")
+
+    def test_filtered_ndjson(self):
+        response, content = self.export(output="ndjson", status="CONFIRMED")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        [document] = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(document["id"], self.confirmed.pk)
+        self.assertEqual(document["customer"]["email"], "b@example.com")
+        self.assertEqual(document["lines"][0]["product_name"], "Alpha")
+
+    def test_gzip(self):
+        response, content = self.export(output="ndjson", compress="gzip")
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith('.ndjson.gz"'))
+        self.assertEqual(len(gzip.decompress(content).splitlines()), 3)
+
+    def test_invalid_parameters(self):
+        for params in ({"output": "xml"}, {"created_at__gte": "nope"}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.csv.gz")
+            call_command(
+                "export_orders",
+                path,
+                "--gzip",
+                "--status",
+                "DRAFT",
+                "--chunk-size",
+                "1",
+                stdout=io.StringIO(),
+            )
+            with gzip.open(path, "rt") as export:
+                rows = list(csv.DictReader(export))
+
+        self.assertEqual(
+            [row["order_id"] for row in rows],
+            [str(self.first.pk), str(self.first.pk), str(self.empty.pk)],
+        )
+
+
+class FastSalesOrderListTests(AuthenticatedAPITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for sale_order in make_orders(25, 3):
+            sale_order.vat_rate = Decimal("19.25")
+            sale_order.order_total = Decimal("3.00")
+            sale_order.save()
+
+    def test_fast_path_renders_the_same_json(self):
+        for params in ({}, {"page": 2}, {"pagination": "cursor"}):
+            with self.subTest(**params):
+                pages = []
+                for fast in (False, True):
+                    with override_settings(FAST_LIST_SERIALIZATION=fast):
+                        response = self.client.get("/api/sales/orders/", params)
+                    self.assertEqual(response.status_code, 200)
+                    pages.append(response.content)
+                self.assertEqual(pages[0], pages[1])
+
+    def test_lines_are_fetched_in_order(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast), override_settings(
+                FAST_LIST_SERIALIZATION=fast
+            ), CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/sales/orders/")
+            self.assertEqual(response.status_code, 200)
+            lines = [
+                query["sql"]
+                for query in queries
+                if 'FROM "telesales_salesorderline"' in query["sql"]
+            ]
+            self.assertEqual(len(lines), 1)
+            self.assertIn('ORDER BY "telesales_salesorderline"."id"', lines[0])
+
+
+class NormalizePhoneTests(TestCase):
+    @override_settings(PHONE_COUNTRY_CODE="237")
+    def test_national_and_international_forms(self):
+        for phone in ("699 12-34-56", "+237 699 12 34 56", "00237699123456"):
+            with self.subTest(phone=phone):
+                self.assertEqual(normalize_phone(phone), "+237699123456")
+        self.assertEqual(normalize_phone("0699"), "+237699")
+
+    def test_without_country_code(self):
+        self.assertEqual(normalize_phone("(699) 12"), "69912")
+
+
+class CustomerLookupTests(AuthenticatedAPITestCase):
+    url = "/api/sales/customers/lookup/"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.jane = Customer.objects.create(
+            name="Jane Doe", email="Jane@Example.com", phone="+237 699 12 34 56"
+        )
+        cls.john = Customer.objects.create(
+            name="john smith", email="js@x.io", phone="699-123-999"
+        )
+        for i in range(30):
+            Customer.objects.create(
+                name=f"Jack {i}", email=f"jack{i}@y.io", phone=f"+1 555 000 {i:04d}"
+            )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def lookup(self, q, **params):
+        response = self.client.get(self.url, {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]
+
+    def ids(self, q, **params):
+        return [customer["id"] for customer in self.lookup(q, **params)["results"]]
+
+    def test_phone_prefix(self):
+        self.assertEqual(self.ids("+237 6991"), [self.jane.pk])
+
+    def test_email_and_name_prefixes(self):
+        self.assertEqual(self.ids("jane@ex"), [self.jane.pk])
+        self.assertEqual(self.ids("JO"), [self.john.pk])
+
+    def test_results_are_limited(self):
+        data = self.lookup("jack", limit=5)
+        self.assertEqual(len(data["results"]), 5)
+        self.assertTrue(data["truncated"])
+        jacks = sorted(
+            Customer.objects.filter(name__startswith="Jack"),
+            key=lambda customer: (customer.name.upper(), customer.pk),
+        )
+        self.assertEqual(
+            [customer["id"] for customer in data["results"]],
+            [customer.pk for customer in jacks[:5]],
+        )
+        self.assertEqual(
+            self.ids("JACK1", limit=3), [customer.pk for customer in jacks[1:4]]
+        )
+
+        data = self.lookup("+1 555")
+        self.assertEqual(len(data["results"]), 20)
+        self.assertTrue(data["truncated"])
+
+    def test_invalid_queries(self):
+        for params in ({"q": "j"}, {"q": "jack", "limit": 500}):
+            with self.subTest(**params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_repeated_lookup_is_served_from_the_cache(self):
+        self.lookup("+237 6991")
+
+        with self.assertNumQueries(0):
+            data = self.lookup("+237 6991")
+
+        self.assertEqual(data["results"][0]["id"], self.jane.pk)
+
+
+class SalesAnalyticsTests(AuthenticatedAPITestCase):
+    url = "/api/sales/analytics/"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.alpha = make_product("Alpha", quantity=100)
+        cls.beta = make_product("Beta", quantity=100)
+        cls.beta.sales_price = Decimal("20.00")
+        cls.beta.save()
+        cls.a = make_customer("a@example.com")
+        cls.b = make_customer("b@example.com")
+        cls.first = make_order(cls.a, (cls.alpha, 2), (cls.beta, 1))
+        line = cls.first.lines.get(product=cls.beta)
+        line.discount_pct = Decimal("10")
+        line.save()
+        cls.second = make_order(cls.b, (cls.alpha, 3))
+        cls.third = make_order(cls.b, (cls.beta, 1))
+        confirm_sales_order(cls.first.pk)
+        confirm_sales_orders([cls.second.pk, cls.third.pk])
+
+    def analytics(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]
+
+    def summaries(self):
+        return sorted(
+            DailyProductSales.objects.values_list(
+                "day", "product_id", "quantity", "revenue", "discount", "order_count"
+            )
+        )
+
+    def test_totals_and_groups(self):
+        totals = self.analytics()["totals"]
+        self.assertEqual(
+            totals,
+            {"quantity": 7, "revenue": "88.00", "discount": "2.00", "order_count": 3},
+        )
+
+        results = self.analytics(group_by="product")["results"]
+        self.assertEqual(
+            [(row["product_id"], row["order_count"]) for row in results],
+            [(self.alpha.pk, 2), (self.beta.pk, 2)],
+        )
+        results = self.analytics(group_by="customer")["results"]
+        self.assertEqual(
+            {row["customer_id"]: row["order_count"] for row in results},
+            {self.a.pk: 1, self.b.pk: 2},
+        )
+        totals = self.analytics(product=self.alpha.pk, group_by="month")["totals"]
+        self.assertEqual((totals["order_count"], totals["quantity"]), (2, 5))
+
+    def test_groups_of_deleted_products_and_customers(self):
+        # Summaries keep the ids of rows deleted since, without a constraint.
+        today = timezone.localdate()
+        missing = {"quantity": 1, "revenue": Decimal("5.00"), "order_count": 1}
+        DailyProductSales.objects.create(day=today, product_id=999999, **missing)
+        DailyCustomerSales.objects.create(day=today, customer_id=999999, **missing)
+        self.alpha.delete()
+
+        for group_by in ("product", "customer"):
+            with self.subTest(group_by=group_by):
+                data = self.analytics(group_by=group_by)
+                names = {
+                    row[f"{group_by}_id"]: row[f"{group_by}_name"]
+                    for row in data["results"]
+                }
+                self.assertIsNone(names[999999])
+                revenue = sum(Decimal(row["revenue"]) for row in data["results"])
+                if group_by == "customer":
+                    self.assertEqual(f"{revenue:.2f}", data["totals"]["revenue"])
+                else:
+                    self.assertEqual(names[self.alpha.pk], "Alpha")
+
+    def test_cancelled_and_expired_orders_are_taken_out(self):
+        cancel_sales_orders([self.second.pk])
+
+        totals = self.analytics()["totals"]
+        self.assertEqual((totals["order_count"], totals["quantity"]), (2, 4))
+        self.assertEqual(DailyCustomerSales.objects.get(customer=self.b).order_count, 1)
+
+        cancel_sales_orders([self.third.pk])
+        self.assertFalse(DailyCustomerSales.objects.filter(customer=self.b).exists())
+
+        Reservation.objects.filter(order=self.first).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        sweep_expired_reservations()
+        self.assertFalse(DailyProductSales.objects.exists())
+
+    def test_rebuild_matches_the_incremental_summaries(self):
+        summaries = self.summaries()
+        DailyProductSales.objects.all().delete()
+        DailyCustomerSales.objects.all().delete()
+
+        call_command("rebuild_sales_summaries", "--days", "1", stdout=io.StringIO())
+
+        self.assertEqual(self.summaries(), summaries)
+
+    def test_invalid_parameters(self):
+        for params in (
+            {"start": "2025-02-01", "end": "2025-01-01"},
+            {"customer": self.a.pk, "group_by": "product"},
+            {"group_by": "year"},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class DailySalesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = make_customer()
+        cls.product = make_product()
+        confirm_sales_order(make_order(cls.customer, (cls.product, 2)).pk)
+
+    def test_summaries_outlive_soft_deletes(self):
+        self.product.delete()
+        self.customer.delete()
+
+        self.assertTrue(
+            DailyProductSales.objects.filter(product_id=self.product.pk).exists()
+        )
+        self.assertTrue(
+            DailyCustomerSales.objects.filter(customer_id=self.customer.pk).exists()
+        )
+
+        Product.global_objects.get(pk=self.product.pk).restore()
+        Customer.global_objects.get(pk=self.customer.pk).restore()
+
+        self.assertTrue(Product.objects.filter(pk=self.product.pk).exists())
+        self.assertTrue(Customer.objects.filter(pk=self.customer.pk).exists())
+        summary = DailyProductSales.objects.get(product=self.product)
+        self.assertEqual(summary.quantity, 2)
@@ -2,16 +2,24 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
 from telesales.views import (
+    ConfirmationRequestViewSet,
     CustomerViewSet,
+    OrderImportViewSet,
     ReservationViewSet,
+    SalesAnalyticsViewSet,
     SalesOrderLineViewSet,
     SalesOrderViewSet,
 )
 
 router = DefaultRouter()
-router.register(r"orders", SalesOrderViewSet, basename="sale_orders")
+router.register(r"orders/imports", OrderImportViewSet, basename="sale_order_imports")
 router.register(r"orders/lines", SalesOrderLineViewSet, basename="sale_orders_lines")
+router.register(r"orders", SalesOrderViewSet, basename="sale_orders")
 router.register(r"reservations", ReservationViewSet, basename="sale_reservations")
+router.register(r"analytics", SalesAnalyticsViewSet, basename="sales_analytics")
 router.register(r"customers", CustomerViewSet, basename="customers")
+router.register(
+    r"confirmations", ConfirmationRequestViewSet, basename="sale_confirmations"
+)
 
 urlpatterns = [path("", include(router.urls))]
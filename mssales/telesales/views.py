@@ -1,25 +1,104 @@
-from django.db import transaction
+import csv
+import io
+
+from django.conf import settings
 from django.db import DatabaseError
+from django.db.models import Max, Prefetch
+from django.http import StreamingHttpResponse
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status, viewsets, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
-
-from core.utils import CustomPagination, custom_response
-from products.models import Product
-from .models import Customer, SalesOrder, SalesOrderLine, Reservation
-from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
+from rest_framework.exceptions import ValidationError
+
+from core.conditional import ConditionalGetMixin
+from core.fastpath import FastListMixin
+from core.fieldsets import SparseFieldsetMixin
+from core.idempotency import idempotent
+from core.transactions import TransactionConflict, run_atomic
+from core.utils import CustomPagination, KeysetPaginationMixin, custom_response
+from .models import (
+    ConfirmationRequest,
+    Customer,
+    OrderImport,
+    SalesOrder,
+    SalesOrderLine,
+    Reservation,
+)
+from drf_spectacular.utils import (
+    extend_schema,
+    OpenApiExample,
+    OpenApiParameter,
+    OpenApiResponse,
+)
+from .analytics import sales_summary
+from .exports import gzip_stream, iter_export
+from .filters import OrderFilter
+from .imports import import_orders, iter_error_report
+from .lookup import lookup_customers
+from .services import (
+    cancel_sales_orders,
+    ConfirmationError,
+    confirm_sales_order,
+    confirm_sales_orders,
+    enqueue_confirmation,
+)
 from .serializers import (
+    CancelSaleOrdersBatchSerializer,
+    ConfirmSaleOrdersBatchSerializer,
+    ConfirmationRequestSerializer,
+    CustomerLookupResultSerializer,
+    CustomerLookupSerializer,
     CustomerSerializer,
+    OrderImportSerializer,
+    OrderImportUploadSerializer,
     ReservationSerializer,
+    SaleOrderExportSerializer,
+    SalesAnalyticsSerializer,
     SalesOrderLineSerializer,
     SalesOrderSerializer,
 )
 
 
-class SalesOrderViewSet(viewsets.ModelViewSet):
+def conflict_response(message="Order is locked, please try again"):
+    return Response(
+        {"status": status.HTTP_409_CONFLICT, "message": message},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def lines_with_products():
+    """Order lines with what SalesOrderLineSerializer reads of their product."""
+    return (
+        SalesOrderLine.objects.select_related("product")
+        .prefetch_related("product__stripes")
+        .order_by("pk")
+    )
+
+
+class SalesOrderViewSet(
+    ConditionalGetMixin,
+    FastListMixin,
+    SparseFieldsetMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
     queryset = SalesOrder.objects.all().order_by("-created_at", "-status")
     serializer_class = SalesOrderSerializer
+    filterset_class = OrderFilter
+    # Orders render their customer: its updated_at joins the validators.
+    # Changing a line touches the order's updated_at instead (see
+    # SalesOrder.add_to_totals), so the aggregate never reads the lines.
+    conditional_aggregates = {"customer_updated_at": Max("customer__updated_at")}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.select_related("customer").prefetch_related(
+                Prefetch("lines", queryset=lines_with_products())
+            )
+        return queryset
 
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -29,26 +108,24 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         )
 
     def perform_create(self, serializer):
-        # Handle nested order lines creation
-        order = serializer.save()
-        order_lines_data = self.request.data.get("lines", [])
-
-        for line_data in order_lines_data:
-            line_data["order_id"] = order.id
-            line_serializer = SalesOrderLineSerializer(data=line_data)
-            if line_serializer.is_valid():
-                line_serializer.save()
-            else:
-                order.delete()
-
-        order.refresh_from_db()
-        order.order_total = sum(line.sub_total for line in order.lines.all())
-        order.save()
+        run_atomic("order_create", self._create_order, serializer)
+
+    def perform_update(self, serializer):
+        run_atomic("order_update", serializer.save)
 
+    def _create_order(self, serializer):
+        # A retried attempt must insert a new order, not update the rolled back one
+        serializer.instance = None
+        serializer.save()
+
+    @idempotent
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        try:
+            self.perform_create(serializer)
+        except TransactionConflict:
+            return conflict_response()
         return custom_response(
             data=serializer.data, message="Sale order created successfully", status=201
         )
@@ -57,7 +134,10 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=False)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+        try:
+            self.perform_update(serializer)
+        except TransactionConflict:
+            return conflict_response()
         return custom_response(
             data=serializer.data, message="Sale order updated successfully"
         )
@@ -66,7 +146,10 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
+        try:
+            self.perform_update(serializer)
+        except TransactionConflict:
+            return conflict_response()
         return custom_response(
             data=serializer.data, message="Sale order partially updated successfully"
         )
@@ -87,6 +170,13 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
                     )
                 ],
             ),
+            202: OpenApiResponse(
+                response=ConfirmationRequestSerializer,
+                description=(
+                    "Confirmation queued (CONFIRMATION_MODE=queued). "
+                    "Poll the status_url for the final state."
+                ),
+            ),
             400: OpenApiResponse(
                 description="Bad request. Validation error or insufficient stock.",
                 examples=[
@@ -133,106 +223,63 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
         },
         description=(
             "Confirm a sale order by order_id. "
-            "Locks the sale order and related products, checks stock, "
-            "creates reservations, updates stock, and sets order status to CONFIRMED."
+            "Locks the sale order, reserves stock with the configured reservation strategy, "
+            "creates reservations, and sets order status to CONFIRMED. "
+            "When CONFIRMATION_MODE is queued, the confirmation is queued instead "
+            "and a 202 with a status URL is returned."
         ),
         tags=["Confirm Sales Orders"],
         summary="Confirm a Sale Order",
     )
     @action(detail=True, methods=["post"], url_path="confirm")
+    @idempotent
     def confirm(self, request, pk=None):
         """
         Handles POST requests to confirm a sale order.
 
+        With the CONFIRMATION_MODE setting set to "queued", the confirmation is
+        only queued and the steps below are run later, in batches, by the
+        `process_confirmations` management command.
+
         This method performs the following steps:
-        1. Validates the incoming request data using ConfirmSaleOrderSerializer.
-        2. Retrieves and locks the specified SalesOrder in the database to prevent concurrent modifications.
-        3. Checks that the sale order is in the "DRAFT" state and contains order lines.
-        4. Locks all relevant Product rows associated with the order lines for concurrency control.
-        5. Validates that there is sufficient stock for each product in the order lines.
-        6. Deducts the ordered quantity from each product's stock and creates Reservation records.
-        7. Updates the sale order status to "CONFIRMED" and saves the changes.
-        8. Serializes and returns the updated sale order data.
+        1. Retrieves and locks the specified SalesOrder in the database to prevent concurrent modifications.
+           The transaction follows the "confirm" entry of TRANSACTION_POLICIES: lock conflicts,
+           deadlocks and serialization failures are retried with backoff before giving up with a 409.
+        2. Checks that the sale order is in the "DRAFT" state and contains order lines.
+        3. Reserves the ordered quantities with the RESERVATION_STRATEGY setting:
+           "lock" locks the Product rows and validates stock before writing it back,
+           "conditional" decrements availables with guarded updates and no up-front lock.
+        4. Creates the Reservation records.
+        5. Updates the sale order status to "CONFIRMED" and saves the changes.
+        6. Serializes and returns the updated sale order data.
 
         Returns:
             - 200 OK with the serialized sale order if confirmation is successful.
+            - 202 ACCEPTED with the queued confirmation request in "queued" mode.
             - 400 BAD REQUEST if validation fails or the order is not in the correct state.
             - 404 NOT FOUND if the sale order or a product is not found.
             - 500 INTERNAL SERVER ERROR for any unexpected errors.
         """
         try:
-            # Begin atomic transaction for sale order confirmation
-            with transaction.atomic():
-                # Lock the SaleOrder -- concurrency control to prevent double-reservation
-                sale_order = SalesOrder.objects.select_for_update().get(pk=pk)
-
-                # Validate sale order status
-                if sale_order.status != "DRAFT":
-                    return Response(
-                        {
-                            "error": f"Sale order {pk} is not in DRAFT state, current status: {sale_order.status}"
-                        },
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                # Get all order lines and their product IDs
-                order_lines = sale_order.lines.all()
-                if not order_lines:
-                    return Response(
-                        {"error": f"Sale order {pk} has no order lines"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-
-                product_ids = [line.product.id for line in order_lines]
-
-                # Lock all relevant Product rows -- concurrency control on stock availability
-                order_items = Product.objects.select_for_update().filter(
-                    id__in=product_ids
+            if settings.CONFIRMATION_MODE == "queued":
+                confirmation = enqueue_confirmation(pk)
+                serializer = ConfirmationRequestSerializer(
+                    confirmation, context={"request": request}
+                )
+                return Response(
+                    serializer.data,
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Location": serializer.data["status_url"]},
                 )
 
-                # Create a dictionary for quick lookup of stock
-                items_dict = {item.id: item for item in order_items}
-
-                # Validate stock for each order line
-                for line in order_lines:
-                    product_id = line.product.id
-                    quantity = line.qty
-
-                    stock = items_dict.get(product_id)
-                    if not stock:
-                        return Response(
-                            {"error": f"Product {product_id} not found in stock"},
-                            status=status.HTTP_404_NOT_FOUND,
-                        )
-
-                    if stock.availables < quantity:
-                        return Response(
-                            {
-                                "error": f"Insufficient stock for product {product_id}, available: {stock.availables}, requested: {quantity}"
-                            },
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-
-                # Update stock for each order line and create reservations
-                reservations = []
-                for line in order_lines:
-                    stock = items_dict[line.product.id]
-                    stock.availables -= line.qty
-                    stock.save()
-                    reservation = Reservation(
-                        order=sale_order, product=line.product, qty=line.qty
-                    )
-                    reservations.append(reservation)
-                Reservation.objects.bulk_create(reservations)
-
-                # Confirm the sale order
-                sale_order.status = "CONFIRMED"
-                sale_order.save()
+            sale_order = run_atomic("confirm", confirm_sales_order, pk)
 
-                # Serialize and return the updated sale order
-                serializer = SalesOrderSerializer(sale_order)
-                return Response(serializer.data, status=status.HTTP_200_OK)
+            # Serialize and return the updated sale order
+            serializer = SalesOrderSerializer(sale_order)
+            return Response(serializer.data, status=status.HTTP_200_OK)
 
+        except ConfirmationError as e:
+            return Response({"error": e.message}, status=e.status_code)
         except SalesOrder.DoesNotExist:
             return Response(
                 {
@@ -242,26 +289,263 @@ class SalesOrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
         except DatabaseError:
-            return Response(
-                {
-                    "status": status.HTTP_409_CONFLICT,
-                    "message": "Order is locked, please try again",
-                },
-                status=status.HTTP_409_CONFLICT,
-            )
+            return conflict_response()
         except Exception as e:
             return Response(
                 {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "message": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @extend_schema(
+        request=ConfirmSaleOrdersBatchSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="Per-order confirmation results.",
+                examples=[
+                    OpenApiExample(
+                        "Partially Confirmed Batch",
+                        value={
+                            "message": "1 of 2 sale orders confirmed",
+                            "data": {
+                                "confirmed": 1,
+                                "failed": 1,
+                                "results": [
+                                    {
+                                        "order_id": 1,
+                                        "number": "SO-123",
+                                        "confirmed": True,
+                                        "status": "CONFIRMED",
+                                    },
+                                    {
+                                        "order_id": 2,
+                                        "confirmed": False,
+                                        "error": "Insufficient stock for product 1, available: 5, requested: 10",
+                                    },
+                                ],
+                            },
+                            "status": 200,
+                        },
+                    )
+                ],
+            ),
+            409: OpenApiResponse(description="Orders or products are locked."),
+        },
+        description=(
+            "Confirm many sale orders in one transaction. "
+            "Locks every involved product once, checks stock across the whole batch, "
+            "and reports success or failure for each order."
+        ),
+        tags=["Confirm Sales Orders"],
+        summary="Confirm a batch of Sale Orders",
+    )
+    @action(detail=False, methods=["post"], url_path="confirm-batch")
+    @idempotent
+    def confirm_batch(self, request):
+        serializer = ConfirmSaleOrdersBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            results = run_atomic(
+                "confirm_batch",
+                confirm_sales_orders,
+                serializer.validated_data["order_ids"],
+            )
+        except DatabaseError:
+            return conflict_response("Orders are locked, please try again")
+
+        confirmed = sum(1 for result in results if result["confirmed"])
+        return custom_response(
+            data={
+                "confirmed": confirmed,
+                "failed": len(results) - confirmed,
+                "results": results,
+            },
+            message=f"{confirmed} of {len(results)} sale orders confirmed",
+        )
+
+    @extend_schema(
+        request=None,
+        responses={
+            200: OpenApiResponse(
+                response=SalesOrderSerializer,
+                description="Sale order cancelled successfully.",
+            ),
+            400: OpenApiResponse(
+                description="The sale order is already cancelled.",
+                examples=[
+                    OpenApiExample(
+                        "Already Cancelled",
+                        value={
+                            "error": "Sale order 1 cannot be cancelled, current status: CANCELLED"
+                        },
+                    ),
+                ],
+            ),
+            404: OpenApiResponse(description="Sale order not found."),
+            409: OpenApiResponse(description="The sale order is locked."),
+        },
+        description=(
+            "Cancel a DRAFT or CONFIRMED sale order. "
+            "The stock reserved by a confirmed order is given back to the products "
+            "and its reservations are soft-deleted."
+        ),
+        tags=["Cancel Sales Orders"],
+        summary="Cancel a Sale Order",
+    )
+    @action(detail=True, methods=["post"], url_path="cancel")
+    @idempotent
+    def cancel(self, request, pk=None):
+        try:
+            [result] = cancel_sales_orders([int(pk)])
+        except ValueError:
+            result = {"cancelled": False, "error": "Sale order not found"}
+        except DatabaseError:
+            return conflict_response()
+
+        if not result["cancelled"]:
+            return Response(
+                {"error": result["error"]},
+                status=(
+                    status.HTTP_404_NOT_FOUND
+                    if result["error"] == "Sale order not found"
+                    else status.HTTP_400_BAD_REQUEST
+                ),
+            )
+
+        serializer = SalesOrderSerializer(SalesOrder.objects.get(pk=pk))
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        request=CancelSaleOrdersBatchSerializer,
+        responses={
+            200: OpenApiResponse(
+                description="Per-order cancellation results.",
+                examples=[
+                    OpenApiExample(
+                        "Cancelled Batch",
+                        value={
+                            "message": "1 of 2 sale orders cancelled",
+                            "data": {
+                                "cancelled": 1,
+                                "failed": 1,
+                                "results": [
+                                    {
+                                        "order_id": 1,
+                                        "number": "SO-123",
+                                        "cancelled": True,
+                                        "status": "CANCELLED",
+                                    },
+                                    {
+                                        "order_id": 2,
+                                        "cancelled": False,
+                                        "error": "Sale order not found",
+                                    },
+                                ],
+                            },
+                            "status": 200,
+                        },
+                    )
+                ],
+            ),
+            409: OpenApiResponse(description="Orders or products are locked."),
+        },
+        description=(
+            "Cancel many sale orders. Orders are processed in chunks; each chunk "
+            "gives its reserved stock back with one set-based update and "
+            "soft-deletes its reservations in bulk."
+        ),
+        tags=["Cancel Sales Orders"],
+        summary="Cancel a batch of Sale Orders",
+    )
+    @action(detail=False, methods=["post"], url_path="cancel-batch")
+    @idempotent
+    def cancel_batch(self, request):
+        serializer = CancelSaleOrdersBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            results = cancel_sales_orders(serializer.validated_data["order_ids"])
+        except DatabaseError:
+            return conflict_response("Orders are locked, please try again")
+
+        cancelled = sum(1 for result in results if result["cancelled"])
+        return custom_response(
+            data={
+                "cancelled": cancelled,
+                "failed": len(results) - cancelled,
+                "results": results,
+            },
+            message=f"{cancelled} of {len(results)} sale orders cancelled",
+        )
 
-class SalesOrderLineViewSet(viewsets.ModelViewSet):
+    @extend_schema(
+        parameters=[
+            SaleOrderExportSerializer,
+            OpenApiParameter("status", str, description="Order status."),
+            OpenApiParameter("created_at__gte", str, description="ISO datetime."),
+            OpenApiParameter("created_at__lte", str, description="ISO datetime."),
+        ],
+        responses={
+            200: OpenApiResponse(
+                description=(
+                    "CSV with one row per order line or reservation, or NDJSON "
+                    "with one order per line; gzip compressed when asked for."
+                )
+            ),
+            400: OpenApiResponse(description="Invalid export or filter parameters."),
+        },
+        description=(
+            "Stream every sale order matching the list filters, with its "
+            "customer and its lines or reservations, without pagination. Orders "
+            "are read through a server-side cursor in chunks of "
+            "ORDER_EXPORT_CHUNK_SIZE, each chunk written out before the next is "
+            "read, so exports of any size use the same memory."
+        ),
+        tags=["Export Sales Orders"],
+        summary="Export Sale Orders as CSV or NDJSON",
+    )
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        serializer = SaleOrderExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        options = serializer.validated_data
+        filterset = OrderFilter(
+            request.query_params, queryset=SalesOrder.objects.all(), request=request
+        )
+        if not filterset.is_valid():
+            raise ValidationError(filterset.errors)
+
+        output = options["output"]
+        pieces = iter_export(
+            filterset.qs,
+            output=output,
+            records=options["records"],
+            chunk_size=settings.ORDER_EXPORT_CHUNK_SIZE,
+        )
+        content_type = "text/csv" if output == "csv" else "application/x-ndjson"
+        filename = f"sale-orders.{output}"
+        if options.get("compress") == "gzip":
+            pieces = gzip_stream(pieces)
+            content_type = "application/gzip"
+            filename += ".gz"
+        response = StreamingHttpResponse(pieces, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SalesOrderLineViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = SalesOrderLine.objects.all()
     serializer_class = SalesOrderLineSerializer
 
+    def get_queryset(self):
+        if self.action in ("list", "retrieve"):
+            return lines_with_products().order_by("pk")
+        return super().get_queryset()
+
 
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(
+    SparseFieldsetMixin, KeysetPaginationMixin, viewsets.ModelViewSet
+):
     queryset = Reservation.objects.all().order_by("-created_at")
     serializer_class = ReservationSerializer
 
@@ -281,8 +565,104 @@ class ReservationViewSet(viewsets.ModelViewSet):
         )
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class ConfirmationRequestViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ConfirmationRequest.objects.select_related("order").order_by(
+        "-created_at"
+    )
+    serializer_class = ConfirmationRequestSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        return custom_response(
+            data=serializer.data, message="Confirmation request retrieved successfully"
+        )
+
+
+class Echo:
+    """A file-like object whose write() hands back what it is given."""
+
+    def write(self, value):
+        return value
+
+
+class OrderImportViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = OrderImport.objects.order_by("-created_at")
+    serializer_class = OrderImportSerializer
+    pagination_class = CustomPagination
+    parser_classes = (MultiPartParser, FormParser)
+
+    @extend_schema(
+        request=OrderImportUploadSerializer,
+        responses={201: OrderImportSerializer},
+        description=(
+            "Import sale orders from a CSV or NDJSON file, read incrementally and "
+            "written in chunks. CSV files hold one order line per row (columns "
+            "order_ref, customer_email, notes, vat_rate, product_id, barcode, qty, "
+            "discount_pct); consecutive rows sharing an order_ref make one order. "
+            "NDJSON files hold one order per line, with a 'lines' list. Customers "
+            "are matched by email and products by id or barcode. Rows that cannot "
+            "be imported are listed in the report at report_url."
+        ),
+        tags=["Import Sales Orders"],
+        summary="Import Sale Orders",
+    )
+    def create(self, request, *args, **kwargs):
+        upload = OrderImportUploadSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        file = upload.validated_data["file"]
+        file_format = upload.validated_data["file_format"]
+
+        order_import = OrderImport.objects.create(
+            file_name=file.name[:255], file_format=file_format
+        )
+        stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+        import_orders(stream, file_format, order_import)
+
+        serializer = self.get_serializer(order_import)
+        return custom_response(
+            data=serializer.data,
+            message=(
+                f"{order_import.orders_created} of {order_import.orders_read} "
+                "sale orders imported"
+            ),
+            status=status.HTTP_201_CREATED,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        return custom_response(
+            data=serializer.data, message="Order import retrieved successfully"
+        )
+
+    @extend_schema(
+        responses={200: OpenApiResponse(description="CSV of the rejected rows.")},
+        tags=["Import Sales Orders"],
+        summary="Download the error report of an import",
+    )
+    @action(detail=True, methods=["get"])
+    def report(self, request, pk=None):
+        order_import = self.get_object()
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in iter_error_report(order_import)),
+            content_type="text/csv",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="order-import-{order_import.pk}-errors.csv"'
+        )
+        return response
+
+
+class CustomerViewSet(
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    KeysetPaginationMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Customer.objects.all().order_by("email")
+    keyset_ordering = ("email", "id")
     serializer_class = CustomerSerializer
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend, filters.SearchFilter)
@@ -302,3 +682,117 @@ class CustomerViewSet(viewsets.ModelViewSet):
         return custom_response(
             data=serializer.data, message="Customer created successfully", status=201
         )
+
+    @extend_schema(
+        parameters=[CustomerLookupSerializer],
+        responses={
+            200: OpenApiResponse(
+                response=CustomerLookupResultSerializer(many=True),
+                description="The first matching customers.",
+                examples=[
+                    OpenApiExample(
+                        "Caller Found",
+                        value={
+                            "message": "1 customer found",
+                            "data": {
+                                "results": [
+                                    {
+                                        "id": 1,
+                                        "name": "Jane Doe",
+                                        "email": "jane@example.com",
+                                        "phone": "+237 699 12 34 56",
+                                        "billing_address": None,
+                                        "shipping_address": None,
+                                    }
+                                ],
+                                "truncated": False,
+                            },
+                            "status": 200,
+                        },
+                    )
+                ],
+            ),
+            400: OpenApiResponse(description="Missing or too short query."),
+        },
+        description=(
+            "Caller ID and type-ahead lookup: customers whose phone number, email "
+            "or name starts with `q`. Phone numbers are compared in normalized "
+            "form, so separators and the country code do not matter. Returns at "
+            "most `limit` customers without counting the matches; `truncated` "
+            "tells that there are more."
+        ),
+        tags=["Customers"],
+        summary="Look up customers by phone, email or name prefix",
+    )
+    @action(detail=False, methods=["get"])
+    def lookup(self, request):
+        serializer = CustomerLookupSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        result = lookup_customers(data["q"], data.get("limit"))
+        count = len(result["results"])
+        return custom_response(
+            data=result,
+            message=f"{count} customer{'' if count == 1 else 's'} found",
+        )
+
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    @extend_schema(
+        parameters=[SalesAnalyticsSerializer],
+        responses={
+            200: OpenApiResponse(
+                description=(
+                    "Totals over the range and one row per period, product or "
+                    "customer with quantity, revenue, discount and order_count."
+                )
+            ),
+            400: OpenApiResponse(description="Invalid parameters."),
+        },
+        examples=[
+            OpenApiExample(
+                "Revenue per day",
+                value={
+                    "status": 200,
+                    "message": "Sales analytics retrieved successfully",
+                    "data": {
+                        "start": "2025-01-01",
+                        "end": "2025-01-31",
+                        "group_by": "day",
+                        "totals": {
+                            "quantity": 42,
+                            "revenue": "1250.00",
+                            "discount": "35.50",
+                            "order_count": 12,
+                        },
+                        "results": [
+                            {
+                                "period": "2025-01-02",
+                                "quantity": 5,
+                                "revenue": "150.00",
+                                "discount": "0.00",
+                                "order_count": 2,
+                            }
+                        ],
+                    },
+                },
+                response_only=True,
+            )
+        ],
+        description=(
+            "Quantity, revenue, discount and order count of the CONFIRMED sale "
+            "orders created between `start` and `end`, per day, week, month, "
+            "product or customer. Reads only the daily summaries kept up to "
+            "date on confirmation, cancellation and expiry, never the order "
+            "lines; `manage.py rebuild_sales_summaries` recomputes them."
+        ),
+        tags=["Sales Analytics"],
+        summary="Sales totals per period, product or customer",
+    )
+    def list(self, request):
+        serializer = SalesAnalyticsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return custom_response(
+            data=sales_summary(**serializer.validated_data),
+            message="Sales analytics retrieved successfully",
+        )